@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Hashable, Optional
+
+# Adaptive limit on the number of requests in flight (AIMD: additive increase, multiplicative decrease).
+# The limit grows by about one request per round trip while the responses stay fast, is halved when
+# the server answers 429 or 503, and shrinks a little when responses get much slower than the fastest
+# seen lately for the same kind of request. A Retry-After header pauses every new request until it
+# has passed, not just the one that got it. The limit never goes below min_limit or above max_limit,
+# which the thread pools and the connection pool are sized for.
+# FairSemaphore shares the slots of the concurrent path fairly between the organizers being scraped.
+
+BACKOFF_STATUSES = (429, 503)
+BACKOFF_FACTOR = 0.5  # Of the limit, when the server pushes back
+SLOW_FACTOR = 0.9  # Of the limit, when responses slow down
+SLOW_LATENCY = 2.0  # Times the baseline latency a response must take to count as slow
+BASELINE_DRIFT = 0.01  # Share the baseline may rise by per response, so it follows a slower server
+DEFAULT_RETRY_AFTER = 1.0  # Seconds to pause after a 429 without a usable Retry-After header
+
+
+class AdaptiveLimiter:
+    """Limits the requests in flight to a limit that adapts to how the server responds.
+
+    Every decrease only counts once per round trip: a response to a request sent before the last
+    decrease doesn't decrease the limit again, so a burst of 429s halves the limit once.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.baselines: Dict[Hashable, float] = {}
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Wait for room under the limit and for any pause to pass, and hold a slot while the block runs.
+
+        The block gets the time the request was sent, which on_response needs.
+        """
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+        try:
+            yield time.monotonic()
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def on_response(self, sent: float, status: int, retry_after: Optional[str] = None, kind: Hashable = None):
+        """Adjust the limit to a response.
+        Args:
+            sent (float):
+                The time the request was sent, from slot().
+            status (int):
+                The status code of the response.
+            retry_after (Optional[str]):
+                The Retry-After header of the response, if it had one.
+            kind (Hashable):
+                The kind of request, as responses are only compared to the baseline latency of their kind.
+        """
+        now = time.monotonic()
+        latency = now - sent
+        with self.condition:
+            if status in BACKOFF_STATUSES:
+                if retry_after is not None or status == 429:
+                    self.paused_until = max(self.paused_until, now + get_retry_after_seconds(retry_after))
+                self.decrease(sent, BACKOFF_FACTOR)
+            elif 200 <= status < 400:
+                baseline = self.baselines.get((kind, status))
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    baseline *= 1 + BASELINE_DRIFT
+                self.baselines[(kind, status)] = baseline
+                if latency > baseline * SLOW_LATENCY:
+                    self.decrease(sent, SLOW_FACTOR)
+                else:
+                    self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            self.condition.notify_all()
+
+    def on_error(self, sent: float):
+        """Back off after a request that failed without a response, like a timeout or a refused connection."""
+        with self.condition:
+            self.decrease(sent, BACKOFF_FACTOR)
+            self.condition.notify_all()
+
+    def decrease(self, sent: float, factor: float):
+        if sent < self.last_decrease:
+            return
+        self.limit = max(self.limit * factor, self.min_limit)
+        self.last_decrease = time.monotonic()
+
+
+class FairSemaphore:
+    """An asyncio semaphore that hands its free slots to the waiting tenants in turn.
+
+    A plain semaphore wakes its waiters in arrival order, so an organizer whose events queue a thousand
+    sections ahead of the others holds every slot until they are done. Here every tenant waits in a
+    queue of its own, and a released slot goes to the next tenant in round-robin order that is waiting.
+    """
+
+    def __init__(self, value: int):
+        self.value = value
+        self.waiters: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self.turns: Deque[Hashable] = deque()  # The tenants that are waiting, in the order they get a slot
+
+    async def acquire(self, tenant: Hashable):
+        if self.value > 0 and not self.turns:
+            self.value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        if tenant not in self.waiters:
+            self.waiters[tenant] = deque()
+            self.turns.append(tenant)
+        self.waiters[tenant].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over just before the task was cancelled
+            raise
+
+    def release(self):
+        while self.turns:
+            tenant = self.turns.popleft()
+            queue = self.waiters[tenant]
+            future = queue.popleft()
+            if queue:
+                self.turns.append(tenant)
+            else:
+                del self.waiters[tenant]
+            if not future.cancelled():
+                future.set_result(None)
+                return
+        self.value += 1
+
+    @asynccontextmanager
+    async def slot(self, tenant: Hashable):
+        """Wait for a slot in the tenant's turn, and hold it while the block runs."""
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def get_retry_after_seconds(retry_after: Optional[str]) -> float:
+    """Read a Retry-After header, given in seconds or as an HTTP date, falling back to DEFAULT_RETRY_AFTER."""
+    if retry_after is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
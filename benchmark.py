@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from tqdm import tqdm
+
+import imagify
+import scrape_tools
+import seat_capture
+import snapshot_store
+from adaptive_limiter import AdaptiveLimiter
+from http_cache import HttpCache
+from http_metrics import HttpMetrics
+from replay import ReplayServer
+from twitter import LocalPublisher
+
+# Times every stage of a run separately against a replayed fixture bundle (see replay.py):
+# event discovery, the section fan-out of get_ticket_info and of the asyncio pipeline that main.py runs,
+# the aggregation in save_minimal_info, create_string, the image rendering of generate_images and the publish step.
+# Each stage is measured at several sizes of the dimension it depends on, and the results are written as JSON
+# so two runs can be compared. Every case starts from a fresh directory and fresh in-memory state.
+
+DEFAULT_SECTIONS = [20, 200, 1000]  # Sections per event
+DEFAULT_EVENTS = [1, 5, 20]  # Events per run
+DEFAULT_HISTORY = [10, 100, 1000]  # Snapshots saved before the latest one
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2  # Share a median may grow by before it's reported as a regression
+TWEET_HEADER = "Benchmark"
+
+
+def run_benchmarks(bundle_dir: str, sections: List[int], events: List[int], history: List[int],
+                   repeat: int, stages: Optional[List[str]] = None) -> Dict:
+    """Run every benchmark against the bundle and return the results.
+    Args:
+        bundle_dir (str):
+            The fixture bundle to replay.
+        sections (List[int]):
+            The numbers of sections per event to measure the section-bound stages at.
+        events (List[int]):
+            The numbers of events to measure the event-bound stages at.
+        history (List[int]):
+            The numbers of earlier snapshots to measure create_string at.
+        repeat (int):
+            How many times every case is run.
+        stages (Optional[List[str]]):
+            The stages to run, all of them by default.
+    Returns:
+        Dict:
+            Information about the run, and the timings of every case under 'results'.
+    """
+    cases = [
+        ("discovery", "events", events, lambda size, work_dir: benchmark_discovery(bundle_dir, size)),
+        ("ticket_info", "sections", sections,
+         lambda size, work_dir: benchmark_ticket_info(bundle_dir, 1, size)),
+        ("ticket_info", "events", events,
+         lambda size, work_dir: benchmark_ticket_info(bundle_dir, size, None)),
+        ("ticket_info_async", "sections", sections,
+         lambda size, work_dir: benchmark_ticket_info_async(bundle_dir, 1, size)),
+        ("ticket_info_async", "events", events,
+         lambda size, work_dir: benchmark_ticket_info_async(bundle_dir, size, None)),
+        ("aggregate", "sections", sections, lambda size, work_dir: benchmark_aggregate(bundle_dir, size)),
+        ("create_string", "history", history,
+         lambda size, work_dir: benchmark_create_string(bundle_dir, size)),
+        ("render_images", "events", events, lambda size, work_dir: benchmark_render_images(bundle_dir, size)),
+        ("publish", "events", events, lambda size, work_dir: benchmark_publish(bundle_dir, work_dir, size)),
+    ]
+    results = []
+    for stage, dimension, sizes, benchmark in cases:
+        if stages and stage not in stages:
+            continue
+        for size in sizes:
+            runs = []
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as work_dir:
+                    use_work_dir(work_dir)
+                    runs.append(benchmark(size, work_dir))
+            results.append({
+                "stage": stage,
+                "params": {dimension: size},
+                "runs": runs,
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "mean": statistics.mean(runs),
+            })
+            print(f"{stage:<18} {dimension}={size:<6} median {results[-1]['median'] * 1000:10.1f} ms",
+                  file=sys.stderr)
+    return {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "bundle": os.path.abspath(bundle_dir),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def use_work_dir(work_dir: str):
+    """Point every file the scraper writes to a fresh directory, and reset the in-memory caches and limits."""
+    scrape_tools.SAVE_PATH = work_dir + "/"
+    scrape_tools.http_cache = HttpCache(os.path.join(work_dir, "http_cache"), scrape_tools.HTTP_CACHE_MAX_SIZE)
+    scrape_tools.http_metrics = HttpMetrics()
+    scrape_tools.request_limiter = AdaptiveLimiter(scrape_tools.INITIAL_CONCURRENT_REQUESTS,
+                                                   scrape_tools.MIN_CONCURRENT_REQUESTS,
+                                                   scrape_tools.MAX_CONCURRENT_REQUESTS)
+    scrape_tools._venue_layouts.clear()
+    scrape_tools.classify_section.cache_clear()
+    seat_capture._layouts.clear()
+    snapshot_store.set_database_path(os.path.join(work_dir, "snapshots.db"))
+    imagify.COMPOSITE_PATH = os.path.join(work_dir, "composites")
+    imagify.get_composite_logo.cache_clear()
+    imagify.shutdown_render_pool()  # Its processes would keep the composite path of the last case
+
+
+def timed(function: Callable, *args) -> float:
+    """Call a function with its output silenced, and return how many seconds it took."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def replay(bundle_dir: str, events: Optional[int] = None, sections: Optional[int] = None):
+    """Serve the bundle while the block runs, with the scraper pointed at it."""
+    server = ReplayServer(bundle_dir, events=events, sections=sections)
+    homepage_url = scrape_tools.HOMEPAGE_URL
+    scrape_tools.HOMEPAGE_URL = server.start()
+    try:
+        yield server
+    finally:
+        scrape_tools.HOMEPAGE_URL = homepage_url
+        server.stop()
+
+
+def benchmark_discovery(bundle_dir: str, events: int) -> float:
+    with replay(bundle_dir, events=events):
+        return timed(scrape_tools.get_upcoming_events, "all")
+
+
+def benchmark_ticket_info(bundle_dir: str, events: int, sections: Optional[int]) -> float:
+    """Time get_ticket_info for every event, which fans out to all of its sections."""
+    with replay(bundle_dir, events=events, sections=sections):
+        with contextlib.redirect_stdout(io.StringIO()):
+            event_list = scrape_tools.get_upcoming_events("all")
+
+        def update_all():
+            for event in event_list:
+                scrape_tools.get_ticket_info(event["link"], event["title"], event["time"], False)
+        return timed(update_all)
+
+
+def benchmark_ticket_info_async(bundle_dir: str, events: int, sections: Optional[int]) -> float:
+    """Time poll_events for every event, the asyncio pipeline that counts every section of every event at once."""
+    with replay(bundle_dir, events=events, sections=sections):
+        with contextlib.redirect_stdout(io.StringIO()):
+            event_list = scrape_tools.get_upcoming_events("all")
+        return timed(scrape_tools.poll_events, event_list)
+
+
+def get_section_results(bundle_dir: str, sections: int) -> Dict:
+    """Count the recorded sections of the first event once, and repeat them up to 'sections' results."""
+    with replay(bundle_dir, sections=sections), contextlib.redirect_stdout(io.StringIO()):
+        event = scrape_tools.get_upcoming_events("next")[0]
+        response = scrape_tools.fetch_url(event["link"] + "item_types.json")
+        section_ids = scrape_tools.get_section_ids(json.loads(response.text))
+        progress_bar = tqdm(disable=True)
+        results = [scrape_tools.get_section_tickets(section_id, event["link"], progress_bar)
+                   for section_id in section_ids]
+    title, date = scrape_tools.clean_event_info(event["title"], event["time"])
+    return {"title": title, "date": date, "results": results}
+
+
+def benchmark_aggregate(bundle_dir: str, sections: int) -> float:
+    event = get_section_results(bundle_dir, sections)
+    return timed(scrape_tools.save_minimal_info, event["results"], event["title"], event["date"])
+
+
+def save_history(bundle_dir: str, history: int, events: int = 1) -> List[str]:
+    """Save 'history' older snapshots and a latest one for every event, and return their directory paths."""
+    event = get_section_results(bundle_dir, None)
+    data = scrape_tools.save_minimal_info(event["results"], event["title"], event["date"])
+    dir_paths = []
+    start = datetime.now() - timedelta(minutes=history + 1)
+    for number in range(events):
+        dir_path = scrape_tools.get_directory_path(f"{event['title']} {number}")
+        for age in range(history + 1):
+            created = (start + timedelta(minutes=age)).strftime("%Y-%m-%d_%H-%M-%S")
+            snapshot_store.save_snapshot(os.path.basename(dir_path), created, data)
+        dir_paths.append(dir_path)
+    return dir_paths
+
+
+def benchmark_create_string(bundle_dir: str, history: int) -> float:
+    dir_path = save_history(bundle_dir, history)[0]
+    return timed(scrape_tools.create_string, dir_path)
+
+
+def benchmark_render_images(bundle_dir: str, events: int) -> float:
+    """Time the rendering done by generate_images, leaving out the images it saves next to the code."""
+    strings = [scrape_tools.create_string(dir_path) for dir_path in save_history(bundle_dir, 1, events)]
+    return timed(imagify.render_images, strings)
+
+
+def benchmark_publish(bundle_dir: str, work_dir: str, events: int) -> float:
+    """Time the publish step with the local publisher, so it measures the pipeline and not the network."""
+    strings = [scrape_tools.create_string(dir_path) for dir_path in save_history(bundle_dir, 1, events)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        images = imagify.render_images(strings)
+    publisher = LocalPublisher(os.path.join(work_dir, "published"))
+    return timed(publisher.publish, TWEET_HEADER, images)
+
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """List the cases whose median grew by more than 'threshold' compared to a baseline run."""
+    baseline_medians = {(result["stage"], json.dumps(result["params"])): result["median"]
+                        for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        baseline_median = baseline_medians.get((result["stage"], json.dumps(result["params"])))
+        if baseline_median and result["median"] > baseline_median * (1 + threshold):
+            regressions.append(f"{result['stage']} {result['params']}: {baseline_median * 1000:.1f} ms "
+                               f"-> {result['median'] * 1000:.1f} ms")
+    return regressions
+
+
+def parse_sizes(text: str) -> List[int]:
+    return [int(size) for size in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage of a run against a fixture bundle.")
+    parser.add_argument("bundle", help="fixture bundle recorded with 'python replay.py record'")
+    parser.add_argument("--output", default="benchmark.json", help="file to write the results to")
+    parser.add_argument("--sections", type=parse_sizes, default=DEFAULT_SECTIONS,
+                        help="comma-separated numbers of sections per event")
+    parser.add_argument("--events", type=parse_sizes, default=DEFAULT_EVENTS,
+                        help="comma-separated numbers of events per run")
+    parser.add_argument("--history", type=parse_sizes, default=DEFAULT_HISTORY,
+                        help="comma-separated numbers of earlier snapshots")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs of every case")
+    parser.add_argument("--stage", action="append", dest="stages",
+                        choices=["discovery", "ticket_info", "ticket_info_async", "aggregate", "create_string",
+                                 "render_images", "publish"],
+                        help="only run this stage, can be given more than once")
+    parser.add_argument("--compare", help="earlier results to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed growth of a median before it's a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.bundle, args.sections, args.events, args.history, args.repeat,
+                                       args.stages)
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(benchmark_results, output_file, indent=2)
+    print(f"Results saved to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            found_regressions = find_regressions(benchmark_results, json.load(baseline_file), args.threshold)
+        for regression in found_regressions:
+            print("Regression in " + regression, file=sys.stderr)
+        if found_regressions:
+            sys.exit(1)
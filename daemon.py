@@ -0,0 +1,153 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import pytz
+
+import scrape_tools
+
+# Long-running mode that keeps the requests session and the caches warm between polls.
+# Every event is polled on its own schedule, which tightens as kickoff gets closer,
+# while the list of events and the tweets are refreshed on their own fixed cadence.
+
+DISCOVERY_INTERVAL = timedelta(hours=1)
+TWEET_INTERVAL = timedelta(hours=3)
+# (Time left until kickoff, polling interval), the first matching row is used
+POLL_SCHEDULE = [
+    (timedelta(hours=6), timedelta(minutes=10)),
+    (timedelta(days=1), timedelta(minutes=30)),
+    (timedelta(days=3), timedelta(hours=1)),
+    (timedelta(days=7), timedelta(hours=3)),
+]
+DEFAULT_POLL_INTERVAL = timedelta(hours=6)  # Far-off events and events without a kickoff time
+MAX_SLEEP = timedelta(minutes=1)
+
+
+def get_poll_interval(kickoff: Optional[datetime], now: datetime) -> timedelta:
+    """Returns how long to wait before polling an event again.
+    Args:
+        kickoff (Optional[datetime]):
+            The kickoff time of the event, if known.
+        now (datetime):
+            The current time.
+    Returns:
+        timedelta:
+            The polling interval from POLL_SCHEDULE, or DEFAULT_POLL_INTERVAL.
+    """
+    if kickoff is None:
+        return DEFAULT_POLL_INTERVAL
+    time_left = kickoff - now
+    for max_time_left, interval in POLL_SCHEDULE:
+        if time_left <= max_time_left:
+            return interval
+    return DEFAULT_POLL_INTERVAL
+
+
+def run_daemon(tweet_header: str, tweet: bool = True, archive: bool = False, metrics_path: Optional[str] = None):
+    """Polls the upcoming events forever, each on an interval adapted to its kickoff.
+    Args:
+        tweet_header (str):
+            The text of the tweet that the images are attached to.
+        tweet (bool):
+            Whether to post tweets, or only keep the snapshots up to date.
+        archive (bool):
+            Whether to also save the tweeted images to disk.
+        metrics_path (Optional[str]):
+            Where to write the HTTP metrics after every round of polls, if anywhere.
+    """
+    norway_timezone = pytz.timezone("Europe/Oslo")
+    scheduled_events: Dict[str, Dict] = {}
+    next_discovery = datetime.now(norway_timezone)
+    next_tweet = next_discovery  # The first tweet goes out as soon as the first round of polls is done
+
+    while True:
+        now = datetime.now(norway_timezone)
+        if now >= next_discovery:
+            scheduled_events = discover_events(scheduled_events, now)
+            next_discovery = now + DISCOVERY_INTERVAL
+
+        # The events that are due are polled together, sharing the request slots fairly between the organizers
+        due_events = [scheduled for scheduled in scheduled_events.values() if now >= scheduled["next_poll"]]
+        if due_events:
+            dir_paths = scrape_tools.poll_events([scheduled["event"] for scheduled in due_events])
+            for scheduled, dir_path in zip(due_events, dir_paths):
+                if dir_path is not None:  # Otherwise the last complete poll is tweeted, and this one resumed later
+                    scheduled["dir_path"] = dir_path
+                scheduled["next_poll"] = now + get_poll_interval(scheduled["kickoff"], now)
+                title = str(scheduled["event"]["title"]).replace('\n', "")
+                print(f"Next update of '{title}' at {scheduled['next_poll'].strftime('%H:%M %d/%m/%Y')}")
+            if metrics_path:
+                scrape_tools.export_http_metrics(metrics_path)
+
+        if now >= next_tweet:
+            if tweet:
+                publish_tweet(tweet_header, scheduled_events, archive)
+            next_tweet = now + TWEET_INTERVAL
+
+        next_polls = [scheduled["next_poll"] for scheduled in scheduled_events.values()]
+        next_wakeup = min([next_discovery, next_tweet] + next_polls)
+        sleep_time = min(next_wakeup - datetime.now(norway_timezone), MAX_SLEEP)
+        time.sleep(max(sleep_time.total_seconds(), 0))
+
+
+def discover_events(scheduled_events: Dict[str, Dict], now: datetime) -> Dict[str, Dict]:
+    """Refreshes the list of upcoming events, keeping the schedule of the known ones.
+
+    Events that have kicked off are dropped, as are events that are no longer listed.
+    If the event page of an organizer can't be scraped, the current schedule of its events is
+    kept as is. Events are keyed like their snapshots, so two organizers selling a match with
+    the same title don't collide. The organizers are visited one by one, as that's a single
+    request each once their ticket links are cached, while the polls share the fair pool.
+    """
+    refreshed_events = {}
+    for organizer in scrape_tools.load_organizers():
+        try:
+            event_list = scrape_tools.get_organizer_events(organizer, "all")
+        except Exception as e:
+            print(f"Failed to get the upcoming events of {organizer['name']}:", e)
+            event_list = None
+        if event_list is None:
+            refreshed_events.update({event_key: scheduled for event_key, scheduled in scheduled_events.items()
+                                     if scheduled["event"]["organizer"] == organizer["name"]})
+            continue
+
+        for event in event_list:
+            title = str(event["title"]).replace('\n', "")
+            kickoff = scrape_tools.get_kickoff_from_event_date(str(event["time"]))
+            if kickoff is not None and kickoff < now:
+                continue
+            event_key = os.path.basename(scrape_tools.get_directory_path(title, event["namespace"]))
+            scheduled = scheduled_events.get(event_key, {"next_poll": now, "dir_path": None})
+            scheduled.update({"event": event, "kickoff": kickoff})
+            refreshed_events[event_key] = scheduled
+    return refreshed_events
+
+
+def publish_tweet(tweet_header: str, scheduled_events: Dict[str, Dict], archive: bool):
+    """Tweets the latest snapshot of every event that has been polled and has changed since it was last tweeted."""
+    from imagify import HOME_LOGO, get_image_names, render_images, save_images
+    from twitter import create_tweet
+
+    dir_paths = [scheduled["dir_path"] for scheduled in scheduled_events.values() if scheduled["dir_path"]]
+    if not dir_paths:
+        print("No upcoming events")
+        return
+    changed_dir_paths = scrape_tools.get_changed_events(dir_paths)
+    if not changed_dir_paths:
+        print("No changes since the last tweet")
+        return
+    archived_images, archived_names = [], []
+    for organizer, organizer_dir_paths in scrape_tools.group_by_organizer(changed_dir_paths):
+        try:  # Every organizer gets its own tweet, so one failing doesn't stop the others
+            strings = [scrape_tools.create_event_string(dir_path) for dir_path in organizer_dir_paths]
+            images = render_images(strings, home_logo=organizer.get("logo", HOME_LOGO))
+            if archive:
+                archived_images += images
+                archived_names += get_image_names(len(images), organizer["namespace"])
+            create_tweet(organizer.get("tweet_header", tweet_header), images, organizer.get("publisher_prefix", ""))
+            scrape_tools.mark_published(organizer_dir_paths)
+        except Exception as e:
+            print(f"Failed to publish the tweet of {organizer['name']}:", e)
+    if archived_images:
+        save_images(archived_images, archived_names)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Persistent on-disk cache for conditional GET requests.
+# Responses carrying an ETag or Last-Modified header are stored, so the next request for the
+# same URL can ask the server whether anything changed and reuse the body on a 304.
+# The worker processes on a host share the cache directory, so the size a process keeps count of
+# misses what the others write. It is counted again from the directory every SIZE_RESCAN_INTERVAL
+# and before evicting, so the cache only grows past its maximum for that long.
+
+SIZE_RESCAN_INTERVAL = 60  # Seconds
+
+
+class HttpCache:
+    def __init__(self, cache_dir: str, max_size: int):
+        """Create a cache in the given directory.
+        Args:
+            cache_dir (str):
+                The directory where cached bodies and their metadata are stored.
+            max_size (int):
+                The maximum total size of the cached bodies in bytes. The least recently
+                used entries are evicted when the cache grows past this limit.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._total_size = None
+        self._size_counted = 0.0  # When the size was last counted from the directory
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Return the validator headers to send with a request for the URL, if it is cached."""
+        meta = self._load_meta(url)
+        if meta is None:
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, url: str) -> Optional[requests.Response]:
+        """Rebuild the cached response for a URL after the server answered 304 Not Modified.
+        Args:
+            url (str):
+                The URL of the cached response.
+        Returns:
+            Optional[requests.Response]:
+                The cached response, or None if the URL is not cached.
+        """
+        body_path, _ = self._get_paths(url)
+        meta = self._load_meta(url)
+        if meta is None:
+            return None
+        try:
+            with open(body_path, "rb") as body_file:
+                body = body_file.read()
+            os.utime(body_path)  # Marks the entry as recently used
+        except OSError:
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def store(self, url: str, response: requests.Response):
+        """Save a successful response if the server supplied a validator for it."""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or (etag is None and last_modified is None):
+            return
+
+        body_path, meta_path = self._get_paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": response.encoding,
+            "headers": {key: value for key, value in response.headers.items() if key.lower() == "content-type"},
+        }
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            total_size = self._get_total_size()
+            old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            # Write to temporary files first so a concurrent reader never sees a half-written entry.
+            # They are named after the process, as the worker processes on a host share the cache.
+            temporary_suffix = f".{os.getpid()}.tmp"
+            with open(body_path + temporary_suffix, "wb") as body_file:
+                body_file.write(response.content)
+            with open(meta_path + temporary_suffix, "w") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(body_path + temporary_suffix, body_path)
+            os.replace(meta_path + temporary_suffix, meta_path)
+
+            self._total_size = total_size - old_size + len(response.content)
+            if self._total_size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache fits within its maximum size."""
+        self._total_size = None  # Other processes may have added or evicted entries since the last count
+        self._get_total_size()
+        body_files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                      if name.endswith(".body")]
+        for body_path in sorted(body_files, key=os.path.getmtime):
+            if self._total_size <= self.max_size:
+                break
+            try:
+                self._total_size -= os.path.getsize(body_path)
+                os.remove(body_path)
+                os.remove(body_path[:-len(".body")] + ".json")
+            except FileNotFoundError:  # Evicted by another process sharing the cache
+                continue
+
+    def _get_total_size(self) -> int:
+        if self._total_size is None or time.monotonic() - self._size_counted > SIZE_RESCAN_INTERVAL:
+            self._total_size = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".body"):
+                    try:
+                        self._total_size += os.path.getsize(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:  # Evicted by another process sharing the cache
+                        continue
+            self._size_counted = time.monotonic()
+        return self._total_size
+
+    def _load_meta(self, url: str) -> Optional[Dict]:
+        _, meta_path = self._get_paths(url)
+        try:
+            with open(meta_path, "r") as meta_file:
+                return json.load(meta_file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _get_paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".body"), os.path.join(self.cache_dir, key + ".json")
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+# Per-endpoint request metrics of the scraper's session.
+# Every response is recorded from a requests response hook: its status, its latency including
+# the body, its size, and the retries the urllib3 Retry adapter made before it. Requests that
+# fail outright are recorded by the caller. The counters are cumulative for the life of the
+# process, so the daemon can export them over and over, as a JSON summary or in the Prometheus
+# text format (e.g. for the textfile collector of node_exporter).
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+METRIC_PREFIX = "brann_http"
+
+
+class HttpMetrics:
+    """Collects request metrics per endpoint class, and exports them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, Dict] = {}
+        self.connections: Dict[str, Dict[str, int]] = {}
+        self.started = time.time()
+
+    def get_endpoint(self, endpoint: str) -> Dict:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {
+                "requests": 0,
+                "statuses": {},
+                "retries": 0,
+                "errors": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+                "max_seconds": 0.0,
+                "buckets": [0] * len(LATENCY_BUCKETS),
+            }
+        return self.endpoints[endpoint]
+
+    def record_response(self, endpoint: str, response: requests.Response):
+        """Record a response, reading its body so the download counts towards the latency.
+
+        Statuses that were retried by the adapter are counted too, under their own status code.
+        """
+        start = time.perf_counter()
+        size = len(response.content)
+        seconds = response.elapsed.total_seconds() + time.perf_counter() - start
+        retries = getattr(response.raw, "retries", None)
+        retried_statuses = [attempt.status for attempt in retries.history] if retries is not None else []
+
+        with self.lock:
+            metrics = self.get_endpoint(endpoint)
+            metrics["requests"] += 1
+            metrics["retries"] += len(retried_statuses)
+            for status in retried_statuses + [response.status_code]:
+                if status is not None:
+                    metrics["statuses"][status] = metrics["statuses"].get(status, 0) + 1
+            metrics["bytes"] += size
+            metrics["seconds"] += seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+            for index, bucket in enumerate(LATENCY_BUCKETS):
+                if seconds <= bucket:
+                    metrics["buckets"][index] += 1
+
+    def record_error(self, endpoint: str):
+        """Record a request that failed without a response, e.g. after running out of retries."""
+        with self.lock:
+            metrics = self.get_endpoint(endpoint)
+            metrics["requests"] += 1
+            metrics["errors"] += 1
+
+    def record_connections(self, adapter: requests.adapters.HTTPAdapter):
+        """Record how many connections were opened to every host, to tell how well they are reused."""
+        with self.lock:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    self.connections[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                        "opened": pool.num_connections,
+                        "requests": pool.num_requests,
+                    }
+
+    def summary(self) -> Dict:
+        """Return the metrics per endpoint class, with the mean latency and the 429 rate worked out."""
+        with self.lock:
+            endpoints = {}
+            for endpoint, metrics in sorted(self.endpoints.items()):
+                responses = metrics["requests"] - metrics["errors"]
+                attempts = sum(metrics["statuses"].values())
+                endpoints[endpoint] = {
+                    "requests": metrics["requests"],
+                    "errors": metrics["errors"],
+                    "retries": metrics["retries"],
+                    "statuses": {str(status): count for status, count in sorted(metrics["statuses"].items())},
+                    "rate_limited_share": metrics["statuses"].get(429, 0) / attempts if attempts else 0.0,
+                    "bytes": metrics["bytes"],
+                    "seconds": round(metrics["seconds"], 6),
+                    "mean_seconds": round(metrics["seconds"] / responses, 6) if responses else 0.0,
+                    "max_seconds": round(metrics["max_seconds"], 6),
+                }
+            return {
+                "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "endpoints": endpoints,
+                "connections": dict(self.connections),
+            }
+
+    def to_prometheus(self) -> str:
+        """Format the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def add(name: str, metric_type: str, help_text: str, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            add("requests_total", "counter", "Requests sent, including the ones that failed.",
+                [({"endpoint": endpoint}, metrics["requests"]) for endpoint, metrics in endpoints])
+            add("responses_total", "counter", "Responses received, including the ones that were retried.",
+                [({"endpoint": endpoint, "status": status}, count) for endpoint, metrics in endpoints
+                 for status, count in sorted(metrics["statuses"].items())])
+            add("retries_total", "counter", "Retries made by the retry adapter.",
+                [({"endpoint": endpoint}, metrics["retries"]) for endpoint, metrics in endpoints])
+            add("errors_total", "counter", "Requests that failed without a response.",
+                [({"endpoint": endpoint}, metrics["errors"]) for endpoint, metrics in endpoints])
+            add("response_bytes_total", "counter", "Bytes of response bodies received.",
+                [({"endpoint": endpoint}, metrics["bytes"]) for endpoint, metrics in endpoints])
+
+            lines.append(f"# HELP {METRIC_PREFIX}_request_duration_seconds Time until the whole body was read.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_request_duration_seconds histogram")
+            for endpoint, metrics in endpoints:
+                for bucket, count in zip(LATENCY_BUCKETS, metrics["buckets"]):
+                    lines.append(f'{METRIC_PREFIX}_request_duration_seconds_bucket'
+                                 f'{{endpoint="{endpoint}",le="{bucket}"}} {count}')
+                responses = metrics["requests"] - metrics["errors"]
+                lines.append(f'{METRIC_PREFIX}_request_duration_seconds_bucket'
+                             f'{{endpoint="{endpoint}",le="+Inf"}} {responses}')
+                lines.append(f'{METRIC_PREFIX}_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+                             f'{metrics["seconds"]:.6f}')
+                lines.append(f'{METRIC_PREFIX}_request_duration_seconds_count{{endpoint="{endpoint}"}} {responses}')
+
+            connections = sorted(self.connections.items())
+            add("connections_opened", "gauge", "Connections opened to a host by the current pool.",
+                [({"host": host}, counts["opened"]) for host, counts in connections])
+            add("pool_requests", "gauge", "Requests sent to a host by the current pool.",
+                [({"host": host}, counts["requests"]) for host, counts in connections])
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, adapter: Optional[requests.adapters.HTTPAdapter] = None):
+        """Write the metrics to a file, in the Prometheus format if it ends with '.prom' and as JSON otherwise.
+
+        The file is replaced atomically, so a collector never reads a half-written file.
+        """
+        if adapter is not None:
+            self.record_connections(adapter)
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.summary(), indent=2)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(text)
+        os.replace(temporary_path, path)
@@ -1,7 +1,12 @@
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Union
 
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import atexit
+import io
 import os
+import string
 import textwrap
 
 # Copy of code found here: https://rk.edu.pl/en/generating-memes-and-infographics-with-pillow/
@@ -10,14 +15,22 @@ import textwrap
 SAVE_PATH = os.path.dirname(os.path.abspath(__file__)) + "/"
 FONT_PATH = "imagify/SFMonoRegular.otf"  # Path from this file
 SERIEN = "Eliteserien 2023"
+HOME_LOGO = "brann.png"  # Logo stitched next to the opponent's, organizers may have their own
+IMAGE_WORKERS = os.cpu_count() or 1  # Processes used to render images in parallel
+IN_PROCESS_IMAGES = 3  # Up to this many images are rendered in this process, as starting the pool takes longer
+COMPOSITE_CACHE_SIZE = 32  # Number of stitched logos kept in memory
+PERSIST_COMPOSITES = True  # Also keep the stitched logos as files in COMPOSITE_PATH
+COMPOSITE_PATH = SAVE_PATH + "imagify/composites/"
+LINE_SPACING = 4  # Pixels between lines of text
+ATLAS_CHARACTERS = string.ascii_letters + string.digits + string.punctuation + "æøåÆØÅéöÖü"
 
 
 class Imagify:
     BACKGROUND_COLOR = (227, 26, 34)  # Red color as RGB tuple
     TEXT_COLOR = (255, 255, 255)  # White color as RGB tuple
 
-    def __init__(self, image_path, caption):
-        self.image_path = image_path
+    def __init__(self, image, caption):
+        self.image = image  # Path to the image, or an already opened image
         self.caption = caption
 
     def generate(self):
@@ -31,7 +44,9 @@ class Imagify:
         return image
 
     def _get_image_object(self):
-        return Image.open(self.image_path)
+        if isinstance(self.image, Image.Image):
+            return self.image
+        return Image.open(self.image)
 
 
 def draw_border(image, border_size, border_color):
@@ -44,30 +59,63 @@ def draw_border(image, border_size, border_color):
 
 
 def get_text_as_image(text, text_color, text_size, image_width, background_color):
-    placeholder = Image.new('RGB', (0, 0), background_color)
-    font = get_font(size=text_size)
-    draw_canvas = ImageDraw.Draw(placeholder)
-    text_width, text_height = draw_canvas.textsize(text, font=font)
-    if text_width > image_width:
+    layout = get_text_layout(text_size)
+    lines = text.split("\n")
+    block_width = max(layout.get_text_width(line) for line in lines)
+    if block_width > image_width:
         print("Text too big")
-        character_width = text_width / len(text)
-        max_characters_count = int(image_width / character_width)
-        text_lines = wrap_text(text, wrap_width=max_characters_count)
+        max_characters_count = int(image_width / layout.advance)
+        lines = wrap_text(text, wrap_width=max_characters_count)
+        centered = True
     else:
-        text_lines = [text]
+        centered = False
 
-    total_text_height = len(text_lines) * text_height
+    total_text_height = len(lines) * layout.line_height - LINE_SPACING
     image = Image.new('RGB', (image_width, total_text_height), background_color)
-    draw_canvas = ImageDraw.Draw(image)
-
-    for row, line in enumerate(text_lines):
-        row_height = row * text_height
-        line_width, _ = draw_canvas.textsize(line, font=font)
-        left = (image_width - line_width) / 2
-        draw_canvas.text((left, row_height), line, fill=text_color, font=font)
+    block_left = int((image_width - block_width) / 2)
+    for row, line in enumerate(lines):
+        # Lines are left aligned inside a centered block, unless they had to be wrapped
+        left = int((image_width - layout.get_text_width(line)) / 2) if centered else block_left
+        layout.draw_line(image, (left, row * layout.line_height), line, text_color)
     return image
 
 
+class TextLayout:
+    """
+    Lays out text in a monospace font of a single size.
+    Every glyph is rasterised once into an atlas of masks, and lines are composed by
+    pasting those masks side by side, so measuring a line is plain arithmetic.
+    """
+    def __init__(self, size):
+        self.font = get_font(size)
+        self.advance = self.font.getlength("M")
+        self.line_height = self.font.getbbox("A")[3] + LINE_SPACING
+        self.glyphs = {}
+        for character in ATLAS_CHARACTERS:
+            self.get_glyph(character)
+
+    def get_glyph(self, character):
+        """Returns the mask of a character and its offset from the pen position, rasterising it if needed."""
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            left, top, right, bottom = self.font.getbbox(character)
+            mask = Image.new("L", (max(right - left, 0), max(bottom - top, 0)), 0)
+            if mask.width > 0 and mask.height > 0:
+                ImageDraw.Draw(mask).text((-left, -top), character, fill=255, font=self.font)
+            glyph = self.glyphs[character] = (mask, left, top)
+        return glyph
+
+    def get_text_width(self, line):
+        return int(len(line) * self.advance)
+
+    def draw_line(self, image, position, line, text_color):
+        x, y = position
+        for column, character in enumerate(line):
+            mask, left, top = self.get_glyph(character)
+            if mask.width > 0 and mask.height > 0:
+                image.paste(text_color, (int(x + column * self.advance) + left, y + top), mask)
+
+
 def bottom_expand_image_with_image(image, expand_image, background_color):
     width = image.size[0]
     height = image.size[1] + expand_image.size[1]
@@ -82,39 +130,124 @@ def wrap_text(text, wrap_width):
     return wrapper.wrap(text)
 
 
+@lru_cache(maxsize=None)
 def get_font(size):
     path = os.path.join(SAVE_PATH + FONT_PATH)
     return ImageFont.truetype(path, size=size)
 
 
-def generate_images(strings: List[str]) -> List[str]:
+@lru_cache(maxsize=None)
+def get_text_layout(size):
+    return TextLayout(size)
+
+
+def generate_images(strings: List[str], workers: Optional[int] = None) -> List[str]:
     """
-    Generates images based on the provided list of match titles.
-    For each string in the provided list, this function determines the appropriate image
-    and modifies the string's header.
+    Generates images based on the provided list of match titles and saves them to disk.
     Args:
         strings (List[str]): A list of strings containing the match titles from ticketco.
+        workers (Optional[int]): The number of processes to render with, IMAGE_WORKERS by default.
     Returns:
         List[str]:
-            A list containing the paths to the generated images.
+            A list containing the paths to the generated images, in the same order as the strings.
+    """
+    return save_images(render_images(strings, workers))
+
+
+def render_images(strings: List[str], workers: Optional[int] = None, home_logo: str = HOME_LOGO) -> List[bytes]:
+    """
+    Renders images based on the provided list of match titles, without touching the disk.
+    For each string in the provided list, this function determines the appropriate image
+    and modifies the string's header. More than IN_PROCESS_IMAGES images are rendered in a pool of processes.
+    Args:
+        strings (List[str]): A list of strings containing the match titles from ticketco.
+        workers (Optional[int]): The number of processes to render with, IMAGE_WORKERS by default.
+        home_logo (str): The logo of the organizer in the imagify folder, HOME_LOGO by default.
+    Returns:
+        List[bytes]:
+            The JPEG encoded images, in the same order as the strings.
+    """
+    workers = min(workers or IMAGE_WORKERS, len(strings))
+    if workers <= 1 or len(strings) <= IN_PROCESS_IMAGES:
+        return [render_image(string, home_logo) for string in strings]
+    return list(get_render_pool(workers).map(render_image, strings, [home_logo] * len(strings)))
+
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_workers = 0
+
+
+def get_render_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the process pool shared by every call of render_images, starting it on first use.
+
+    The pool is kept until the program exits, so the daemon starts its processes once instead of
+    on every tweet. Asking for more workers than the pool has replaces it with a bigger one.
+    """
+    global _render_pool, _render_pool_workers
+    if _render_pool is None or _render_pool_workers < workers:
+        shutdown_render_pool()
+        _render_pool, _render_pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+    return _render_pool
+
+
+@atexit.register
+def shutdown_render_pool():
+    """Stop the processes of the render pool, the next render_images call starts a new one."""
+    global _render_pool, _render_pool_workers
+    if _render_pool is not None:
+        _render_pool.shutdown()
+        _render_pool, _render_pool_workers = None, 0
+
+
+def render_image(string: str, home_logo: str = HOME_LOGO) -> bytes:
+    """
+    Renders the image of a single match.
+    Args:
+        string (str): The string containing the match title from ticketco on its first line.
+        home_logo (str): The logo of the organizer in the imagify folder.
+    Returns:
+        bytes: The image encoded as a JPEG.
+    """
+    # Split the string in lines and use the first line to fetch the image and a custom header
+    lines = string.splitlines()
+    image, lines[0] = get_image(str(lines[0]), home_logo)
+    modified_string = '\n'.join(lines)
+
+    # Create the images using the image and the modified_string
+    image_object = Imagify(image, modified_string).generate()
+    buffer = io.BytesIO()
+    image_object.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def get_image_names(count: int, namespace: str = "") -> List[str]:
+    """
+    Names the images of an organizer after their position, prefixed with the organizer's namespace if it has one.
+    Args:
+        count (int): The number of images.
+        namespace (str): The namespace of the organizer.
+    Returns:
+        List[str]: The file names, without the extension.
+    """
+    prefix = namespace + "-" if namespace else ""
+    return [prefix + "ticket_sale_result" + str(iteration) for iteration in range(count)]
+
+
+def save_images(images: List[bytes], names: Optional[List[str]] = None) -> List[str]:
+    """
+    Saves encoded images to disk, named after their position in the list by default.
+    Args:
+        images (List[bytes]): The JPEG encoded images.
+        names (Optional[List[str]]): The file name of every image, without the extension.
+    Returns:
+        List[str]: The paths to the saved images.
     """
-    iteration = 0
     image_paths = []
-    for string in strings:
-        # Split the string in lines and use the first line to fetch image_path and a custom header
-        lines = string.splitlines()
-        image_path, lines[0] = get_image(str(lines[0]))
-        modified_string = '\n'.join(lines)
-
-        # Image output name
-        image_name = "ticket_sale_result" + str(iteration) + ".jpg"
-
-        # Create the images using the image path and the modified_string
-        image_object = Imagify(os.path.join(image_path), modified_string).generate()
-        full_image_path = os.path.join(SAVE_PATH, image_name)
-        image_object.save(full_image_path, quality=90)
-        iteration += 1
-        image_paths.append(full_image_path)
+    for image, name in zip(images, names or get_image_names(len(images))):
+        image_path = os.path.join(SAVE_PATH, name + ".jpg")
+        with open(image_path, "wb") as image_file:
+            image_file.write(image)
+        image_paths.append(image_path)
     return image_paths
 
 
@@ -149,38 +282,74 @@ IMAGE_MAP = {
 }
 
 
-def get_image(line: str) -> Tuple[str, str]:
+def get_image(line: str, home_logo: str = HOME_LOGO) -> Tuple[Union[str, Image.Image], str]:
     """
-    Retrieves the associated image path and title based on keywords found in the provided line.
+    Retrieves the associated image and title based on keywords found in the provided line.
     This function searches for keywords within the provided line. Based on these keywords,
-    it returns the corresponding image path and title. If no keyword is matched, a default
-    image and title (the line itself) is returned.
+    it returns the corresponding image and title. If no keyword is matched, a default
+    image and title (the line itself) is returned. The titles in IMAGE_MAP name Brann as the
+    home team, so for any other organizer the line itself is kept as the title.
     Args:
         line (str): The line of text containing the match title from ticketco.
+        home_logo (str): The logo of the organizer in the imagify folder.
     Returns:
-        Tuple[str, str]:
-            - The full path to the associated or default image.
+        Tuple[Union[str, Image.Image], str]:
+            - The full path to the associated or default image, or the stitched logos of both teams.
             - The title or header associated with the matched keyword or the truncated line itself.
     """
     line_lower = line.lower()
 
     for keywords, (image_name, title) in IMAGE_MAP.items():
+        if image_name == home_logo:  # The organizer's own name in the title
+            continue
         if any(keyword in line_lower for keyword in keywords):
             if "partoutkort" in line_lower:
                 return f"{SAVE_PATH}imagify/{image_name}", title
-            path1, path2 = f"{SAVE_PATH}imagify/brann.png", f"{SAVE_PATH}imagify/{image_name}"
-            return stitch_images(path1, path2), title
+            if home_logo != HOME_LOGO:
+                title = line[:35]
+            return get_composite_logo(image_name, home_logo), title
 
     # default case
     if len(line) > 35:  # Cuts the line at the 40th character to prevent formatting error
         line = line[:35]
+    if home_logo != HOME_LOGO:
+        return f"{SAVE_PATH}imagify/{home_logo}", line
     return f"{SAVE_PATH}imagify/default.png", line
 
 
-def stitch_images(image_path1, image_path2):
+@lru_cache(maxsize=COMPOSITE_CACHE_SIZE)
+def get_composite_logo(image_name: str, home_logo: str = HOME_LOGO) -> Image.Image:
+    """
+    Returns the logo of the organizer (Brann by default) stitched together with the logo of the opponent.
+    The result is kept in memory, and as a file in COMPOSITE_PATH if PERSIST_COMPOSITES
+    is set, so every opponent is only stitched once. The returned image is shared, don't modify it.
+    Args:
+        image_name (str): The file name of the opponent's logo in the imagify folder.
+        home_logo (str): The file name of the organizer's logo in the imagify folder.
+    Returns:
+        Image.Image: The stitched logos.
+    """
+    path1, path2 = f"{SAVE_PATH}imagify/{home_logo}", f"{SAVE_PATH}imagify/{image_name}"
+    composite_name = image_name if home_logo == HOME_LOGO else f"{os.path.splitext(home_logo)[0]}_{image_name}"
+    composite_path = os.path.join(COMPOSITE_PATH, composite_name)
+    if PERSIST_COMPOSITES and os.path.exists(composite_path) and \
+            os.path.getmtime(composite_path) >= max(os.path.getmtime(path1), os.path.getmtime(path2)):
+        with Image.open(composite_path) as composite:
+            return composite.convert("RGB")
+
+    result_image = stitch_images(path1, path2)
+    if PERSIST_COMPOSITES:
+        # Written under a temporary name first, since other render processes may be reading it
+        os.makedirs(os.path.dirname(composite_path), exist_ok=True)
+        temporary_path = f"{composite_path}.{os.getpid()}.tmp"
+        result_image.save(temporary_path, format="PNG")
+        os.replace(temporary_path, composite_path)
+    return result_image
+
+
+def stitch_images(image_path1, image_path2) -> Image.Image:
     """
-    Method to stitch together two logos and return the path to a
-    temp_image where they're stitched together.
+    Method to stitch together two logos and return the image where they're stitched together.
     """
     def paste_centered(image, canvas_size, background_color):
         canvas = Image.new("RGB", canvas_size, background_color)
@@ -211,8 +380,4 @@ def stitch_images(image_path1, image_path2):
     canvas2 = paste_centered(image2, logo_size, background_color_rgb)
 
     # Combine the canvases horizontally
-    result_image = combine_horizontally(canvas1, canvas2, background_color_rgb)
-
-    # Save or display the result
-    result_image.save(f"{SAVE_PATH}imagify/temp.png")  # Save the result to a file
-    return f"{SAVE_PATH}imagify/temp.png"
+    return combine_horizontally(canvas1, canvas2, background_color_rgb)
@@ -1,17 +1,146 @@
 #!/usr/bin/env python3
-from imagify import generate_images
-from scrape_tools import update_events
-from twitter import create_tweet
+import argparse
+import importlib
+import os
+import time
+
+TWEET_HEADER = ("Info om billettsalget for Brann sine kommende hjemmekamper!"
+                "\nEkskl. bortefelt & fjordkraft sin ståtribune."
+                "\n(Antall solgt, endring i antall solgt og prosent antall solgt)")
+
+# The modules of every stage are only imported when the stage runs, so a run that ends with
+# "No upcoming events" never loads Pillow or the Twitter client. An import slower than its budget
+# is reported, so a dependency that makes every cron run slower doesn't go unnoticed.
+IMPORT_BUDGETS = {  # Seconds
+    "scrape_tools": 0.35,
+    "tracing": 0.05,
+    "daemon": 0.4,
+    "imagify": 0.15,
+    "twitter": 0.05,
+    "workers": 0.05,
+    "seat_diff": 0.05,
+}
+
+import_times = {}
+
+
+def lazy_import(name: str):
+    """Import a module, recording how long it took and warning if it went over its budget."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - start
+    budget = IMPORT_BUDGETS.get(name)
+    if budget is not None and import_times[name] > budget:
+        print(f"Importing {name} took {import_times[name]:.3f} s, over its budget of {budget:.3f} s")
+    return module
+
+
+def print_import_times():
+    for name, seconds in import_times.items():
+        budget = IMPORT_BUDGETS.get(name)
+        budget_text = f"/ {budget:.3f} s" if budget is not None else ""
+        print(f"import {name:<14} {seconds:8.3f} s {budget_text}")
+
 
 if __name__ == "__main__":
-    # Valid parameters: 'all', 'next', 'none' or 'debug'
-    strings = update_events("all")
-
-    if strings:
-        images = generate_images(strings)
-        tweet_header = ("Info om billettsalget for Brann sine kommende hjemmekamper!"
-                        "\nEkskl. bortefelt & fjordkraft sin ståtribune."
-                        "\n(Antall solgt, endring i antall solgt og prosent antall solgt)")
-        create_tweet(tweet_header, images)
+    parser = argparse.ArgumentParser(description="Count the ticket sales of Brann's upcoming home matches.")
+    parser.add_argument("option", nargs="?", choices=["all", "next", "none", "debug"],
+                        help="which events to update (default: all)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and poll every event more often as kickoff gets closer")
+    parser.add_argument("--archive", action="store_true",
+                        help="also save the tweeted images as [<namespace>-]ticket_sale_result<N>.jpg")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write HTTP metrics to PATH, in the Prometheus text format if it ends with .prom "
+                             "and as JSON otherwise")
+    parser.add_argument("--profile", metavar="TRACE",
+                        help="write timed spans of every stage and event to TRACE, in the Chrome trace format")
+    parser.add_argument("--profile-stages", metavar="DIR",
+                        help="with --profile, also write a cProfile <stage>.pstats file per stage to DIR; the "
+                             "profiles of stages that run on the event loop overlap with the other tasks")
+    parser.add_argument("--force", action="store_true",
+                        help="tweet every event, even the ones whose counts haven't changed since the last tweet")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="count the sections in N worker processes, for when a single process is too slow")
+    parser.add_argument("--serve", metavar="HOST:PORT",
+                        help="also hand out sections to workers on other hosts ('python workers.py work HOST:PORT'), "
+                             "which needs the same key on both sides")
+    parser.add_argument("--authkey", help="the key workers authenticate with (default: WORKER_AUTHKEY)")
+    parser.add_argument("--seat-diff", action="store_true",
+                        help="print how many seats were sold, released, locked and unlocked since the previous poll")
+    parser.add_argument("--import-times", action="store_true",
+                        help="print how long the modules of every stage took to import, next to their budgets")
+    args = parser.parse_args()
+    if args.profile_stages and not args.profile:
+        parser.error("--profile-stages requires --profile")
+    if args.daemon:
+        # The daemon picks its own events and times, so only the options it passes on are allowed
+        ignored = [name for name, value in [(f"the '{args.option}' option", args.option), ("--force", args.force),
+                                            ("--workers", args.workers), ("--serve", args.serve),
+                                            ("--authkey", args.authkey), ("--profile", args.profile),
+                                            ("--profile-stages", args.profile_stages),
+                                            ("--seat-diff", args.seat_diff), ("--import-times", args.import_times)]
+                   if value]
+        if ignored:
+            parser.error(f"--daemon can't be combined with {', '.join(ignored)}")
+    args.option = args.option or "all"
+
+    if args.daemon:
+        run_daemon = lazy_import("daemon").run_daemon
+        run_daemon(TWEET_HEADER, archive=args.archive, metrics_path=args.metrics)
     else:
-        print("No upcoming events")
+        scrape_tools = lazy_import("scrape_tools")
+        tracing = lazy_import("tracing")
+        if args.profile:
+            tracing.enable(args.profile_stages)
+        if (args.workers or args.serve) and args.option != "none":
+            workers = lazy_import("workers")
+            address = workers.parse_address(args.serve) if args.serve else None
+            dir_paths = workers.update_event_data_distributed(args.option, args.workers, address, args.authkey)
+        else:
+            dir_paths = scrape_tools.update_event_data(args.option, concurrent=True)
+        if args.metrics:
+            scrape_tools.export_http_metrics(args.metrics)
+        if args.seat_diff and args.option != "debug":
+            seat_diff = lazy_import("seat_diff")
+            for dir_path in dir_paths:
+                event_key = os.path.basename(dir_path)
+                diff = seat_diff.diff_latest_seat_captures(event_key)
+                if diff is None:
+                    print(f"No earlier seat capture of {event_key}")
+                else:
+                    print(seat_diff.format_seat_diff(event_key, diff))
+        if args.option == "debug":
+            dir_paths = []  # Debug runs only save the seat details
+        changed_dir_paths = dir_paths if args.force else scrape_tools.get_changed_events(dir_paths)
+
+        if changed_dir_paths:
+            imagify = lazy_import("imagify")
+            twitter = lazy_import("twitter")
+            archived_images, archived_names = [], []
+            try:  # The images rendered so far are archived even if an upload fails
+                # Every organizer gets a tweet of its own, with its own text, logo and account
+                for organizer, organizer_dir_paths in scrape_tools.group_by_organizer(changed_dir_paths):
+                    strings = [scrape_tools.create_event_string(dir_path) for dir_path in organizer_dir_paths]
+                    with tracing.span("rendering", images=len(strings), organizer=organizer["name"]):
+                        images = imagify.render_images(strings, home_logo=organizer.get("logo", imagify.HOME_LOGO))
+                    if args.archive:
+                        archived_images += images
+                        archived_names += imagify.get_image_names(len(images), organizer["namespace"])
+                    with tracing.span("upload", images=len(images), organizer=organizer["name"]):
+                        twitter.create_tweet(organizer.get("tweet_header", TWEET_HEADER), images,
+                                             organizer.get("publisher_prefix", ""))
+                    scrape_tools.mark_published(organizer_dir_paths)
+            finally:
+                if archived_images:
+                    imagify.save_images(archived_images, archived_names)
+        elif dir_paths:
+            print("No changes since the last tweet")
+        else:
+            print("No upcoming events")
+
+        if args.profile:
+            for stage, seconds in tracing.export(args.profile).items():
+                print(f"{stage:<16} {seconds:8.3f} s")
+        if args.import_times:
+            print_import_times()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+
+import scrape_tools
+
+# Offline copy of the ticket site, so the scraper can be run against a repeatable local target.
+# The recorder saves the homepage, the event pages, item_types.json and every section of every
+# upcoming event into a fixture bundle. The replay server serves the bundle back, optionally with
+# added latency, injected errors, and more events and sections than were recorded.
+#
+# Every organizer in organizers.json is recorded, from its own storefront if it has one.
+# A bundle is a directory with a manifest.json and a bodies/ folder. The manifest lists the
+# recorded origins, the homepage path of every storefront and every recorded path with its body
+# file and content type. Paths are served from a single local server, whatever their origin.
+
+MANIFEST_FILE = "manifest.json"
+BODIES_DIR = "bodies"
+ERROR_STATUSES = [429, 500, 502, 503, 504]
+RETRY_AFTER = 1  # Seconds, sent with injected 429 responses
+# Extra events are served under /replay/<event number>/<recorded path>
+REPLAY_PREFIX = re.compile(r"^/replay/(\d+)(/.*)$")
+# Extra sections get IDs from here on, each one a copy of a recorded section
+SYNTHETIC_SECTION_ID_START = 100000000
+SECTION_PATH = re.compile(r"^(.*/)sections/(\d+)\.json$")
+
+
+def record_fixtures(bundle_dir: str, next_or_all: str = "all") -> Dict:
+    """Record the pages and JSON files the scraper reads for every organizer into a fixture bundle.
+    Args:
+        bundle_dir (str):
+            The directory to save the bundle in. Existing recordings in it are replaced.
+        next_or_all (str):
+            Whether to record all upcoming events or just the next one of every organizer.
+    Returns:
+        Dict:
+            The manifest of the bundle.
+    """
+    os.makedirs(os.path.join(bundle_dir, BODIES_DIR), exist_ok=True)
+    homepage_urls = list(dict.fromkeys(scrape_tools.get_homepage_url(organizer)
+                                       for organizer in scrape_tools.load_organizers()))
+    manifest = {
+        "origins": list(dict.fromkeys(f"{urlsplit(url).scheme}://{urlsplit(url).netloc}" for url in homepage_urls)),
+        "homepage": urlsplit(homepage_urls[0]).path,
+        "homepages": [urlsplit(url).path for url in homepage_urls],
+        "recorded": datetime.now().isoformat(),
+        "responses": {},
+    }
+    lock = threading.Lock()
+
+    def record(url: str) -> Optional[str]:
+        try:
+            response = scrape_tools.session.get(url)
+            response.raise_for_status()
+        except scrape_tools.requests.exceptions.RequestException as e:
+            print("An error occurred:", e)
+            return None
+        path = get_path(url)
+        parts = urlsplit(url)
+        body_file = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        with open(os.path.join(bundle_dir, BODIES_DIR, body_file), "wb") as file:
+            file.write(response.content)
+        with lock:
+            if f"{parts.scheme}://{parts.netloc}" not in manifest["origins"]:
+                manifest["origins"].append(f"{parts.scheme}://{parts.netloc}")
+            manifest["responses"][path] = {
+                "body": body_file,
+                "content_type": response.headers.get("Content-Type", "text/html"),
+            }
+        return response.text
+
+    homepages = {}
+    for homepage_url in homepage_urls:
+        print("Recording " + homepage_url)
+        homepages[homepage_url] = record(homepage_url) or ""
+    events = []
+    for organizer in scrape_tools.load_organizers():
+        organizer_events = scrape_tools.parse_event_list(homepages[scrape_tools.get_homepage_url(organizer)],
+                                                         organizer["title_filter"])
+        events += organizer_events[:1] if next_or_all.lower() == "next" else organizer_events
+
+    with ThreadPoolExecutor(max_workers=scrape_tools.MAX_CONCURRENT_REQUESTS) as executor:
+        for event in events:
+            print(f"Recording '{event['title']}'... ", end="")
+            event_page = record(event["href"])
+            if event_page is None:
+                continue
+            event_url = scrape_tools.parse_nested_link(event_page)
+            item_types = record(event_url + "item_types.json")
+            if item_types is None:
+                continue
+            section_ids = scrape_tools.get_section_ids(json.loads(item_types))
+            list(executor.map(record, [f"{event_url}sections/{section}.json" for section in section_ids]))
+            print(f"{len(section_ids)} sections")
+
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    print(f"Recorded {len(manifest['responses'])} responses to {bundle_dir}")
+    return manifest
+
+
+def get_path(url: str) -> str:
+    """Return the path and query of a URL, which is what the bundle is keyed by."""
+    parts = urlsplit(url)
+    return parts.path + ("?" + parts.query if parts.query else "")
+
+
+class ReplayServer:
+    """Serves a fixture bundle over HTTP on localhost.
+
+    Every response is delayed by 'latency' seconds plus a random share of 'jitter' seconds,
+    and a share 'error_rate' of the requests is answered with a random status from
+    ERROR_STATUSES instead. Setting 'events' lists that many events on the homepage, cycling
+    through the recorded ones, and 'sections' gives every event that many sections, cycling
+    through its recorded sections. Responses carry an ETag, so conditional requests get 304.
+    The random choices are seeded, so a run can be repeated exactly.
+    """
+
+    def __init__(self, bundle_dir: str, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, events: Optional[int] = None, sections: Optional[int] = None,
+                 seed: int = 0):
+        with open(os.path.join(bundle_dir, MANIFEST_FILE), "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        self.origins = manifest["origins"]
+        self.homepage = manifest["homepage"]
+        self.homepages = manifest.get("homepages", [self.homepage])  # Bundles recorded before organizers had one
+        self.title_filters = [organizer["title_filter"] for organizer in scrape_tools.load_organizers()]
+        self.responses = {}
+        for path, response in manifest["responses"].items():
+            with open(os.path.join(bundle_dir, BODIES_DIR, response["body"]), "rb") as body_file:
+                self.responses[path] = (body_file.read(), response["content_type"])
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.events = events
+        self.sections = sections
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.status_counts: Dict[int, int] = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._create_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def homepage_url(self) -> str:
+        return self.url + self.homepage
+
+    @property
+    def requests(self) -> int:
+        return sum(self.status_counts.values())
+
+    def start(self) -> str:
+        """Serve in a background thread and return the homepage URL."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.homepage_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path: str, if_none_match: Optional[str]) -> Tuple[int, Dict[str, str], bytes]:
+        """Build the status, headers and body of the response to a GET request."""
+        with self.lock:
+            delay = self.latency + self.jitter * self.random.random()
+            error = self.random.random() < self.error_rate
+            error_status = self.random.choice(ERROR_STATUSES)
+        if delay > 0:
+            time.sleep(delay)
+        if error:
+            headers = {"Retry-After": str(RETRY_AFTER)} if error_status == 429 else {}
+            return error_status, headers, b""
+
+        response = self.get_body(path)
+        if response is None:
+            return 404, {}, b""
+        body, content_type = response
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if if_none_match == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": content_type}, body
+
+    def get_body(self, path: str) -> Optional[Tuple[bytes, str]]:
+        """Find the body to serve for a path, with the recorded links pointing back to this server."""
+        prefix = ""
+        match = REPLAY_PREFIX.match(path)
+        if match:
+            prefix, path = f"/replay/{match.group(1)}", match.group(2)
+
+        if path in self.homepages and path in self.responses and self.events is not None:
+            return self.get_homepage(path).encode("utf-8"), self.responses[path][1]
+
+        section_match = SECTION_PATH.match(path)
+        if section_match and int(section_match.group(2)) >= SYNTHETIC_SECTION_ID_START:
+            section_ids = self.get_recorded_section_ids(section_match.group(1))
+            if not section_ids:
+                return None
+            index = int(section_match.group(2)) - SYNTHETIC_SECTION_ID_START
+            path = f"{section_match.group(1)}sections/{section_ids[index % len(section_ids)]}.json"
+
+        if path not in self.responses:
+            return None
+        body, content_type = self.responses[path]
+        if path.endswith("item_types.json") and self.sections is not None:
+            body = self.scale_item_types(body)
+        elif "html" in content_type:
+            body = self.rewrite_links(body.decode("utf-8"), self.url + prefix).encode("utf-8")
+        return body, content_type
+
+    def rewrite_links(self, html: str, base_url: str) -> str:
+        """Point the links to every recorded origin to this server instead."""
+        for origin in self.origins:
+            html = html.replace(origin, base_url)
+        return html
+
+    def get_homepage(self, path: str) -> str:
+        """Render a recorded homepage with 'events' matches, copying the recorded ones in turn.
+
+        The matches are the events of any organizer in organizers.json. Copies after the first round
+        link to /replay/<number>/... and get the round in their title, so every listed event has its
+        own URL and its own snapshots.
+        """
+        soup = BeautifulSoup(self.responses[path][0].decode("utf-8"), "html.parser")
+        matches = [container for container in soup.find_all("div", class_="tc-events-list--details")
+                   if self.is_match(container.find("a", class_="tc-events-list--title").get_text(strip=True))]
+        if not matches:
+            return self.rewrite_links(str(soup), self.url)
+
+        anchor = matches[-1]
+        for number in range(self.events):
+            event = copy.copy(matches[number % len(matches)])
+            if number >= len(matches):
+                a_element = event.find("a", class_="tc-events-list--title")
+                a_element["href"] = f"{self.url}/replay/{number}{get_path(a_element['href'])}"
+                a_element.string = f"{a_element.get_text(strip=True)} {number // len(matches) + 1}"
+            anchor.insert_after(event)
+            anchor = event
+        for match in matches:
+            match.extract()
+        return self.rewrite_links(str(soup), self.url)
+
+    def is_match(self, title: str) -> bool:
+        return any(title_filter in title.lower() for title_filter in self.title_filters)
+
+    def get_recorded_section_ids(self, event_path: str) -> List[int]:
+        body, _ = self.responses.get(event_path + "item_types.json", (None, None))
+        return scrape_tools.get_section_ids(json.loads(body)) if body is not None else []
+
+    def scale_item_types(self, body: bytes) -> bytes:
+        """Resize the section list of an item_types.json to 'sections' entries.
+
+        Sections past the recorded ones are copies with IDs from SYNTHETIC_SECTION_ID_START.
+        """
+        item_types = json.loads(body)
+        recorded = item_types["item_types"][0]["sections"]
+        sections = recorded[:self.sections]
+        for index in range(len(recorded), self.sections):
+            section = dict(recorded[index % len(recorded)])
+            section["id"] = SYNTHETIC_SECTION_ID_START + index
+            sections.append(section)
+        item_types["item_types"][0]["sections"] = sections
+        return json.dumps(item_types).encode("utf-8")
+
+    def _create_handler(self):
+        replay_server = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, headers, body = replay_server.respond(self.path, self.headers.get("If-None-Match"))
+                with replay_server.lock:
+                    replay_server.status_counts[status] = replay_server.status_counts.get(status, 0) + 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keeps the scraper output readable
+
+        return ReplayHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record the ticket site to a fixture bundle, or serve one locally.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record the upcoming events to a bundle")
+    record_parser.add_argument("bundle", help="directory to save the bundle in")
+    record_parser.add_argument("option", nargs="?", default="all", choices=["all", "next"],
+                               help="which events to record (default: all)")
+    serve_parser = subparsers.add_parser("serve", help="serve a recorded bundle on localhost")
+    serve_parser.add_argument("bundle", help="directory of the bundle")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    serve_parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds")
+    serve_parser.add_argument("--error-rate", type=float, default=0.0,
+                              help="share of requests answered with 429 or 5xx (0-1)")
+    serve_parser.add_argument("--events", type=int, help="number of events to list, cycling the recorded ones")
+    serve_parser.add_argument("--sections", type=int, help="number of sections per event, cycling the recorded ones")
+    serve_parser.add_argument("--seed", type=int, default=0, help="seed for the latency and error injection")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_fixtures(args.bundle, args.option)
+    else:
+        replay = ReplayServer(args.bundle, args.port, args.latency, args.jitter, args.error_rate,
+                              args.events, args.sections, args.seed)
+        print(f"Serving {args.bundle} at {replay.homepage_url}")
+        print(f"Run the scraper against it with HOMEPAGE_URL={replay.homepage_url}")
+        for homepage in replay.homepages[1:]:
+            print(f"and point the 'homepage_url' of the organizer on that storefront at {replay.url + homepage}")
+        try:
+            replay.server.serve_forever()
+        except KeyboardInterrupt:
+            replay.stop()
@@ -1,18 +1,30 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import importlib.util
 import re
+import time
 import pytz
 import requests
 import json
 import os
 from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
-from bs4 import BeautifulSoup
+from functools import lru_cache
+from bs4 import BeautifulSoup, SoupStrainer
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from typing import List, Dict, Union, Tuple, Optional
-
-HOMEPAGE_URL = "https://brann.ticketco.events/no/nb"
+from adaptive_limiter import BACKOFF_STATUSES, AdaptiveLimiter, FairSemaphore
+from http_cache import HttpCache
+from http_metrics import HttpMetrics
+import snapshot_store
+import seat_capture
+import tracing
+
+# Can be pointed to a local replay server (see replay.py) through the environment
+HOMEPAGE_URL = os.environ.get("HOMEPAGE_URL", "https://brann.ticketco.events/no/nb")
 SAVE_PATH = os.path.dirname(os.path.abspath(__file__)) + "/"
+# Custom events belong to the organizer with the same namespace, the default one without a namespace
 CUSTOM_EVENTS = [
     # {
     #         "title": "Brann - Lyon",
@@ -20,18 +32,75 @@ CUSTOM_EVENTS = [
     #         "link": "https://ticketco.events/no/nb/events/382876/seating_arrangement/"
     # },
 ]
+# Bounds of the adaptive limit on simultaneous requests. The thread pools and the connection pool
+# are sized for the upper bound, while the limiter decides how many requests are actually in flight.
+MAX_CONCURRENT_REQUESTS = 32
+MIN_CONCURRENT_REQUESTS = 2
+INITIAL_CONCURRENT_REQUESTS = 8
+# Times a request is sent again after a 429 or 503, once the limiter's pause has passed
+RATE_LIMIT_RETRIES = 3
+HTTP_CACHE_PATH = SAVE_PATH + ".http_cache/"
+HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024  # Bytes
+# Saves the status of every seat on every poll, not only in 'debug' mode
+CAPTURE_SEATS_EVERY_POLL = True
+# How long the cached section layout of an event is trusted before it's rebuilt from scratch
+LAYOUT_MAX_AGE = timedelta(days=1)
+# The stands of every venue and the rules that assign sections to them
+VENUE_RULES_PATH = SAVE_PATH + "venues.json"
+# The storefronts that are scraped, each with its own title filter, venue rules and snapshot namespace
+ORGANIZERS_PATH = SAVE_PATH + "organizers.json"
+# Sections that fail are retried this many times, waiting SECTION_RETRY_DELAY seconds, doubled every time
+SECTION_RETRIES = 3
+SECTION_RETRY_DELAY = 2
+# How long the counted sections of an unfinished poll are kept to resume it, instead of starting over
+CHECKPOINT_MAX_AGE = timedelta(minutes=30)
+# How long the ticket page URL found on an event page is reused before the event page is fetched again
+TICKET_LINK_MAX_AGE = timedelta(days=7)
+# lxml is optional, but parses several times faster than the built-in parser
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
 
 session = requests.Session()
-# Prevents requests from looping forever
+# Prevents requests from looping forever. 429 and 503 are retried in fetch_url instead,
+# so the limiter can slow every request down and honour Retry-After. urllib3 retries them itself,
+# sleeping out their Retry-After while holding a slot, unless it's told to ignore the header.
 retry_strategy = Retry(
     total=3,
-    status_forcelist=[429, 500, 502, 503, 504]
+    status_forcelist=[500, 502, 504],
+    respect_retry_after_header=False
 )
-adapter = HTTPAdapter(max_retries=retry_strategy)
+adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=MAX_CONCURRENT_REQUESTS)
 session.mount("https://", adapter)
+session.mount("http://", adapter)
+# Lets the server answer 304 Not Modified for pages that haven't changed since the last poll
+http_cache = HttpCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_SIZE)
+http_metrics = HttpMetrics()
+request_limiter = AdaptiveLimiter(INITIAL_CONCURRENT_REQUESTS, MIN_CONCURRENT_REQUESTS, MAX_CONCURRENT_REQUESTS)
+
+
+def get_endpoint_class(url: str) -> str:
+    """Group a URL by the kind of page it is, for the HTTP metrics."""
+    if url.rstrip("/") in (get_homepage_url(organizer).rstrip("/") for organizer in load_organizers()):
+        return "homepage"
+    if url.endswith("item_types.json"):
+        return "item_types"
+    if re.search(r"/sections/\d+\.json$", url):
+        return "section"
+    return "event_page"
+
+
+def record_response(response: requests.Response, *args, **kwargs):
+    http_metrics.record_response(get_endpoint_class(response.url), response)
+
+
+session.hooks["response"].append(record_response)
 
 
-def update_events(option: str) -> Optional[List[str]]:
+def export_http_metrics(path: str):
+    """Write the HTTP metrics so far to a Prometheus text file ('.prom') or a JSON summary."""
+    http_metrics.export(path, adapter)
+
+
+def update_events(option: str, concurrent: bool = False) -> Optional[List[str]]:
     """Initiates the process to update events based on the specified option.
 
     This function serves as the starting point for the script, initiating the process
@@ -45,60 +114,177 @@ def update_events(option: str) -> Optional[List[str]]:
             - 'next': Update data for the next event only.
             - 'none': Do not update any event data; only print existing data.
             - 'debug': Save detailed seat information for all events.
+        concurrent (bool):
+            Whether to scrape all events and sections in a single event loop
+            instead of one event at a time.
     Returns:
         Optional[List[str]]:
             A list of strings, each containing ticket information about the targeted event(s),
             formatted and ready for output. In 'debug' mode, no list is returned.
     """
+    dir_path_to_tickets = update_event_data(option, concurrent)
+
+    finalized_strings = []
+    if len(dir_path_to_tickets) == 0 or "debug" in option.lower():
+        return None
+
+    for path in dir_path_to_tickets:
+        finalized_strings.append(create_event_string(path))
+    return finalized_strings
+
+
+def update_event_data(option: str, concurrent: bool = False) -> List[str]:
+    """Scrape and save the ticket information of the events picked by the option, without building the strings.
+    Args:
+        option (str):
+            Specifies the events to target for updating, as in update_events.
+        concurrent (bool):
+            Whether to scrape all events and sections in a single event loop.
+    Returns:
+        List[str]:
+            The directory paths identifying the updated events.
+    """
     valid_options = ["all", "next", "none", "debug"]
     if option.lower() not in valid_options:
         raise ValueError(f"Invalid option: {option}. Valid options are: {', '.join(valid_options)}")
     else:
         print("Starting update of the next event... ")
-        if option.lower() == "next":
-            event_list = get_upcoming_events("next")
-        else:
-            event_list = get_upcoming_events("all")
+        next_or_all = "next" if option.lower() == "next" else "all"
 
     dir_path_to_tickets = []
-    for event in event_list:
-        if "none" in option.lower():
-            dir_path_to_tickets.append(get_directory_path(str(event["title"])))
-        elif "debug" in option.lower():
-            dir_path_to_tickets.append(get_ticket_info(event["link"], event["title"], event["time"], True))
-        else:
-            dir_path_to_tickets.append(get_ticket_info(event["link"], event["title"], event["time"], False))
+    if concurrent and "none" not in option.lower():
+        dir_path_to_tickets = asyncio.run(scrape_events_async(next_or_all, "debug" in option.lower()))
+    else:
+        event_list = get_upcoming_events(next_or_all)
+        for event in event_list:
+            if "none" in option.lower():
+                dir_path_to_tickets.append(get_directory_path(str(event["title"]), event["namespace"]))
+            elif "debug" in option.lower():
+                dir_path_to_tickets.append(get_ticket_info(event["link"], event["title"], event["time"], True,
+                                                           event["namespace"]))
+            else:
+                dir_path_to_tickets.append(get_ticket_info(event["link"], event["title"], event["time"], False,
+                                                           event["namespace"]))
     print("")
+    return [dir_path for dir_path in dir_path_to_tickets if dir_path is not None]
 
-    finalized_strings = []
-    if len(dir_path_to_tickets) == 0 or "debug" in option.lower():
-        return None
 
-    for path in dir_path_to_tickets:
-        if "utsolgt" in path.lower():
-            finalized_strings.append(create_soldout_string(path))
-        elif "partoutkort" in path.lower():
-            finalized_strings.append(create_seasonpass_string(path))
-        else:
-            finalized_strings.append(create_string(path))
-    return finalized_strings
+def create_event_string(dir_path: str) -> str:
+    """Creates the tweet string of an event, picking the format from the event's directory path."""
+    with tracing.span("string_building", event=os.path.basename(dir_path)):
+        if "utsolgt" in dir_path.lower():
+            return create_soldout_string(dir_path)
+        elif "partoutkort" in dir_path.lower():
+            return create_seasonpass_string(dir_path)
+        return create_string(dir_path)
 
 
 def get_upcoming_events(next_or_all: str) -> List[Dict]:
-    """Fetch URLs of all upcoming events from the Brann main event page.
+    """Fetch URLs of all upcoming events from the main event page of every organizer.
+
+    An organizer whose event page can't be fetched is skipped, so it doesn't stop the others.
     Args:
         next_or_all (str):
-            Determines whether to return all upcoming events or just the next one.
+            Determines whether to return all upcoming events or just the next one of every organizer.
             Accepts values: 'next', 'all'.
     Returns:
         List[Dict]:
-            A list of dictionaries containing details of the next or all upcoming events.
+            A list of dictionaries containing details of the next or all upcoming events, with the
+            'organizer' and 'namespace' they belong to.
+    """
+    event_list = []
+    for organizer in load_organizers():
+        event_list += get_organizer_events(organizer, next_or_all) or []
+    return event_list
+
+
+def get_organizer_events(organizer: Dict, next_or_all: str) -> Optional[List[Dict]]:
+    """Fetch URLs of the upcoming events of an organizer, as in get_upcoming_events.
+    Returns:
+        Optional[List[Dict]]:
+            The next or all upcoming events of the organizer, or None if its event page couldn't be fetched.
     """
-    print("Connecting to " + HOMEPAGE_URL)
-    soup = BeautifulSoup(fetch_url(HOMEPAGE_URL).text, "html.parser")
+    homepage_url = get_homepage_url(organizer)
+    print("Connecting to " + homepage_url)
+    with tracing.span("discovery", organizer=organizer["name"]):
+        response = fetch_url(homepage_url)
+        if response is None:
+            print(f"Failed to get the events of {organizer['name']}, skipping it")
+            return None
+        event_containers = parse_event_list(response.text, organizer["title_filter"])
 
     print("Getting events... ", end="")
     event_list = []
+    for event in event_containers:
+        try:
+            event_list.append({
+                "title": event["title"],
+                "time": event["time"],
+                "href": event["href"],
+                "link": get_nested_link(event["href"])
+            })
+        except AttributeError:
+            print(f"\nFailed to find links for '${event['title']}': The website structure may have changed.")
+
+    event_list = add_custom_events(event_list, organizer["namespace"])
+    if next_or_all.lower() == "next":
+        event_list = event_list[:1]
+    print(f"DONE")
+    return [dict(event, organizer=organizer["name"], namespace=organizer["namespace"]) for event in event_list]
+
+
+@lru_cache(maxsize=None)
+def load_organizers() -> Tuple[Dict, ...]:
+    """Loads the organizers from ORGANIZERS_PATH.
+
+    Every organizer has a name, the words a title must contain to count as one of its matches
+    ('title_filter'), and the namespace its event keys are prefixed with. Optionally, it has the
+    URL of its storefront ('homepage_url', HOMEPAGE_URL by default) and a venue rules file of its
+    own ('venue_rules', relative to ORGANIZERS_PATH). Its events are published in a tweet of their
+    own, with its own text ('tweet_header'), its logo in the imagify folder ('logo') and its own
+    account ('publisher_prefix', put in front of the publisher's environment variables).
+    Two organizers must not share a namespace.
+    """
+    with open(ORGANIZERS_PATH, "r", encoding="utf-8") as json_file:
+        return tuple(json.load(json_file))
+
+
+def get_homepage_url(organizer: Dict) -> str:
+    return organizer.get("homepage_url") or HOMEPAGE_URL
+
+
+def get_event_organizer(dir_path: str) -> Dict:
+    """Find the organizer of an event from the namespace its key starts with."""
+    event_key = os.path.basename(dir_path)
+    for organizer in sorted(load_organizers(), key=lambda organizer: len(organizer["namespace"]), reverse=True):
+        if not organizer["namespace"] or event_key.startswith(organizer["namespace"] + "-"):
+            return organizer
+    return load_organizers()[0]
+
+
+def group_by_organizer(dir_paths: List[str]) -> List[Tuple[Dict, List[str]]]:
+    """Split events by organizer, in the order of ORGANIZERS_PATH, so each organizer is published on its own."""
+    groups = {organizer["name"]: (organizer, []) for organizer in load_organizers()}
+    for dir_path in dir_paths:
+        groups[get_event_organizer(dir_path)["name"]][1].append(dir_path)
+    return [(organizer, organizer_dir_paths) for organizer, organizer_dir_paths in groups.values()
+            if organizer_dir_paths]
+
+
+def parse_event_list(html: str, title_filter: str = "brann -") -> List[Dict]:
+    """Find all matches listed on the main event page of an organizer.
+    Args:
+        html (str):
+            The HTML code of the main event page.
+        title_filter (str):
+            The text (lower case) a title must contain to be one of the organizer's matches.
+    Returns:
+        List[Dict]:
+            A list of dictionaries with the title, time and event page URL ('href') of each match.
+    """
+    # Only the event containers are parsed into the tree, the rest of the page is skipped
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer("div", class_="tc-events-list--details"))
+    event_list = []
     try:
         event_containers = soup.find_all("div", class_="tc-events-list--details")
     except AttributeError:
@@ -110,34 +296,37 @@ def get_upcoming_events(next_or_all: str) -> List[Dict]:
         event_title = a_element.get_text(strip=True)
 
         # Only process the actual matches (Strips the array for gift cards, package deals etc.)
-        if "brann -" in event_title.lower():
+        if title_filter in event_title.lower():
             try:
                 event_date_time = event.find("div", class_="tc-events-list--place-time").get_text(strip=True)
-                event_link = get_nested_link(a_element.get("href"))
                 event_list.append({
                     "title": event_title,
                     "time": event_date_time,
-                    "link": event_link
+                    "href": a_element.get("href")
                 })
             except AttributeError:
                 print(f"\nFailed to find links for '${event_title}': The website structure may have changed.")
+    return event_list
+
 
-    # Add custom events if any
+def add_custom_events(event_list: List[Dict], namespace: str = "") -> List[Dict]:
+    """Append the events listed in CUSTOM_EVENTS for the organizer with the namespace to a list of scraped events."""
     for custom_event in CUSTOM_EVENTS:
+        if custom_event.get("namespace", "") != namespace:
+            continue
         event_list.append({
             "title": custom_event["title"],
             "time": custom_event["time"],
             "link": custom_event["link"]
         })
-
-    if next_or_all.lower() == "next":
-        event_list = [event_list[0]]
-    print(f"DONE")
     return event_list
 
 
 def get_nested_link(url: str) -> str:
     """Find and return the ticket page URL from an event page.
+
+    The ticket page of an event doesn't change, so the URL is cached for TICKET_LINK_MAX_AGE
+    and the event page is only fetched when the cached URL is missing or too old.
     Args:
         url (str):
             The URL of the event page.
@@ -145,13 +334,36 @@ def get_nested_link(url: str) -> str:
         str:
             The URL of the ticket page.
     """
-    soup = BeautifulSoup(fetch_url(url).text, "html.parser")
+    ticket_url = get_cached_ticket_link(url)
+    if ticket_url is not None:
+        return ticket_url
+    with tracing.span("nested_link", url=url):
+        ticket_url = parse_nested_link(fetch_url(url).text)
+    snapshot_store.save_ticket_link(url, ticket_url, datetime.now().isoformat())
+    return ticket_url
+
+
+def get_cached_ticket_link(url: str) -> Optional[str]:
+    """Return the cached ticket page URL of an event page, if it's younger than TICKET_LINK_MAX_AGE."""
+    ticket_link = snapshot_store.get_ticket_link(url)
+    if ticket_link is None or datetime.now() - datetime.fromisoformat(ticket_link["fetched"]) > TICKET_LINK_MAX_AGE:
+        return None
+    return ticket_link["ticket_url"]
+
+
+def parse_nested_link(html: str) -> str:
+    """Find the ticket page URL in the HTML code of an event page."""
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer("a", id="placeOrderLink"))
     event_url = soup.find("a", id="placeOrderLink")
     return event_url.get("href")
 
 
 def fetch_url(url: str) -> Optional[requests.Response]:
     """Fetch the HTML code for a webpage.
+
+    Pages fetched earlier are revalidated with a conditional request, and the cached copy is
+    returned if the server answers 304 Not Modified. Requests wait for room under the adaptive
+    limit, and are sent again after a 429 or 503 once the server's Retry-After has passed.
     Args:
         url (str):
             The URL of the webpage to scrape.
@@ -160,16 +372,45 @@ def fetch_url(url: str) -> Optional[requests.Response]:
             The HTML code of the webpage, or None if an error occurs.
     """
     try:
-        response = session.get(url)
+        response = get_with_limit(url, http_cache.conditional_headers(url))
+        if response.status_code == 304:
+            cached_response = http_cache.load(url)
+            if cached_response is not None:
+                return cached_response
+            response = get_with_limit(url)  # The cached copy is gone, fetch the full page again
         response.raise_for_status()
+        http_cache.store(url, response)
         return response
     except requests.exceptions.RequestException as e:
+        if e.response is None:
+            http_metrics.record_error(get_endpoint_class(url))
         print("An error occurred:", e)
         return None
 
 
-def get_ticket_info(event_url: str, event_title: str, event_date: str, debug: bool) -> str:
+def get_with_limit(url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Send a GET request under the adaptive limit, retrying responses that ask us to back off."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        with request_limiter.slot() as sent:
+            try:
+                response = session.get(url, headers=headers)
+            except requests.exceptions.RequestException:
+                request_limiter.on_error(sent)
+                raise
+            request_limiter.on_response(sent, response.status_code, response.headers.get("Retry-After"),
+                                        get_endpoint_class(url))
+        if response.status_code not in BACKOFF_STATUSES:
+            break
+    return response
+
+
+def get_ticket_info(event_url: str, event_title: str, event_date: str, debug: bool,
+                    namespace: str = "") -> Optional[str]:
     """Gather and save ticket information for a given event.
+
+    The counted sections are checkpointed together after every attempt, and the sections that fail
+    are retried on their own. If some sections still fail, nothing is saved, and the next poll within
+    CHECKPOINT_MAX_AGE only fetches the sections that are missing.
     Args:
         event_url (str):
             The URL to find ticket information for the event.
@@ -179,34 +420,249 @@ def get_ticket_info(event_url: str, event_title: str, event_date: str, debug: bo
             The date of the event.
         debug (bool):
             Whether to save a debug version of the results.
+        namespace (str):
+            The namespace of the organizer the event belongs to.
     Returns:
-        str:
-            The directory path where the results are saved.
+        Optional[str]:
+            The directory path where the results are saved, or None if some sections couldn't be counted.
     """
-    json_url = event_url + "item_types.json"
+    event_title, event_date = clean_event_info(event_title, event_date)
+    print("\nUpdating ticket information for: " + event_title)
+    with tracing.span("event", title=event_title):
+        response = fetch_url(event_url + "item_types.json")
+        if response is None:
+            snapshot_store.delete_ticket_link(event_url)  # The cached link may be stale, it's found again next poll
+            print(f"\nFailed to find the sections of '{event_title}'")
+            return None
+
+        sections = read_section_ids(response, event_title)
+        if sections is None:
+            return None
+        with tracing.span("section_fanout", title=event_title):
+            layout = load_venue_layout(event_url, response.text)
+            from tqdm import tqdm  # Only loaded once there are sections to count, to keep startup fast
+            progress_bar = tqdm(total=len(sections), desc="Counting sections", unit="section")
+
+            results = load_section_checkpoints(event_url)
+            progress_bar.update(len(results))
+            attempts = SectionAttempts([{"event_url": event_url, "title": event_title, "sections": sections,
+                                         "results": results}])
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+                capture_seats = debug or CAPTURE_SEATS_EVERY_POLL
+                for missing in attempts:
+                    time.sleep(attempts.delay)
+                    ticket_info = {job: executor.submit(get_section_tickets, job[1], event_url, progress_bar,
+                                                        capture_seats, layout["sections"].get(job[1]))
+                                   for job in missing}
+                    attempts.record({job: info.result() for job, info in ticket_info.items()})
+
+            progress_bar.close()
+        return finish_ticket_info(event_url, sections, results, layout, event_title, event_date, debug, namespace)
+
+
+def load_section_checkpoints(event_url: str) -> Dict[int, Dict]:
+    """Load the sections of an unfinished poll of an event that are younger than CHECKPOINT_MAX_AGE."""
+    since = (datetime.now() - CHECKPOINT_MAX_AGE).isoformat()
+    results = snapshot_store.get_section_checkpoints(event_url, since)
+    for result in results.values():
+        section_layout = result.get("section_layout")
+        if section_layout is not None and section_layout["phantom_seats"] is not None:
+            section_layout["phantom_seats"] = set(section_layout["phantom_seats"])
+    if results:
+        print(f"Resuming the poll with {len(results)} sections that were already counted")
+    return results
+
+
+def save_section_checkpoints(event_url: str, results: Dict[int, Optional[Dict]]):
+    """Checkpoint the counted sections of an attempt in one transaction, leaving out the failed ones.
+
+    The checkpoints leave out the status of every seat, so a resumed poll has no seat capture
+    of the sections that were counted before it was interrupted.
+    """
+    checkpoints = {}
+    for section, result in results.items():
+        if result is None:
+            continue
+        checkpoint = dict(result, seat_states=None)
+        if checkpoint.get("section_layout") and checkpoint["section_layout"]["phantom_seats"] is not None:
+            checkpoint["section_layout"] = dict(checkpoint["section_layout"],
+                                                phantom_seats=list(checkpoint["section_layout"]["phantom_seats"]))
+        checkpoints[section] = checkpoint
+    if checkpoints:
+        snapshot_store.save_section_checkpoints(event_url, checkpoints, datetime.now().isoformat())
+
+
+class SectionAttempts:
+    """The retries and checkpoints of counting the sections of one or more polls.
+
+    Every poll is a dictionary with its 'event_url', 'title', 'sections' and the 'results' counted so far.
+    Iterating gives the (poll index, section) pairs left to count at the start of every attempt, for up
+    to SECTION_RETRIES retries. Before a retry, the caller waits 'delay' seconds, in whatever way suits
+    it, and after an attempt it hands the results to record(), which checkpoints them per poll.
+    """
+
+    def __init__(self, polls: List[Dict]):
+        self.polls = polls
+        self.delay = 0.0
+
+    def __iter__(self):
+        for attempt in range(SECTION_RETRIES + 1):
+            missing = [(index, section) for index, poll in enumerate(self.polls)
+                       for section in poll["sections"] if poll["results"].get(section) is None]
+            if not missing:
+                return
+            self.delay = SECTION_RETRY_DELAY * 2 ** (attempt - 1) if attempt > 0 else 0.0
+            if attempt > 0:
+                titles = list(dict.fromkeys(self.polls[index]["title"] for index, _ in missing))
+                print(f"\nRetrying {len(missing)} sections" + (f" of {titles[0]}..." if len(titles) == 1 else "..."))
+            yield missing
+
+    def record(self, attempt_results: Dict[Tuple[int, int], Optional[Dict]]):
+        """Add the results of an attempt to their polls, and checkpoint the counted sections of every poll."""
+        poll_results: Dict[int, Dict[int, Optional[Dict]]] = {}
+        for (index, section), result in attempt_results.items():
+            poll_results.setdefault(index, {})[section] = result
+        for index, results in poll_results.items():
+            save_section_checkpoints(self.polls[index]["event_url"], results)
+            self.polls[index]["results"].update(results)
+
+
+def finish_ticket_info(event_url: str, sections: List[int], results: Dict[int, Optional[Dict]], layout: Dict,
+                       event_title: str, event_date: str, debug: bool, namespace: str = "") -> Optional[str]:
+    """Save the poll of an event if every section was counted, and drop its checkpoints.
+    Returns:
+        Optional[str]:
+            The directory path where the results are saved, or None if some sections are still missing.
+    """
+    failed = [section for section in sections if results.get(section) is None]
+    if failed:
+        print(f"\nFailed to count {len(failed)} of {len(sections)} sections of {event_title}. "
+              f"The other sections are kept for the next poll.")
+        return None
+    results = [results[section] for section in sections]
+    update_venue_layout(layout, results, get_venue_from_event_date(event_date))
+    dir_path = save_ticket_info(results, event_title, event_date, debug, namespace, layout)
+    snapshot_store.delete_section_checkpoints(event_url)
+    return dir_path
+
+
+def clean_event_info(event_title: str, event_date: str) -> Tuple[str, str]:
+    """Strip newlines from the event title and date, and space out the venue separator."""
     event_title = str(event_title).replace('\n', "")
     event_date = (str(event_date).replace('\n', "")
                   .replace('@', " @ "))
-    print("\nUpdating ticket information for: " + event_title)
-    json_data = fetch_url(json_url).json()
+    return event_title, event_date
 
-    sections = [section["id"] for section in json_data["item_types"][0]["sections"]]
-    progress_bar = tqdm(total=len(sections), desc="Counting sections", unit="section")
 
-    with ThreadPoolExecutor() as executor:
-        ticket_info = [executor.submit(get_section_tickets, section, event_url, progress_bar) for section in sections]
-    results = [info.result() for info in ticket_info]
+def get_section_ids(json_data: Dict) -> List[int]:
+    """Return the IDs of all sections listed in an event's item_types.json."""
+    return [section["id"] for section in json_data["item_types"][0]["sections"]]
 
-    progress_bar.close()
 
-    mini_results = save_minimal_info(results, event_title, event_date)
-    if debug:
-        return save_new_json("debug", results)
-    return save_new_json(event_title, mini_results)
+def read_section_ids(response: requests.Response, event_title: str) -> Optional[List[int]]:
+    """Return the IDs of the sections in an event's item_types.json, or None if it isn't what's expected."""
+    try:
+        return get_section_ids(response.json())
+    except (ValueError, KeyError, IndexError, TypeError):
+        print(f"\nFailed to read the sections of '{event_title}'")
+        return None
+
 
+_venue_layouts = {}  # Section layouts per event URL, kept in memory between polls
 
-def get_section_tickets(section: int, event_url: str, progressbar) -> Optional[Dict]:
+
+def load_venue_layout(event_url: str, item_types_text: str) -> Dict:
+    """Load the cached section layout of an event, if it still matches the event's item_types.json.
+
+    The layout holds the name, capacity, seat count, phantom seats, category and whether it counts in
+    the total of every section that has been counted before. It is trusted as long as item_types.json
+    and the venue rules the categories come from are unchanged, and the layout is younger than
+    LAYOUT_MAX_AGE. Otherwise an empty layout is returned to be rebuilt.
+    Args:
+        event_url (str):
+            The URL of the event, used as the key of the layout.
+        item_types_text (str):
+            The body of the event's item_types.json.
+    Returns:
+        Dict:
+            The layout, with the layout of each section under 'sections' keyed by section ID.
+    """
+    fingerprint = hashlib.sha1((item_types_text + get_venue_rules_fingerprint()).encode("utf-8")).hexdigest()
+    layout = _venue_layouts.get(event_url)
+    if layout is None:
+        layout = snapshot_store.get_venue_layout(event_url)
+        if layout is not None:
+            layout["sections"] = {int(section_id): section for section_id, section in layout["sections"].items()}
+            for section in layout["sections"].values():
+                if section["phantom_seats"] is not None:
+                    section["phantom_seats"] = set(section["phantom_seats"])
+
+    created = datetime.fromisoformat(layout["created"]) if layout else None
+    if layout is None or layout["fingerprint"] != fingerprint or datetime.now() - created > LAYOUT_MAX_AGE:
+        layout = {"key": event_url, "fingerprint": fingerprint, "created": datetime.now().isoformat(), "sections": {}}
+    _venue_layouts[event_url] = layout
+    return layout
+
+
+def update_venue_layout(layout: Dict, results: List[Optional[Dict]], venue: str):
+    """Add the sections counted without a cached layout to the layout, and save it if it changed."""
+    changed = False
+    for section in results:
+        if section is None:
+            continue
+        section_layout = section.pop("section_layout", None)
+        if section_layout is not None:
+            category, in_total = classify_section(venue, section_layout["section_name"])
+            section_layout.update(category=category, in_total=in_total)
+            layout["sections"][section["section_id"]] = section_layout
+            changed = True
+
+    if changed:
+        sections = {section_id: {**section, "phantom_seats": None if section["phantom_seats"] is None
+                                 else list(section["phantom_seats"])}
+                    for section_id, section in layout["sections"].items()}
+        snapshot_store.save_venue_layout(layout["key"], {**layout, "sections": sections})
+
+
+def save_ticket_info(results: List[Dict], event_title: str, event_date: str, debug: bool,
+                     namespace: str = "", layout: Optional[Dict] = None) -> str:
+    """Aggregate the section results of an event and save them.
+    Args:
+        results (List[Dict]):
+            The seat information of every section of the event.
+        event_title (str):
+            The title of the event.
+        event_date (str):
+            The date of the event.
+        debug (bool):
+            Whether to save a debug version of the results.
+        namespace (str):
+            The namespace of the organizer the event belongs to.
+    Returns:
+        str:
+            The directory path where the results are saved.
+    """
+    with tracing.span("aggregation", title=event_title):
+        mini_results = save_minimal_info(results, event_title, event_date, layout)
+    with tracing.span("snapshot_io", title=event_title):
+        if debug or CAPTURE_SEATS_EVERY_POLL:
+            event_key = os.path.basename(get_directory_path(event_title, namespace))
+            venue = get_venue_from_event_date(event_date)
+            seat_capture.save_seat_capture(event_key, venue, get_time_formatted("computer"), results)
+        if debug:
+            debug_results = [{key: value for key, value in section.items() if key != "seat_states"}
+                             for section in results if section is not None]
+            return save_new_json("debug", debug_results, namespace)
+        return save_new_json(event_title, mini_results, namespace)
+
+
+def get_section_tickets(section: int, event_url: str, progressbar, capture_seats: bool = False,
+                        section_layout: Optional[Dict] = None) -> Optional[Dict]:
     """Fetch and organize seat information for a specific section of the arena.
+
+    With a cached layout of the section, standing sections aren't fetched at all, and phantom seats
+    are looked up by seat ID. Without one, the layout is built from the seats and returned with
+    the result under 'section_layout'.
     Args:
         section (int):
             The ID of the arena section to fetch ticket information for.
@@ -214,37 +670,61 @@ def get_section_tickets(section: int, event_url: str, progressbar) -> Optional[D
             The URL of the event.
         progressbar:
             The progress bar object to update during execution.
+        capture_seats (bool):
+            Whether to keep the status of every seat in the result.
+        section_layout (Optional[Dict]):
+            The cached layout of the section, if any.
     Returns:
         Optional[Dict]:
-            A dictionary containing organized stats and details of all seats in the section.
+            A dictionary containing organized stats of the section, and the status of all
+            seats if they are captured.
     """
+    section_id = section
+    if section_layout is not None and "stå" in str(section_layout["section_name"]).lower():
+        # Standing sections are never counted, so there's nothing to fetch
+        progressbar.update(1)
+        return {
+            "section_name": section_layout["section_name"],
+            "section_id": section_id,
+            "section_amount": section_layout["section_amount"],
+            "sold_seats": 0,
+            "available_seats": 0,
+            "locked_seats": 0,
+            "phantom_seats": 0,
+            "seat_states": None
+        }
+
     json_url = event_url + "sections/" + str(section) + ".json"
     try:
-        json_data = fetch_url(json_url).json()
-    except (json.JSONDecodeError, AttributeError):
+        json_text = fetch_url(json_url).text
+        phantom_ids = section_layout["phantom_seats"] if section_layout is not None else None
+        seat_counts = count_section_seats(json_text, capture_seats, phantom_ids)
+        if section_layout is not None and seat_counts["seat_count"] != section_layout["seat_count"]:
+            # The seats have changed since the layout was cached, so it's rebuilt from scratch
+            section_layout = None
+            seat_counts = count_section_seats(json_text, capture_seats)
+    except (ValueError, IndexError, KeyError, AttributeError):
         print(f"Failed to decode JSON from URL: {json_url}")
         return None
 
-    section_name = json_data["seating_arrangements"]["section_name"]
-    section_total = json_data["seating_arrangements"]["section_amount"]
-    section_id = section
+    section_name = seat_counts["section_name"]
+    section_total = seat_counts["section_amount"]
     if "stå" in str(section_name).lower():
         sold_seats = 0
         available_seats = 0
         locked_seats = 0
         phantom_seats = 0
-        available_seats_object = None
+        seat_states = None
     else:
-        seats = [seat for seat in json_data["seating_arrangements"]["seats"]]
-        sold_seats = len([seat for seat in seats if seat["status"] == "sold"])
-        available_seats_object = [seat for seat in seats if seat["status"] == "available"]
-        available_seats = len(available_seats_object)
-        locked_seats = len([seat for seat in seats if seat["status"] == "locked"])
-        phantom_seats = len([seat for seat in seats if float(seat["x"]) <= 0 and seat["status"] == "available"])
+        sold_seats = seat_counts["sold"]
+        available_seats = seat_counts["available"]
+        locked_seats = seat_counts["locked"]
+        phantom_seats = seat_counts["phantom"]
+        seat_states = seat_counts["seat_states"]
         available_seats -= phantom_seats
         section_total -= phantom_seats
     progressbar.update(1)
-    return {
+    result = {
         "section_name": section_name,
         "section_id": section_id,
         "section_amount": section_total,
@@ -252,40 +732,342 @@ def get_section_tickets(section: int, event_url: str, progressbar) -> Optional[D
         "available_seats": available_seats,
         "locked_seats": locked_seats,
         "phantom_seats": phantom_seats,
-        "seats:": available_seats_object
+        "seat_states": seat_states
     }
+    if section_layout is None:
+        result["section_layout"] = {
+            "section_name": section_name,
+            "section_amount": seat_counts["section_amount"],
+            "seat_count": seat_counts["seat_count"],
+            "phantom_seats": seat_counts["phantom_ids"]
+        }
+    return result
+
+
+_json_decoder = json.JSONDecoder()
+_json_whitespace = re.compile(r"[ \t\n\r]*")
+_JSON_WHITESPACE_CHARACTERS = " \t\n\r"
 
 
-def save_new_json(event_title: str, data: Union[Dict, List[Dict]]) -> str:
-    """Save data to a JSON file.
+def count_section_seats(json_text: str, capture_seats: bool, phantom_ids: Optional[set] = None) -> Dict:
+    """Count the seats of a section in a single pass over its JSON.
+
+    The seat array is parsed incrementally, one seat at a time, so the full list of seats
+    is never held in memory.
+    Args:
+        json_text (str):
+            The body of the section's JSON file.
+        capture_seats (bool):
+            Whether to keep the ID, status and position of every seat.
+        phantom_ids (Optional[set]):
+            The IDs of the phantom seats, if known. Otherwise, phantom seats are found from their
+            position, and their IDs are returned under 'phantom_ids'.
+    Returns:
+        Dict:
+            The section name and amount, the number of seats and of sold, available, locked and
+            phantom seats, and the (id, status, x, y) of every seat if they are captured (None otherwise).
+    """
+    seat_counts = {"sold": 0, "available": 0, "locked": 0, "phantom": 0, "seat_count": 0,
+                   "seat_states": None, "phantom_ids": []}
+
+    def read_seating_arrangement(key: str, index: int) -> int:
+        if key == "seats":
+            return _count_seat_array(json_text, index, seat_counts, capture_seats, phantom_ids)
+        value, index = _json_decoder.raw_decode(json_text, index)
+        if key in ("section_name", "section_amount"):
+            seat_counts[key] = value
+        return index
+
+    def read_root(key: str, index: int) -> int:
+        if key == "seating_arrangements":
+            return _walk_json_object(json_text, index, read_seating_arrangement)
+        return _json_decoder.raw_decode(json_text, index)[1]
+
+    _walk_json_object(json_text, _skip_whitespace(json_text, 0), read_root)
+    return seat_counts
+
+
+def _count_seat_array(json_text: str, index: int, seat_counts: Dict, capture_seats: bool,
+                      phantom_ids: Optional[set]) -> int:
+    """Tally the seat array starting at json_text[index] into seat_counts.
+
+    Seats are decoded one at a time and dropped after being counted, keeping only a compact
+    (id, status, x, y) tuple if seats are captured. Returns the index right after the array.
+    """
+    if json_text[index] != "[":
+        raise ValueError(f"Expected an array at position {index}")
+    index = _skip_whitespace(json_text, index + 1)
+    if json_text[index] == "]":
+        return index + 1
+
+    scan_once = _json_decoder.scan_once
+    sold_seats = available_seats = locked_seats = phantom_seats = seat_count = 0
+    seat_states = [] if capture_seats else None
+    new_phantom_ids = seat_counts["phantom_ids"]
+    while True:
+        try:
+            seat, index = scan_once(json_text, index)
+        except StopIteration:
+            raise ValueError(f"Expected a seat at position {index}")
+
+        seat_count += 1
+        if phantom_ids is None:
+            is_phantom = float(seat["x"]) <= 0
+            if is_phantom:
+                new_phantom_ids.append(seat.get("id"))
+        else:
+            is_phantom = seat.get("id") in phantom_ids
+
+        status = seat["status"]
+        if status == "sold":
+            sold_seats += 1
+        elif status == "available":
+            available_seats += 1
+            if is_phantom:
+                phantom_seats += 1
+        elif status == "locked":
+            locked_seats += 1
+        if capture_seats:
+            seat_states.append((seat.get("id"), status, seat.get("x"), seat.get("y")))
+
+        if json_text[index] not in ",]":
+            index = _skip_whitespace(json_text, index)
+        if json_text[index] == "]":
+            break
+        index += 1
+        if json_text[index] in _JSON_WHITESPACE_CHARACTERS:
+            index = _skip_whitespace(json_text, index)
+
+    seat_counts["sold"] += sold_seats
+    seat_counts["available"] += available_seats
+    seat_counts["locked"] += locked_seats
+    seat_counts["phantom"] += phantom_seats
+    seat_counts["seat_count"] += seat_count
+    seat_counts["seat_states"] = seat_states
+    if None in new_phantom_ids:  # Phantom seats without an ID can only be found from their position
+        seat_counts["phantom_ids"] = None
+    return index + 1
+
+
+def _walk_json_object(json_text: str, index: int, on_member) -> int:
+    """Walk the members of the JSON object starting at json_text[index].
+
+    on_member(key, value_index) must consume the value and return the index right after it.
+    Returns the index right after the object.
+    """
+    if json_text[index] != "{":
+        raise ValueError(f"Expected an object at position {index}")
+    index = _skip_whitespace(json_text, index + 1)
+    if json_text[index] == "}":
+        return index + 1
+    while True:
+        key, index = json.decoder.scanstring(json_text, index + 1)
+        index = _skip_whitespace(json_text, index)
+        if json_text[index] != ":":
+            raise ValueError(f"Expected ':' at position {index}")
+        index = on_member(key, _skip_whitespace(json_text, index + 1))
+        index = _skip_whitespace(json_text, index)
+        if json_text[index] == "}":
+            return index + 1
+        index = _skip_whitespace(json_text, index + 1)
+
+
+def _skip_whitespace(json_text: str, index: int) -> int:
+    return _json_whitespace.match(json_text, index).end()
+
+
+async def scrape_events_async(next_or_all: str, debug: bool) -> List[str]:
+    """Scrape the upcoming events of every organizer and all their sections inside a single event loop.
+
+    Unlike the sequential path, every event page, item_types.json and section is fetched
+    concurrently, bounded by the adaptive request limit and at most MAX_CONCURRENT_REQUESTS requests.
+    The organizers share these slots and get them in turn, so an organizer with many events or
+    sections doesn't hold up the others.
+    Args:
+        next_or_all (str):
+            Determines whether to scrape all upcoming events or just the next one of every organizer.
+            Accepts values: 'next', 'all'.
+        debug (bool):
+            Whether to save a debug version of the results.
+    Returns:
+        List[str]:
+            The directory paths where the results of each event are saved.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS))
+    semaphore = FairSemaphore(MAX_CONCURRENT_REQUESTS)
+
+    event_lists = await asyncio.gather(
+        *(get_upcoming_events_async(organizer, next_or_all, semaphore) for organizer in load_organizers()))
+    event_list = [event for organizer_events in event_lists for event in organizer_events]
+    dir_paths = await gather_ticket_info_async(event_list, debug, semaphore)
+    return [dir_path for dir_path in dir_paths if dir_path is not None]
+
+
+def poll_events(event_list: List[Dict]) -> List[Optional[str]]:
+    """Scrape the given events in a single event loop, through the same fair pool as scrape_events_async.
+
+    Used by the daemon, which finds the events itself and polls the ones that are due.
+    An event that fails is given as None, without stopping the others.
+    Args:
+        event_list (List[Dict]):
+            The events as returned by get_upcoming_events. A 'link' is only used for events
+            without an event page ('href'), the others have their ticket page looked up again.
+    Returns:
+        List[Optional[str]]:
+            The directory path where the results of each event are saved, or None, in the order of the events.
+    """
+    return asyncio.run(poll_events_async(event_list))
+
+
+async def poll_events_async(event_list: List[Dict]) -> List[Optional[str]]:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS))
+    semaphore = FairSemaphore(MAX_CONCURRENT_REQUESTS)
+    # The cached ticket page is found again, in case it was dropped as stale since the event was found
+    event_list = [{key: value for key, value in event.items() if key != "link" or "href" not in event}
+                  for event in event_list]
+    return await gather_ticket_info_async(event_list, False, semaphore)
+
+
+async def gather_ticket_info_async(event_list: List[Dict], debug: bool,
+                                   semaphore: FairSemaphore) -> List[Optional[str]]:
+    """Scrape the events at once with get_ticket_info_async, where an event that fails gives None."""
+    from tqdm import tqdm  # Only loaded once there are events to count, to keep startup fast
+    progress_bar = tqdm(total=0, desc="Counting sections", unit="section")
+    results = await asyncio.gather(
+        *(get_ticket_info_async(event, debug, semaphore, progress_bar) for event in event_list),
+        return_exceptions=True)
+    progress_bar.close()
+    dir_paths = []
+    for event, result in zip(event_list, results):
+        if isinstance(result, Exception):
+            print(f"Failed to update '{event['title']}':", result)
+            result = None
+        dir_paths.append(result)
+    return dir_paths
+
+
+async def get_upcoming_events_async(organizer: Dict, next_or_all: str, semaphore: FairSemaphore) -> List[Dict]:
+    """Asyncio counterpart of get_upcoming_events for a single organizer, leaving the ticket page URLs to resolve."""
+    homepage_url = get_homepage_url(organizer)
+    print("Connecting to " + homepage_url)
+    with tracing.span("discovery", organizer=organizer["name"]):
+        response = await fetch_url_async(homepage_url, semaphore, organizer["name"])
+        if response is None:
+            print(f"Failed to get the events of {organizer['name']}, skipping it")
+            return []
+        event_list = await asyncio.to_thread(parse_event_list, response.text, organizer["title_filter"])
+    event_list = add_custom_events(event_list, organizer["namespace"])
+    if next_or_all.lower() == "next":
+        event_list = event_list[:1]
+    print(f"Found {len(event_list)} events of {organizer['name']}")
+    return [dict(event, organizer=organizer["name"], namespace=organizer["namespace"]) for event in event_list]
+
+
+async def get_ticket_info_async(event: Dict, debug: bool, semaphore: FairSemaphore,
+                                progressbar) -> Optional[str]:
+    """Asyncio counterpart of get_ticket_info that also resolves the ticket page URL.
+    Args:
+        event (Dict):
+            The event as returned by get_upcoming_events_async, or a custom event with a 'link'.
+        debug (bool):
+            Whether to save a debug version of the results.
+        semaphore (FairSemaphore):
+            The global limit of simultaneous requests, shared fairly by the organizers.
+        progressbar:
+            The progress bar shared by all events.
+    Returns:
+        Optional[str]:
+            The directory path where the results are saved, or None if the event could not be scraped.
+    """
+    event_title, event_date = clean_event_info(event["title"], event["time"])
+    asyncio.current_task().set_name(event_title)  # Names the event's track in the trace
+    event_url = event.get("link") or get_cached_ticket_link(event["href"])
+    try:
+        if event_url is None:
+            with tracing.span("nested_link", url=event["href"]):
+                response = await fetch_url_async(event["href"], semaphore, event["organizer"])
+                event_url = await asyncio.to_thread(parse_nested_link, response.text)
+            snapshot_store.save_ticket_link(event["href"], event_url, datetime.now().isoformat())
+        response = await fetch_url_async(event_url + "item_types.json", semaphore, event["organizer"])
+        if response is None:
+            snapshot_store.delete_ticket_link(event_url)  # The cached link may be stale, it's found again next poll
+            print(f"\nFailed to find the sections of '{event_title}'")
+            return None
+        sections = read_section_ids(response, event_title)
+        if sections is None:
+            return None
+    except AttributeError:
+        print(f"\nFailed to find links for '${event_title}': The website structure may have changed.")
+        return None
+
+    with tracing.span("section_fanout", title=event_title):
+        layout = load_venue_layout(event_url, response.text)
+        results = load_section_checkpoints(event_url)
+        progressbar.total += len(sections)
+        progressbar.update(len(results))
+        attempts = SectionAttempts([{"event_url": event_url, "title": event_title, "sections": sections,
+                                     "results": results}])
+        for missing in attempts:
+            await asyncio.sleep(attempts.delay)
+            section_results = await asyncio.gather(
+                *(get_section_tickets_async(section, event_url, debug or CAPTURE_SEATS_EVERY_POLL,
+                                            layout["sections"].get(section), semaphore, event["organizer"],
+                                            progressbar)
+                  for _, section in missing))
+            await asyncio.to_thread(attempts.record, dict(zip(missing, section_results)))
+    return finish_ticket_info(event_url, sections, results, layout, event_title, event_date, debug,
+                              event["namespace"])
+
+
+async def fetch_url_async(url: str, semaphore: FairSemaphore, organizer: str) -> Optional[requests.Response]:
+    """Fetch a webpage without blocking the event loop, bounded by the global request limit."""
+    async with semaphore.slot(organizer):
+        return await asyncio.to_thread(fetch_url, url)
+
+
+async def get_section_tickets_async(section: int, event_url: str, capture_seats: bool, section_layout: Optional[Dict],
+                                    semaphore: FairSemaphore, organizer: str, progressbar) -> Optional[Dict]:
+    """Fetch and organize the seat information of a section without blocking the event loop."""
+    async with semaphore.slot(organizer):
+        return await asyncio.to_thread(get_section_tickets, section, event_url, progressbar,
+                                       capture_seats, section_layout)
+
+
+def save_new_json(event_title: str, data: Union[Dict, List[Dict]], namespace: str = "") -> str:
+    """Save data as a new snapshot of an event.
     Args:
         event_title (str):
-            The title of the event, used as the directory name.
+            The title of the event, used as the key of the snapshot.
         data (List[Dict[str, Union[str, int]]]):
-            The data to save to the JSON file.
+            The data to save in the snapshot.
+        namespace (str):
+            The namespace of the organizer the event belongs to.
     Returns:
         str:
-            The directory path where the file is saved.
+            The directory path identifying the event.
     """
-    dir_path = get_directory_path(event_title)
+    dir_path = get_directory_path(event_title, namespace)
+    snapshot_store.import_directory(dir_path)  # Keeps legacy files ahead of the new snapshot
     time_now = get_time_formatted("computer")
-    filename = f"results_{time_now}.json"
-
-    file_path = os.path.join(dir_path, filename)
-    with open(file_path, "w") as json_file:
-        json.dump(data, json_file)
-        print(f"File saved at {file_path}")
+    snapshot_store.save_snapshot(os.path.basename(dir_path), time_now, data)
+    print(f"Snapshot saved for {os.path.basename(dir_path)}")
     return dir_path
 
 
-def get_directory_path(event_name: str) -> str:
-    """Creates or retrieves the directory path for a specific event.
+def get_directory_path(event_name: str, namespace: str = "") -> str:
+    """Retrieves the directory path for a specific event.
 
-    This function cleans the event name of illegal characters and checks if a directory
-    for the specific event already exists. If it doesn't, a new directory is created.
+    This function cleans the event name of illegal characters. The last part of the path
+    is the key of the event's snapshots, prefixed with the organizer's namespace if it has one.
+    The directory itself only exists for events with results_*.json files from before the
+    snapshot store.
     Args:
         event_name (str):
             The name of the event.
+        namespace (str):
+            The namespace of the organizer the event belongs to.
     Returns:
         str:
             The path to the directory corresponding to the event name.
@@ -293,10 +1075,9 @@ def get_directory_path(event_name: str) -> str:
     valid_dir_name = (re.sub(r'[<>:"/\\|?*]', '', event_name)
                       .replace(' ', '')
                       .replace('\n', ''))
-    dir_path = os.path.join(SAVE_PATH, valid_dir_name)
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
-    return dir_path
+    if namespace:
+        valid_dir_name = f"{namespace}-{valid_dir_name}"
+    return os.path.join(SAVE_PATH, valid_dir_name)
 
 
 def get_time_formatted(computer_or_human: str) -> str:
@@ -321,12 +1102,13 @@ def get_time_formatted(computer_or_human: str) -> str:
         return str(current_datetime.strftime("%H:%M %d/%m/%Y"))
 
 
-def save_minimal_info(data: List[Dict], event_title: str, event_date: str) -> Dict:
+def save_minimal_info(data: List[Dict], event_title: str, event_date: str, layout: Optional[Dict] = None) -> Dict:
     """Aggregates section data for an event.
 
     The function groups section data by stands around the arena, and adds a 'Total' section that
-    summarizes all sections. Special rules apply for European games and certain sections like the
-    press section and the Frydenbø standing section.
+    summarizes all sections. The stands and the special rules, like leaving out the press section
+    and extrapolating the Frydenbø standing section (except in European games), are defined per
+    venue in the venue rules.
     Args:
         data (List[Dict[str, Union[str, int, float]]]):
             List of dictionaries containing section data for the event.
@@ -334,6 +1116,8 @@ def save_minimal_info(data: List[Dict], event_title: str, event_date: str) -> Di
             The title of the event.
         event_date (str):
             The date of the event.
+        layout (Optional[Dict]):
+            The venue layout of the event, whose sections already know their category.
     Returns:
         Dict:
             A dictionary containing aggregated data for each category and the total.
@@ -346,111 +1130,153 @@ def save_minimal_info(data: List[Dict], event_title: str, event_date: str) -> Di
             europa = True
 
     venue = get_venue_from_event_date(event_date)
+    venue_rules = load_venue_rules().get(venue)
+    if venue_rules is None:
+        return None
 
-    if venue == "Brann Stadion":
-        return brann_stadion(data, event_title, event_date, europa)
-    elif venue == "Åsane Arena":
-        return aasane_arena(data, event_title, event_date)
-
-
-def brann_stadion(data: List[Dict], event_title: str, event_date: str, europa: bool) -> Dict:
-    category_totals = {
-        "GENERAL:": {"title": event_title, "date": event_date},
-        "FRYDENBØ": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "SPV": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "BT": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "FJORDKRAFT": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "VIP": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "TOTALT": {"sold_seats": 0, "section_amount": 0, "available_seats": 0}
-    }
-    json_file = [section for section in data if section["sold_seats"] != 0 or section["available_seats"] != 0]
+    category_totals = {"GENERAL:": {"title": event_title, "date": event_date}}
+    for category in venue_rules["categories"] + ["TOTALT"]:
+        category_totals[category] = {"sold_seats": 0, "section_amount": 0, "available_seats": 0}
 
-    for section in json_file:
-        section_name = section["section_name"].lower()
-        if (("fjordkraft" in section_name and (
-                "felt a" in section_name or "felt b" in section_name or "stå" in section_name))
-                or "gangen" in section_name or "press" in section_name):
+    section_index = get_section_index(venue, data, layout)
+    for section in data:
+        if venue_rules["skip_empty_sections"] and section["sold_seats"] == 0 and section["available_seats"] == 0:
             continue
-        category_totals["TOTALT"]["sold_seats"] += section["sold_seats"]
-        category_totals["TOTALT"]["section_amount"] += section["section_amount"]
-        category_totals["TOTALT"]["available_seats"] += section["available_seats"]
-
-    for section in json_file:
-        section_name = section["section_name"].lower()
-        sold_seats = section["sold_seats"]
-        total_capacity = section["section_amount"]
-        available_seats = section["available_seats"]
-
-        if "spv" in section_name and "press" not in section_name:
-            category_totals["SPV"]["sold_seats"] += sold_seats
-            category_totals["SPV"]["section_amount"] += total_capacity
-            category_totals["SPV"]["available_seats"] += available_seats
-        elif "bob" in section_name or "bt" in section_name:
-            category_totals["BT"]["sold_seats"] += sold_seats
-            category_totals["BT"]["section_amount"] += total_capacity
-            category_totals["BT"]["available_seats"] += available_seats
-        elif "frydenbø" in section_name and "gangen" not in section_name:
-            category_totals["FRYDENBØ"]["sold_seats"] += sold_seats
-            category_totals["FRYDENBØ"]["section_amount"] += total_capacity
-            category_totals["FRYDENBØ"]["available_seats"] += available_seats
-        elif "fjordkraft" in section_name and (
-                "felt a" not in section_name or "felt b" not in section_name or "stå" not in section_name):
-            category_totals["FJORDKRAFT"]["sold_seats"] += sold_seats
-            category_totals["FJORDKRAFT"]["section_amount"] += total_capacity
-            category_totals["FJORDKRAFT"]["available_seats"] += available_seats
-        elif "vip" in section_name:
-            category_totals["VIP"]["sold_seats"] += sold_seats
-            category_totals["VIP"]["section_amount"] += total_capacity
-            category_totals["VIP"]["available_seats"] += available_seats
-
-    if europa is False and category_totals["FRYDENBØ"]["section_amount"] > 0:
-        percentage = round((category_totals["FRYDENBØ"]["sold_seats"] /
-                            category_totals["FRYDENBØ"]["section_amount"]), 2)
-
-        sold_seats = round(1000 * percentage)
-        category_totals["FRYDENBØ"]["sold_seats"] += sold_seats
-        category_totals["FRYDENBØ"]["section_amount"] += 1000
-        category_totals["FRYDENBØ"]["available_seats"] += 1000 - sold_seats
-        category_totals["TOTALT"]["sold_seats"] += sold_seats
-        category_totals["TOTALT"]["section_amount"] += 1000
-        category_totals["TOTALT"]["available_seats"] += 1000 - sold_seats
+        category, in_total = section_index[section["section_id"]]
+        for totals in (category_totals[category] if category else None,
+                       category_totals["TOTALT"] if in_total else None):
+            if totals is not None:
+                totals["sold_seats"] += section["sold_seats"]
+                totals["section_amount"] += section["section_amount"]
+                totals["available_seats"] += section["available_seats"]
+
+    extrapolation = venue_rules.get("standing_extrapolation")
+    if extrapolation and not (europa and extrapolation["skip_for_europa"]):
+        # Assumes the standing section sells as well as the seated sections of the same stand
+        stand_totals = category_totals[extrapolation["category"]]
+        capacity = extrapolation["capacity"]
+        if stand_totals["section_amount"] > 0:
+            percentage = round((stand_totals["sold_seats"] / stand_totals["section_amount"]), 2)
+
+            sold_seats = round(capacity * percentage)
+            for totals in (stand_totals, category_totals["TOTALT"]):
+                totals["sold_seats"] += sold_seats
+                totals["section_amount"] += capacity
+                totals["available_seats"] += capacity - sold_seats
     return category_totals
 
 
-def aasane_arena(data: List[Dict], event_title: str, event_date: str) -> Dict:
-    category_totals = {
-        "GENERAL:": {"title": event_title, "date": event_date},
-        "HOVED": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "FAMILIE": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "NORDRE": {"sold_seats": 0, "section_amount": 0, "available_seats": 0},
-        "TOTALT": {"sold_seats": 0, "section_amount": 0, "available_seats": 0}
-    }
-    json_file = [section for section in data]
-
-    for section in json_file:
-        # Add totals
-        category_totals["TOTALT"]["sold_seats"] += section["sold_seats"]
-        category_totals["TOTALT"]["section_amount"] += section["section_amount"]
-        category_totals["TOTALT"]["available_seats"] += section["available_seats"]
-
-        section_name = section["section_name"].lower()
-        sold_seats = section["sold_seats"]
-        total_capacity = section["section_amount"]
-        available_seats = section["available_seats"]
-
-        if "hovedtribune" in section_name:
-            category_totals["HOVED"]["sold_seats"] += sold_seats
-            category_totals["HOVED"]["section_amount"] += total_capacity
-            category_totals["HOVED"]["available_seats"] += available_seats
-        elif "familietribune" in section_name:
-            category_totals["FAMILIE"]["sold_seats"] += sold_seats
-            category_totals["FAMILIE"]["section_amount"] += total_capacity
-            category_totals["FAMILIE"]["available_seats"] += available_seats
-        elif "nordre" in section_name:
-            category_totals["NORDRE"]["sold_seats"] += sold_seats
-            category_totals["NORDRE"]["section_amount"] += total_capacity
-            category_totals["NORDRE"]["available_seats"] += available_seats
-    return category_totals
+@lru_cache(maxsize=None)
+def load_venue_rules() -> Dict:
+    """Loads the venue rules from VENUE_RULES_PATH and the venue rules files of the organizers.
+
+    Every venue lists its categories in display order, the rules that assign sections to
+    a category (the first matching rule wins), the rules for sections left out of the total,
+    whether empty sections are skipped, and optionally a standing section to extrapolate.
+    A rule matches a section name (lower case) that contains 'all' of its words, 'any' of them
+    and 'none' of them, where every key is optional.
+    The rules of a venue don't depend on who sells the tickets, so the files are merged. Two files
+    may both define a venue only with the same rules, otherwise a ValueError is raised.
+    """
+    venue_rules = {}
+    defined_in = {}  # The file each venue was first defined in
+    rules_paths = [VENUE_RULES_PATH] + [os.path.join(os.path.dirname(ORGANIZERS_PATH), organizer["venue_rules"])
+                                        for organizer in load_organizers() if organizer.get("venue_rules")]
+    for rules_path in dict.fromkeys(rules_paths):
+        with open(rules_path, "r", encoding="utf-8") as json_file:
+            for venue, rules in json.load(json_file).items():
+                check_venue_rules(venue, rules, rules_path)
+                if venue in venue_rules and venue_rules[venue] != rules:
+                    raise ValueError(f"{venue} is defined differently in {defined_in[venue]} and {rules_path}")
+                venue_rules.setdefault(venue, rules)
+                defined_in.setdefault(venue, rules_path)
+    return venue_rules
+
+
+def check_venue_rules(venue: str, rules: Dict, rules_path: str):
+    """Raise a ValueError if a rule of the venue puts sections in a category the venue doesn't list."""
+    categories = set(rules["categories"])
+    named = [rule["category"] for rule in rules["rules"]]
+    if rules.get("standing_extrapolation"):
+        named.append(rules["standing_extrapolation"]["category"])
+    unknown = [category for category in named if category not in categories]
+    if unknown:
+        raise ValueError(f"The rules of {venue} in {rules_path} use categories that aren't listed in its "
+                         f"'categories': {', '.join(dict.fromkeys(unknown))}")
+
+
+@lru_cache(maxsize=None)
+def get_venue_rules_fingerprint() -> str:
+    """Hash the venue rules, so the section categories saved in the venue layouts are dropped when they change."""
+    return hashlib.sha1(json.dumps(load_venue_rules(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def match_section_rule(rule: Dict, section_name: str) -> bool:
+    return (all(word in section_name for word in rule.get("all", []))
+            and ("any" not in rule or any(word in section_name for word in rule["any"]))
+            and not any(word in section_name for word in rule.get("none", [])))
+
+
+def get_section_category(venue: str, section_name: str) -> Optional[str]:
+    """Find the stand a section belongs to.
+    Args:
+        venue (str):
+            The name of the venue, as listed in the venue rules.
+        section_name (str):
+            The name of the section.
+    Returns:
+        Optional[str]:
+            The category of the section, or None if it isn't part of any category.
+    """
+    venue_rules = load_venue_rules().get(venue)
+    if venue_rules is None:
+        return None
+    section_name = section_name.lower()
+    for rule in venue_rules["rules"]:
+        if match_section_rule(rule, section_name):
+            return rule["category"]
+    return None
+
+
+SECTION_CLASS_CACHE_SIZE = 4096  # Sections whose category is kept, a few venues' worth
+
+
+@lru_cache(maxsize=SECTION_CLASS_CACHE_SIZE)
+def classify_section(venue: str, section_name: str) -> Tuple[Optional[str], bool]:
+    """Find the category of a section and whether it counts in the total, once per venue and section name."""
+    venue_rules = load_venue_rules().get(venue)
+    if venue_rules is None:
+        return None, True
+    in_total = not any(match_section_rule(rule, section_name.lower()) for rule in venue_rules["exclude_from_total"])
+    return get_section_category(venue, section_name), in_total
+
+
+def get_section_index(venue: str, data: List[Dict],
+                      layout: Optional[Dict] = None) -> Dict[int, Tuple[Optional[str], bool]]:
+    """Compiles the venue rules into a lookup of the category of each section and if it counts in the total.
+
+    The sections of the venue layout were classified when the layout was built, so only the sections
+    missing from it are matched against the rules, through the bounded cache of classify_section.
+    Args:
+        venue (str):
+            The name of the venue, as listed in the venue rules.
+        data (List[Dict]):
+            The section data of the event.
+        layout (Optional[Dict]):
+            The venue layout of the event, if any.
+    Returns:
+        Dict[int, Tuple[Optional[str], bool]]:
+            The category (or None) and whether the section counts in the total, keyed by section ID.
+    """
+    section_layouts = layout["sections"] if layout else {}
+    section_index = {}
+    for section in data:
+        section_layout = section_layouts.get(section["section_id"])
+        if section_layout is not None and "in_total" in section_layout:
+            section_index[section["section_id"]] = (section_layout["category"], section_layout["in_total"])
+        else:
+            section_index[section["section_id"]] = classify_section(venue, section["section_name"])
+    return section_index
 
 
 def get_venue_from_event_date(event_date: str) -> str:
@@ -460,32 +1286,93 @@ def get_venue_from_event_date(event_date: str) -> str:
     return venue
 
 
+NORWEGIAN_MONTHS = ["jan", "feb", "mar", "apr", "mai", "jun", "jul", "aug", "sep", "okt", "nov", "des"]
+
+
+def get_kickoff_from_event_date(event_date: str) -> Optional[datetime]:
+    """Extracts the kickoff time from the event date string.
+
+    Both numeric dates ('21.12.2023 18:45@Åsane Arena') and Norwegian month names
+    ('21. desember 2023 18:45') are understood.
+    Args:
+        event_date (str):
+            The date and venue of the event.
+    Returns:
+        Optional[datetime]:
+            The kickoff time in Norwegian time, or None if the string has no recognizable date.
+    """
+    event_date = event_date.lower()
+    time_match = re.search(r"(?<![\d.])(\d{1,2})[:.](\d{2})(?!\d|\.\d)", event_date)
+    numeric_match = re.search(r"(\d{1,2})\.(\d{1,2})\.(\d{4})", event_date)
+    named_match = re.search(r"(\d{1,2})\.?\s*([a-zæøå]{3})[a-zæøå]*\.?\s+(\d{4})", event_date)
+    if numeric_match:
+        day, month, year = (int(value) for value in numeric_match.groups())
+    elif named_match and named_match.group(2) in NORWEGIAN_MONTHS:
+        day, month, year = (int(named_match.group(1)), NORWEGIAN_MONTHS.index(named_match.group(2)) + 1,
+                            int(named_match.group(3)))
+    else:
+        return None
+    hour, minute = (int(time_match.group(1)), int(time_match.group(2))) if time_match else (0, 0)
+    try:
+        return pytz.timezone("Europe/Oslo").localize(datetime(year, month, day, hour, minute))
+    except ValueError:
+        return None
+
+
 def get_latest_file(dir_path: str) -> Tuple[Dict, Optional[Dict]]:
-    """Fetches the two most recent files in a directory.
+    """Fetches the most recent snapshot of an event and the snapshot to compare it with.
 
-    The function returns the data of the two most recently edited files in a directory.
-    If there is only one file, the second element in the tuple will be None.
+    The latest snapshot is compared with the one that was last published, so the change shown in
+    a tweet covers the time since the last tweet, however often the event is polled in between.
+    An event that has never been published is compared with its second most recent snapshot.
     Args:
         dir_path (str):
-            The path to the directory.
+            The directory path identifying the event.
     Returns:
         Tuple[Dict, Optional[Dict]]:
-            The most recent and the second most recent file data, if available.
-    """
-    files = os.listdir(dir_path)
-    sorted_files = sorted(files, key=lambda x: os.path.getmtime(os.path.join(dir_path, x)), reverse=True)
-    if len(sorted_files) > 1:
-        latest_file_path = os.path.join(dir_path, sorted_files[0])
-        prior_file_path = os.path.join(dir_path, sorted_files[1])
-        with open(latest_file_path, "r") as json_file:
-            latest_file = json.load(json_file)
-        with open(prior_file_path, "r") as json_file:
-            prior_file = json.load(json_file)
-        return latest_file, prior_file
-    else:
-        latest_file_path = os.path.join(dir_path, sorted_files[0])
-        with open(latest_file_path, "r") as json_file:
-            return json.load(json_file), None
+            The most recent snapshot data, and the data to compare it with if available.
+    """
+    snapshot_store.import_directory(dir_path)
+    event_key = os.path.basename(dir_path)
+    snapshots = snapshot_store.get_latest_snapshots(event_key, 2)
+    published = snapshot_store.get_published_snapshot(event_key)
+    if isinstance(published, dict):
+        return snapshots[0], published
+    if len(snapshots) > 1:
+        return snapshots[0], snapshots[1]
+    return snapshots[0], None
+
+
+def get_event_fingerprint(dir_path: str) -> Optional[str]:
+    """Hash the category totals of the latest snapshot of an event, or return None if it has no snapshot.
+
+    The title and date are left out, so only a change in the counts gives a new fingerprint.
+    """
+    snapshot_store.import_directory(dir_path)
+    snapshots = snapshot_store.get_latest_snapshots(os.path.basename(dir_path), 1)
+    if not snapshots or not isinstance(snapshots[0], dict):
+        return None
+    totals = {category: data for category, data in snapshots[0].items() if "GENERAL" not in category}
+    return hashlib.sha1(json.dumps(totals, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_changed_events(dir_paths: List[str]) -> List[str]:
+    """Return the events whose latest snapshot differs from the last one that was published."""
+    changed_dir_paths = []
+    for dir_path in dir_paths:
+        fingerprint = get_event_fingerprint(dir_path)
+        if fingerprint is None or fingerprint != snapshot_store.get_published_fingerprint(os.path.basename(dir_path)):
+            changed_dir_paths.append(dir_path)
+    return changed_dir_paths
+
+
+def mark_published(dir_paths: List[str]):
+    """Remember the latest snapshot of every event as published, so it's skipped until the counts change."""
+    published = datetime.now().isoformat()
+    for dir_path in dir_paths:
+        fingerprint = get_event_fingerprint(dir_path)
+        if fingerprint is not None:
+            snapshot_store.save_published_fingerprint(os.path.basename(dir_path), fingerprint, published)
 
 
 def create_string(dir_path: str) -> str:
@@ -516,7 +1403,7 @@ def create_string(dir_path: str) -> str:
         if category.lower() == "totalt":  # Adds newline before the totals
             return_value += "\n"
 
-        if prior is not None:
+        if prior is not None and category in prior:
             prior_available_seats = prior[category]["available_seats"]
             prior_total_capacity = prior[category]["section_amount"]
             prior_sold_seats = prior_total_capacity - prior_available_seats
@@ -565,7 +1452,7 @@ def create_seasonpass_string(dir_path: str) -> str:
             sold_seats = data["sold_seats"]
 
             diff_sold_seats = 0
-            if prior is not None:
+            if prior is not None and category in prior:
                 prior_sold_seats = prior[category]["sold_seats"]
 
                 diff_sold_seats = sold_seats - prior_sold_seats
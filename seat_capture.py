@@ -0,0 +1,120 @@
+import json
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import snapshot_store
+
+# Compact binary captures of the status of every seat.
+# Each section of a venue has a seat layout, saved once in the snapshot store, that gives every seat
+# a stable index. A capture of the section is then a byte array with one status code per seat index,
+# compressed with zlib. Seats that show up later are appended to the layout, so old indexes never move.
+
+SEAT_STATUS_CODES = {"available": 0, "sold": 1, "locked": 2}
+UNKNOWN_STATUS = 3  # Any other status, or a seat that was missing from the poll
+SEAT_STATUS_NAMES = ("available", "sold", "locked", "unknown")
+
+_layouts = {}  # Seat layouts per venue, loaded once per process
+
+
+def save_seat_capture(event_key: str, venue: str, created: str, results: List[Optional[Dict]]):
+    """Encode and save the seat states of every section of an event.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        venue (str):
+            The name of the venue.
+        created (str):
+            The time of the poll, formatted for chronological sorting.
+        results (List[Optional[Dict]]):
+            The section results from get_section_tickets, with their 'seat_states'.
+    """
+    section_states = {}
+    for section in results:
+        if section is None or section["seat_states"] is None:
+            continue
+        section_states[section["section_id"]] = encode_section_states(
+            venue, section["section_id"], section["section_name"], section["seat_states"])
+    if section_states:
+        snapshot_store.save_seat_capture(event_key, venue, created, section_states)
+
+
+def load_latest_seat_captures(event_key: str, amount: int = 2) -> List[Dict]:
+    """Fetch and decode the most recent seat captures of an event, newest first.
+
+    The 'sections' of each capture map the section ID to a byte array of status codes,
+    indexed like the seats of the section in get_seat_layouts(venue).
+    """
+    captures = snapshot_store.get_latest_seat_captures(event_key, amount)
+    for capture in captures:
+        capture["sections"] = {section_id: zlib.decompress(states)
+                               for section_id, states in capture["sections"].items()}
+    return captures
+
+
+def encode_section_states(venue: str, section_id: int, section_name: str,
+                          seat_states: List[Tuple]) -> bytes:
+    """Encode the seats of a section as a compressed array of status codes.
+    Args:
+        venue (str):
+            The name of the venue.
+        section_id (int):
+            The ID of the section.
+        section_name (str):
+            The name of the section.
+        seat_states (List[Tuple]):
+            The (id, status, x, y) of every seat in the section.
+    Returns:
+        bytes:
+            The status code of every seat in layout order, compressed with zlib.
+    """
+    layouts = get_seat_layouts(venue)
+    layout = layouts.get(section_id)
+    if layout is None:
+        layout = layouts[section_id] = {"section_name": section_name, "seats": [], "index": {}}
+
+    seat_index = layout["index"]
+    states = bytearray([UNKNOWN_STATUS]) * len(layout["seats"])
+    layout_changed = layout["section_name"] != section_name
+    for seat_id, status, x, y in seat_states:
+        key = get_seat_key(seat_id, x, y)
+        index = seat_index.get(key)
+        if index is None:
+            index = seat_index[key] = len(layout["seats"])
+            layout["seats"].append([seat_id, x, y])
+            states.append(UNKNOWN_STATUS)
+            layout_changed = True
+        states[index] = SEAT_STATUS_CODES.get(status, UNKNOWN_STATUS)
+
+    if layout_changed:
+        layout["section_name"] = section_name
+        snapshot_store.save_seat_layout(venue, section_id, section_name, layout["seats"])
+    return zlib.compress(bytes(states))
+
+
+def pack_seat_states(seat_states: List[Tuple]) -> bytes:
+    """Compress the (id, status, x, y) of every seat of a section for sending between processes.
+
+    Unlike encode_section_states, this needs no seat layout, so a worker on another host can pack
+    the seats and leave the layout to the coordinator.
+    """
+    return zlib.compress(json.dumps(seat_states, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack_seat_states(packed: bytes) -> List[Tuple]:
+    """Decompress the seat states packed by pack_seat_states."""
+    return [tuple(seat) for seat in json.loads(zlib.decompress(packed))]
+
+
+def get_seat_layouts(venue: str) -> Dict[int, Dict]:
+    """Return the seat layouts of a venue keyed by section ID, loading them on first use."""
+    if venue not in _layouts:
+        layouts = snapshot_store.get_seat_layouts(venue)
+        for layout in layouts.values():
+            layout["index"] = {get_seat_key(*seat): index for index, seat in enumerate(layout["seats"])}
+        _layouts[venue] = layouts
+    return _layouts[venue]
+
+
+def get_seat_key(seat_id, x, y) -> str:
+    """Identify a seat by its ID, or by its position if it has none."""
+    return str(seat_id) if seat_id is not None else f"{x},{y}"
@@ -0,0 +1,110 @@
+import re
+from typing import Dict, List, Optional
+
+from scrape_tools import get_section_category
+from seat_capture import UNKNOWN_STATUS, SEAT_STATUS_CODES, get_seat_layouts, load_latest_seat_captures
+
+# Seat-level diff between two consecutive seat captures of an event.
+# The prior and latest status codes of every seat are merged into one transition code per seat,
+# (prior << 2) | latest, using big-integer arithmetic over the whole byte array at once.
+# Counting a transition is then a single bytes.count, so no Python code runs per seat.
+
+AVAILABLE = SEAT_STATUS_CODES["available"]
+SOLD = SEAT_STATUS_CODES["sold"]
+LOCKED = SEAT_STATUS_CODES["locked"]
+
+# Transition name: the (prior, latest) status pairs it covers
+TRANSITIONS = {
+    "sold": [(AVAILABLE, SOLD)],
+    "released": [(SOLD, AVAILABLE)],
+    "locked": [(AVAILABLE, LOCKED), (SOLD, LOCKED)],
+    "unlocked": [(LOCKED, AVAILABLE)],
+    "locked_sold": [(LOCKED, SOLD)],
+}
+
+
+def diff_latest_seat_captures(event_key: str, include_seats: bool = False) -> Optional[Dict]:
+    """Diff the two most recent seat captures of an event.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        include_seats (bool):
+            Whether to list the IDs of the seats behind every transition of every section.
+    Returns:
+        Optional[Dict]:
+            The diff as returned by diff_seat_captures, or None if there are fewer than two captures.
+    """
+    captures = load_latest_seat_captures(event_key, 2)
+    if len(captures) < 2:
+        return None
+    latest, prior = captures
+    return diff_seat_captures(prior["sections"], latest["sections"], latest["venue"], include_seats)
+
+
+def diff_seat_captures(prior: Dict[int, bytes], latest: Dict[int, bytes], venue: str,
+                       include_seats: bool = False) -> Dict:
+    """Count the seats that changed status between two captures, per section, category and in total.
+    Args:
+        prior (Dict[int, bytes]):
+            The decoded seat states per section ID of the earlier capture.
+        latest (Dict[int, bytes]):
+            The decoded seat states per section ID of the later capture.
+        venue (str):
+            The name of the venue, used for the seat layouts and the section categories.
+        include_seats (bool):
+            Whether to list the IDs of the seats behind every transition of every section.
+    Returns:
+        Dict:
+            The transition counts under 'sections' (keyed by section ID), 'categories' and 'total'.
+            Sections also carry their name and category, and the seat IDs if include_seats is set.
+    """
+    layouts = get_seat_layouts(venue)
+    result = {"sections": {}, "categories": {}, "total": dict.fromkeys(TRANSITIONS, 0)}
+    for section_id, latest_states in latest.items():
+        if section_id not in prior:
+            continue
+        transitions = get_transition_codes(prior[section_id], latest_states)
+        section_name = layouts[section_id]["section_name"] if section_id in layouts else str(section_id)
+        category = get_section_category(venue, section_name)
+
+        section_diff = {"section_name": section_name, "category": category}
+        for name, pairs in TRANSITIONS.items():
+            section_diff[name] = sum(transitions.count((prior_code << 2) | latest_code)
+                                     for prior_code, latest_code in pairs)
+            result["total"][name] += section_diff[name]
+            if category is not None:
+                category_diff = result["categories"].setdefault(category, dict.fromkeys(TRANSITIONS, 0))
+                category_diff[name] += section_diff[name]
+
+        if include_seats and section_id in layouts:
+            seats = layouts[section_id]["seats"]
+            section_diff["seats"] = {name: [seats[index][0] for index in find_transitions(transitions, pairs)]
+                                     for name, pairs in TRANSITIONS.items()}
+        result["sections"][section_id] = section_diff
+    return result
+
+
+def get_transition_codes(prior: bytes, latest: bytes) -> bytes:
+    """Merge two arrays of seat status codes into one array of (prior << 2) | latest codes.
+
+    Seat layouts only grow, so a shorter prior array is padded with the unknown status.
+    """
+    length = len(latest)
+    prior = prior[:length].ljust(length, bytes([UNKNOWN_STATUS]))
+    merged = (int.from_bytes(prior, "big") << 2) | int.from_bytes(latest, "big")
+    return merged.to_bytes(length, "big")
+
+
+def find_transitions(transitions: bytes, pairs: List) -> List[int]:
+    """Return the seat indexes whose transition code matches any of the (prior, latest) pairs."""
+    codes = re.escape(bytes((prior_code << 2) | latest_code for prior_code, latest_code in pairs))
+    return [match.start() for match in re.finditer(b"[" + codes + b"]", transitions)]
+
+
+def format_seat_diff(event_key: str, diff: Dict) -> str:
+    """Describe the transitions of a seat diff in total and per category, leaving out the ones that didn't happen."""
+    lines = [f"Seat changes of {event_key} since the last capture:"]
+    for name, counts in [("Total", diff["total"])] + sorted(diff["categories"].items()):
+        changes = ", ".join(f"{transition} {count}" for transition, count in counts.items() if count)
+        lines.append(f"  {name}: {changes or 'no changes'}")
+    return "\n".join(lines)
@@ -0,0 +1,350 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from typing import Dict, List, Optional, Union
+
+# Stores every poll of every event in a single SQLite database, indexed per event,
+# instead of one results_<timestamp>.json file per poll in a directory per event.
+
+DATABASE_PATH = os.path.dirname(os.path.abspath(__file__)) + "/snapshots.db"
+LEGACY_FILE_PATTERN = re.compile(r"results_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json")
+
+_connection = None
+_lock = threading.Lock()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Open the snapshot database, creating the tables on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                created TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_event ON snapshots (event, id);
+            CREATE TABLE IF NOT EXISTS imported_directories (
+                event TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS seat_layouts (
+                venue TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                section_name TEXT NOT NULL,
+                seats TEXT NOT NULL,
+                PRIMARY KEY (venue, section_id)
+            );
+            CREATE TABLE IF NOT EXISTS seat_captures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                venue TEXT NOT NULL,
+                created TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS seat_captures_event ON seat_captures (event, id);
+            CREATE TABLE IF NOT EXISTS venue_layouts (
+                layout_key TEXT PRIMARY KEY,
+                layout TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS seat_capture_sections (
+                capture_id INTEGER NOT NULL,
+                section_id INTEGER NOT NULL,
+                states BLOB NOT NULL,
+                PRIMARY KEY (capture_id, section_id)
+            );
+            CREATE TABLE IF NOT EXISTS published_fingerprints (
+                event TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                published TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS published_snapshots (
+                event TEXT PRIMARY KEY,
+                snapshot_id INTEGER NOT NULL,
+                published TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS section_checkpoints (
+                event_url TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                created TEXT NOT NULL,
+                PRIMARY KEY (event_url, section_id)
+            );
+            CREATE TABLE IF NOT EXISTS ticket_links (
+                event_url TEXT PRIMARY KEY,
+                ticket_url TEXT NOT NULL,
+                fetched TEXT NOT NULL
+            );
+        """)
+        _connection.commit()
+    return _connection
+
+
+def set_database_path(path: str):
+    """Switch to another snapshot database, closing the current connection."""
+    global DATABASE_PATH, _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        DATABASE_PATH = path
+
+
+def save_snapshot(event_key: str, created: str, data: Union[Dict, List[Dict]]):
+    """Append a snapshot of an event.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        created (str):
+            The time of the poll, formatted for chronological sorting.
+        data (Union[Dict, List[Dict]]):
+            The data of the poll.
+    """
+    with _lock:
+        connection = get_connection()
+        connection.execute("INSERT INTO snapshots (event, created, data) VALUES (?, ?, ?)",
+                           (event_key, created, json.dumps(data)))
+        connection.commit()
+
+
+def get_latest_snapshots(event_key: str, amount: int = 2) -> List[Dict]:
+    """Fetch the most recent snapshots of an event, newest first.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        amount (int):
+            The maximum number of snapshots to return.
+    Returns:
+        List[Dict]:
+            The data of up to 'amount' snapshots, starting with the latest one.
+    """
+    with _lock:
+        rows = get_connection().execute(
+            "SELECT data FROM snapshots WHERE event = ? ORDER BY id DESC LIMIT ?", (event_key, amount)).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def get_seat_layouts(venue: str) -> Dict[int, Dict]:
+    """Fetch the seat layout of every known section of a venue.
+    Args:
+        venue (str):
+            The name of the venue.
+    Returns:
+        Dict[int, Dict]:
+            The section name and the list of [id, x, y] seats of each section, keyed by section ID.
+    """
+    with _lock:
+        rows = get_connection().execute(
+            "SELECT section_id, section_name, seats FROM seat_layouts WHERE venue = ?", (venue,)).fetchall()
+    return {section_id: {"section_name": section_name, "seats": json.loads(seats)}
+            for section_id, section_name, seats in rows}
+
+
+def save_seat_layout(venue: str, section_id: int, section_name: str, seats: List):
+    """Save or replace the seat layout of a section of a venue."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("INSERT OR REPLACE INTO seat_layouts (venue, section_id, section_name, seats) "
+                           "VALUES (?, ?, ?, ?)", (venue, section_id, section_name, json.dumps(seats)))
+        connection.commit()
+
+
+def save_seat_capture(event_key: str, venue: str, created: str, section_states: Dict[int, bytes]):
+    """Save the encoded seat states of every section of an event from a single poll.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        venue (str):
+            The name of the venue, whose seat layouts index the states.
+        created (str):
+            The time of the poll, formatted for chronological sorting.
+        section_states (Dict[int, bytes]):
+            The encoded seat states of each section, keyed by section ID.
+    """
+    with _lock:
+        connection = get_connection()
+        cursor = connection.execute("INSERT INTO seat_captures (event, venue, created) VALUES (?, ?, ?)",
+                                    (event_key, venue, created))
+        connection.executemany("INSERT INTO seat_capture_sections (capture_id, section_id, states) VALUES (?, ?, ?)",
+                               [(cursor.lastrowid, section_id, states)
+                                for section_id, states in section_states.items()])
+        connection.commit()
+
+
+def get_latest_seat_captures(event_key: str, amount: int = 2) -> List[Dict]:
+    """Fetch the most recent seat captures of an event, newest first.
+    Args:
+        event_key (str):
+            The key identifying the event.
+        amount (int):
+            The maximum number of captures to return.
+    Returns:
+        List[Dict]:
+            The venue, time and encoded seat states per section ID of up to 'amount' captures.
+    """
+    with _lock:
+        connection = get_connection()
+        captures = connection.execute("SELECT id, venue, created FROM seat_captures WHERE event = ? "
+                                      "ORDER BY id DESC LIMIT ?", (event_key, amount)).fetchall()
+        results = []
+        for capture_id, venue, created in captures:
+            rows = connection.execute("SELECT section_id, states FROM seat_capture_sections WHERE capture_id = ?",
+                                      (capture_id,)).fetchall()
+            results.append({"venue": venue, "created": created, "sections": dict(rows)})
+    return results
+
+
+def get_venue_layout(layout_key: str) -> Optional[Dict]:
+    """Fetch a cached section layout, or None if there is none."""
+    with _lock:
+        row = get_connection().execute("SELECT layout FROM venue_layouts WHERE layout_key = ?",
+                                       (layout_key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_venue_layout(layout_key: str, layout: Dict):
+    """Save or replace a cached section layout."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("INSERT OR REPLACE INTO venue_layouts (layout_key, layout) VALUES (?, ?)",
+                           (layout_key, json.dumps(layout)))
+        connection.commit()
+
+
+def get_published_fingerprint(event_key: str) -> Optional[str]:
+    """Fetch the fingerprint of the last published snapshot of an event, or None if it was never published."""
+    with _lock:
+        row = get_connection().execute("SELECT fingerprint FROM published_fingerprints WHERE event = ?",
+                                       (event_key,)).fetchone()
+    return row[0] if row else None
+
+
+def save_published_fingerprint(event_key: str, fingerprint: str, published: str):
+    """Save the fingerprint of the latest snapshot of an event, which was just published, and remember the snapshot."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("INSERT OR REPLACE INTO published_fingerprints (event, fingerprint, published) "
+                           "VALUES (?, ?, ?)", (event_key, fingerprint, published))
+        connection.execute("INSERT OR REPLACE INTO published_snapshots (event, snapshot_id, published) "
+                           "SELECT event, MAX(id), ? FROM snapshots WHERE event = ? GROUP BY event",
+                           (published, event_key))
+        connection.commit()
+
+
+def get_published_snapshot(event_key: str) -> Optional[Union[Dict, List[Dict]]]:
+    """Fetch the data of the last published snapshot of an event, or None if it was never published."""
+    with _lock:
+        row = get_connection().execute(
+            "SELECT snapshots.data FROM published_snapshots "
+            "JOIN snapshots ON snapshots.id = published_snapshots.snapshot_id "
+            "WHERE published_snapshots.event = ?", (event_key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def get_section_checkpoints(event_url: str, since: str) -> Dict[int, Dict]:
+    """Fetch the section results of an unfinished poll of an event saved since a given time, keyed by section ID."""
+    with _lock:
+        rows = get_connection().execute("SELECT section_id, result FROM section_checkpoints "
+                                        "WHERE event_url = ? AND created >= ?", (event_url, since)).fetchall()
+    return {section_id: json.loads(result) for section_id, result in rows}
+
+
+def save_section_checkpoints(event_url: str, results: Dict[int, Dict], created: str):
+    """Save the results of the sections counted so far in a single transaction, so an unfinished poll can be resumed."""
+    with _lock:
+        connection = get_connection()
+        connection.executemany("INSERT OR REPLACE INTO section_checkpoints (event_url, section_id, result, created) "
+                               "VALUES (?, ?, ?, ?)",
+                               [(event_url, section_id, json.dumps(result), created)
+                                for section_id, result in results.items()])
+        connection.commit()
+
+
+def delete_section_checkpoints(event_url: str):
+    """Drop the section results of a poll once it's finished and saved."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("DELETE FROM section_checkpoints WHERE event_url = ?", (event_url,))
+        connection.commit()
+
+
+def get_ticket_link(event_url: str) -> Optional[Dict]:
+    """Fetch the cached ticket page URL of an event page, with the time it was fetched, or None."""
+    with _lock:
+        row = get_connection().execute("SELECT ticket_url, fetched FROM ticket_links WHERE event_url = ?",
+                                       (event_url,)).fetchone()
+    return {"ticket_url": row[0], "fetched": row[1]} if row else None
+
+
+def save_ticket_link(event_url: str, ticket_url: str, fetched: str):
+    """Save or replace the cached ticket page URL of an event page."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("INSERT OR REPLACE INTO ticket_links (event_url, ticket_url, fetched) VALUES (?, ?, ?)",
+                           (event_url, ticket_url, fetched))
+        connection.commit()
+
+
+def delete_ticket_link(ticket_url: str):
+    """Forget every cached link to a ticket page, so it's looked up again on the next discovery."""
+    with _lock:
+        connection = get_connection()
+        connection.execute("DELETE FROM ticket_links WHERE ticket_url = ?", (ticket_url,))
+        connection.commit()
+
+
+def import_directory(dir_path: str) -> int:
+    """Import the results_*.json files of a legacy event directory, oldest first.
+
+    Every directory is imported only once, so the snapshots saved after the import
+    are never mixed up with the legacy files again.
+    Args:
+        dir_path (str):
+            The path to the event directory.
+    Returns:
+        int:
+            The number of imported snapshots.
+    """
+    event_key = os.path.basename(os.path.normpath(dir_path))
+    if not os.path.isdir(dir_path):
+        return 0
+
+    with _lock:
+        connection = get_connection()
+        if connection.execute("SELECT 1 FROM imported_directories WHERE event = ?", (event_key,)).fetchone():
+            return 0
+
+        files = [name for name in os.listdir(dir_path) if LEGACY_FILE_PATTERN.fullmatch(name)]
+        files.sort(key=lambda name: os.path.getmtime(os.path.join(dir_path, name)))
+        for name in files:
+            with open(os.path.join(dir_path, name), "r") as json_file:
+                data = json_file.read()
+            created = LEGACY_FILE_PATTERN.fullmatch(name).group(1)
+            connection.execute("INSERT INTO snapshots (event, created, data) VALUES (?, ?, ?)",
+                               (event_key, created, data))
+        connection.execute("INSERT INTO imported_directories (event) VALUES (?)", (event_key,))
+        connection.commit()
+    return len(files)
+
+
+def import_all_directories(root_path: str) -> int:
+    """Import every legacy event directory found in root_path."""
+    imported = 0
+    for name in sorted(os.listdir(root_path)):
+        dir_path = os.path.join(root_path, name)
+        if os.path.isdir(dir_path) and any(LEGACY_FILE_PATTERN.fullmatch(file) for file in os.listdir(dir_path)):
+            count = import_directory(dir_path)
+            if count > 0:
+                print(f"Imported {count} snapshots from {dir_path}")
+            imported += count
+    return imported
+
+
+if __name__ == "__main__":
+    # One-time import of the old results directories: python snapshot_store.py [directory]
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))
+    print(f"Imported {import_all_directories(root)} snapshots in total")
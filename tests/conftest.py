@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrape_tools  # noqa: E402
+import seat_capture  # noqa: E402
+import snapshot_store  # noqa: E402
+from http_cache import HttpCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Point every file the scraper writes to a temporary directory, and clear the in-memory caches."""
+    monkeypatch.setattr(scrape_tools, "SAVE_PATH", str(tmp_path) + "/")
+    monkeypatch.setattr(scrape_tools, "http_cache", HttpCache(str(tmp_path / "http_cache"), 10 ** 8))
+    scrape_tools._venue_layouts.clear()
+    seat_capture._layouts.clear()
+    # A test may point the venue rules to a file of its own
+    for cache in (scrape_tools.load_venue_rules, scrape_tools.get_venue_rules_fingerprint,
+                  scrape_tools.classify_section):
+        cache.cache_clear()
+    database_path = snapshot_store.DATABASE_PATH
+    snapshot_store.set_database_path(str(tmp_path / "snapshots.db"))
+    yield tmp_path
+    snapshot_store.set_database_path(database_path)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scrape_tools
+import workers
+from adaptive_limiter import AdaptiveLimiter, FairSemaphore
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Answers 429 with a Retry-After header to the first request, and 200 to the ones after it."""
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        if type(self).requests == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rate_limited_url():
+    RateLimitedHandler.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/events/1/item_types.json"
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_halves_the_limit_and_pauses():
+    limiter = AdaptiveLimiter(8, 2, 32)
+    with limiter.slot() as sent:
+        pass
+    limiter.on_response(sent, 429, "5")
+    assert limiter.limit == 4
+    assert limiter.paused_until >= time.monotonic() + 4
+
+
+def test_a_burst_of_429s_decreases_the_limit_once():
+    limiter = AdaptiveLimiter(8, 2, 32)
+    sent = [time.monotonic() for _ in range(5)]
+    for request_sent in sent:
+        limiter.on_response(request_sent, 429, "0")
+    assert limiter.limit == 4
+
+
+def test_fast_responses_increase_the_limit_up_to_the_maximum():
+    limiter = AdaptiveLimiter(2, 2, 3)
+    for _ in range(20):
+        with limiter.slot() as sent:
+            pass
+        limiter.on_response(sent, 200, kind="section")
+    assert limiter.limit == 3
+
+
+def test_slow_responses_decrease_the_limit():
+    limiter = AdaptiveLimiter(10, 2, 32)
+    limiter.on_response(time.monotonic() - 0.01, 200, kind="section")
+    limit = limiter.limit
+    limiter.on_response(time.monotonic() - 1.0, 200, kind="section")
+    assert limiter.limit == pytest.approx(limit * 0.9)
+
+
+def test_the_limit_never_goes_below_the_minimum():
+    limiter = AdaptiveLimiter(3, 2, 32)
+    for _ in range(3):
+        limiter.on_error(time.monotonic())
+    assert limiter.limit == 2
+
+
+def test_a_pause_holds_back_new_requests():
+    limiter = AdaptiveLimiter(8, 2, 32)
+    limiter.on_response(time.monotonic(), 429, "0.2")
+    start = time.monotonic()
+    with limiter.slot():
+        pass
+    assert time.monotonic() - start >= 0.15
+
+
+def test_429_reaches_the_limiter_through_the_session(rate_limited_url, monkeypatch):
+    limiter = AdaptiveLimiter(8, 2, 32)
+    monkeypatch.setattr(scrape_tools, "request_limiter", limiter)
+    start = time.monotonic()
+    response = scrape_tools.get_with_limit(rate_limited_url)
+    assert response.status_code == 200
+    assert RateLimitedHandler.requests == 2
+    assert limiter.paused_until >= start + 1
+    assert limiter.limit < 8
+
+
+def test_workers_share_the_request_limits(monkeypatch):
+    monkeypatch.setattr(scrape_tools, "request_limiter", scrape_tools.request_limiter)
+    workers.share_request_limits(4)
+    limiter = scrape_tools.request_limiter
+    assert limiter.max_limit * 4 <= scrape_tools.MAX_CONCURRENT_REQUESTS
+    assert limiter.min_limit <= limiter.limit <= limiter.max_limit
+
+
+def test_the_fair_semaphore_serves_the_tenants_in_turn():
+    async def run():
+        semaphore = FairSemaphore(1)
+        order = []
+
+        async def request(tenant):
+            async with semaphore.slot(tenant):
+                order.append(tenant)
+                await asyncio.sleep(0)
+
+        await semaphore.acquire("holder")
+        tasks = [asyncio.create_task(request(tenant)) for tenant in ["big"] * 4 + ["small"] * 2 + ["late"]]
+        await asyncio.sleep(0)  # Every task is waiting for the slot
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["big", "small", "late", "big", "small", "big", "big"]
@@ -0,0 +1,48 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import scrape_tools
+
+EVENT = """
+<div class="tc-events-list--details">
+  <a class="tc-events-list--title" href="https://brann.example/events/{number}">Brann - {opponent}</a>
+  <div class="tc-events-list--place-time">20.05.2030 18:00@Brann Stadion</div>
+</div>
+"""
+SECTION = json.dumps({"seating_arrangements": {"section_name": "Felt B (Spv)", "section_amount": 2, "seats": [
+    {"id": 1, "status": "sold", "x": 1, "y": 1}, {"id": 2, "status": "available", "x": 2, "y": 1}]}})
+
+
+@pytest.fixture
+def storefront(monkeypatch):
+    """A storefront with two events, where the item_types.json of the first one isn't valid JSON."""
+    item_types = json.dumps({"item_types": [{"sections": [{"id": 1}]}]})
+    pages = {
+        "https://brann.example/no/nb": EVENT.format(number=1, opponent="Molde") + EVENT.format(number=2,
+                                                                                              opponent="Viking"),
+        "https://brann.example/events/1": '<a id="placeOrderLink" href="https://brann.example/tickets/1/">Kjøp</a>',
+        "https://brann.example/events/2": '<a id="placeOrderLink" href="https://brann.example/tickets/2/">Kjøp</a>',
+        "https://brann.example/tickets/1/item_types.json": "<html>Down for maintenance</html>",
+        "https://brann.example/tickets/2/item_types.json": item_types,
+        "https://brann.example/tickets/2/sections/1.json": SECTION,
+    }
+
+    def fetch_url(url):
+        if url not in pages:
+            return None
+        return SimpleNamespace(text=pages[url], json=lambda: json.loads(pages[url]))
+
+    monkeypatch.setattr(scrape_tools, "HOMEPAGE_URL", "https://brann.example/no/nb")
+    monkeypatch.setattr(scrape_tools, "fetch_url", fetch_url)
+
+
+def test_an_event_that_cant_be_read_doesnt_stop_the_others(storefront):
+    dir_paths = scrape_tools.update_event_data("all", concurrent=True)
+    assert [dir_path.rsplit("/", 1)[1] for dir_path in dir_paths] == ["Brann-Viking"]
+
+
+def test_the_sequential_path_skips_it_too(storefront):
+    dir_paths = scrape_tools.update_event_data("all")
+    assert [dir_path.rsplit("/", 1)[1] for dir_path in dir_paths] == ["Brann-Viking"]
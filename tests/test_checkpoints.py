@@ -0,0 +1,89 @@
+import json
+import queue
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import scrape_tools
+import snapshot_store
+
+EVENT_URL = "https://brann.example/tickets/1/"
+SECTIONS = {1: "Felt A (Frydenbø)", 2: "Felt B (Spv)", 3: "Felt C (BT)"}
+
+
+@pytest.fixture
+def ticket_pages(monkeypatch):
+    """Serve the sections of an event, where the sections in 'failing' can't be fetched, and log every request."""
+    pages = SimpleNamespace(failing=set(), requested=[])
+    item_types = json.dumps({"item_types": [{"sections": [{"id": section} for section in SECTIONS]}]})
+
+    def fetch_url(url):
+        pages.requested.append(url)
+        if url == EVENT_URL + "item_types.json":
+            return SimpleNamespace(text=item_types, json=lambda: json.loads(item_types))
+        section = int(url.rsplit("/", 1)[1].split(".")[0])
+        if section in pages.failing:
+            return None
+        seats = [{"id": section * 100 + index, "status": "sold" if index < 2 else "available", "x": 1, "y": index}
+                 for index in range(4)]
+        return SimpleNamespace(text=json.dumps({"seating_arrangements": {
+            "section_name": SECTIONS[section], "section_amount": len(seats), "seats": seats}}))
+
+    monkeypatch.setattr(scrape_tools, "fetch_url", fetch_url)
+    monkeypatch.setattr(scrape_tools, "SECTION_RETRIES", 0)
+    return pages
+
+
+def get_ticket_info():
+    return scrape_tools.get_ticket_info(EVENT_URL, "Brann - Molde", "20.05.2030 18:00@Brann Stadion", False)
+
+
+def test_a_poll_resumes_from_the_sections_it_already_counted(ticket_pages):
+    ticket_pages.failing = {2}
+    assert get_ticket_info() is None
+    assert set(snapshot_store.get_section_checkpoints(EVENT_URL, "")) == {1, 3}
+
+    ticket_pages.failing, ticket_pages.requested = set(), []
+    dir_path = get_ticket_info()
+    assert ticket_pages.requested == [EVENT_URL + "item_types.json", EVENT_URL + "sections/2.json"]
+    snapshot = snapshot_store.get_latest_snapshots("Brann-Molde", 1)[0]
+    assert [snapshot[category]["sold_seats"] for category in ("SPV", "BT")] == [2, 2]
+    assert dir_path.endswith("/Brann-Molde")
+    assert snapshot_store.get_section_checkpoints(EVENT_URL, "") == {}
+
+
+def test_old_checkpoints_are_counted_again(ticket_pages, monkeypatch):
+    ticket_pages.failing = {2}
+    get_ticket_info()
+    monkeypatch.setattr(scrape_tools, "CHECKPOINT_MAX_AGE", timedelta(seconds=-1))
+    ticket_pages.failing, ticket_pages.requested = set(), []
+    get_ticket_info()
+    assert len(ticket_pages.requested) == 1 + len(SECTIONS)
+
+
+def test_the_workers_retry_and_checkpoint_the_failed_sections(ticket_pages, monkeypatch):
+    import workers
+
+    monkeypatch.setattr(scrape_tools, "SECTION_RETRIES", 1)
+    monkeypatch.setattr(scrape_tools, "SECTION_RETRY_DELAY", 0)
+    ticket_pages.failing = {2}
+    item_types = scrape_tools.fetch_url(EVENT_URL + "item_types.json").text
+    polls = [{"event_url": EVENT_URL, "title": "Brann - Molde", "organizer": "Brann", "sections": list(SECTIONS),
+              "layout": scrape_tools.load_venue_layout(EVENT_URL, item_types), "results": {}}]
+    jobs, results = queue.Queue(), queue.Queue()
+
+    def work():
+        while True:
+            index, section, event_url, capture_seats, section_layout = jobs.get()
+            result = scrape_tools.get_section_tickets(section, event_url, SimpleNamespace(update=lambda count: None),
+                                                      capture_seats, section_layout)
+            ticket_pages.failing.discard(section)  # Every section fails at most once
+            results.put((index, section, result))
+
+    threading.Thread(target=work, daemon=True).start()
+    workers.run_section_jobs(polls, jobs, results, False)
+    assert ticket_pages.requested.count(EVENT_URL + "sections/2.json") == 2
+    assert all(polls[0]["results"][section] is not None for section in SECTIONS)
+    assert set(snapshot_store.get_section_checkpoints(EVENT_URL, "")) == set(SECTIONS)
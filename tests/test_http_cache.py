@@ -0,0 +1,89 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_cache
+import scrape_tools
+from http_cache import HttpCache
+
+BODY = b'{"item_types": []}'
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """Answers with an ETag, and 304 without a body when the client already has it."""
+    statuses = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            type(self).statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        type(self).statuses.append(200)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def conditional_url():
+    ConditionalHandler.statuses = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ConditionalHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/events/1/item_types.json"
+    server.shutdown()
+    server.server_close()
+
+
+def make_response(url: str, size: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers["ETag"] = '"v1"'
+    response._content = b"x" * size
+    return response
+
+
+def get_cached_size(cache_dir) -> int:
+    return sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)
+               if name.endswith(".body"))
+
+
+def test_a_304_returns_the_cached_body(conditional_url):
+    first = scrape_tools.fetch_url(conditional_url)
+    second = scrape_tools.fetch_url(conditional_url)
+    assert ConditionalHandler.statuses == [200, 304]
+    assert second.from_cache and second.text == first.text
+    assert second.json() == {"item_types": []}
+
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path), 350)
+    for number in range(3):
+        cache.store(f"https://example.com/{number}", make_response(f"https://example.com/{number}", 100))
+        os.utime(cache._get_paths(f"https://example.com/{number}")[0], (number, number))
+    cache.load("https://example.com/0")  # Used again, so the second entry is the oldest
+    cache.store("https://example.com/3", make_response("https://example.com/3", 100))
+    assert get_cached_size(tmp_path) == 300
+    assert cache.load("https://example.com/0") is not None
+    assert cache.load("https://example.com/1") is None
+
+
+def test_processes_sharing_the_directory_evict_against_its_real_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "SIZE_RESCAN_INTERVAL", 0)
+    first, second = HttpCache(str(tmp_path), 350), HttpCache(str(tmp_path), 350)
+    first.store("https://example.com/0", make_response("https://example.com/0", 100))
+    second.store("https://example.com/1", make_response("https://example.com/1", 100))
+    second.store("https://example.com/2", make_response("https://example.com/2", 100))
+    first.store("https://example.com/3", make_response("https://example.com/3", 100))
+    assert get_cached_size(tmp_path) <= 350
@@ -0,0 +1,193 @@
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+import scrape_tools
+
+EVENT_LIST = """
+<div class="tc-events-list--details">
+  <a class="tc-events-list--title" href="{href}">{title}</a>
+  <div class="tc-events-list--place-time">20.05.2030 18:00@Brann Stadion</div>
+</div>
+<div class="tc-events-list--details">
+  <a class="tc-events-list--title" href="/gift-card">Gavekort</a>
+  <div class="tc-events-list--place-time">-</div>
+</div>
+"""
+EVENT_PAGE = '<a id="placeOrderLink" href="{ticket_url}">Kjøp</a>'
+
+
+@pytest.fixture
+def organizers(work_dir, monkeypatch):
+    """Two organizers on their own storefronts, where the storefront of 'Down' can't be reached."""
+    organizers_path = work_dir / "organizers.json"
+    organizers_path.write_text(json.dumps([
+        {"name": "Down", "homepage_url": "https://down.example/no/nb", "title_filter": "down -", "namespace": "down"},
+        {"name": "Brann", "homepage_url": "https://brann.example/no/nb", "title_filter": "brann -", "namespace": ""},
+    ]))
+    monkeypatch.setattr(scrape_tools, "ORGANIZERS_PATH", str(organizers_path))
+    scrape_tools.load_organizers.cache_clear()
+    pages = {
+        "https://brann.example/no/nb": EVENT_LIST.format(href="https://brann.example/events/1", title="Brann - Molde"),
+        "https://brann.example/events/1": EVENT_PAGE.format(ticket_url="https://brann.example/tickets/1/"),
+    }
+    monkeypatch.setattr(scrape_tools, "fetch_url",
+                        lambda url: SimpleNamespace(text=pages[url]) if url in pages else None)
+    yield
+    scrape_tools.load_organizers.cache_clear()
+
+
+def test_an_organizer_that_cant_be_reached_doesnt_stop_the_others(organizers):
+    events = scrape_tools.get_upcoming_events("all")
+    assert [(event["organizer"], event["title"], event["link"]) for event in events] == [
+        ("Brann", "Brann - Molde", "https://brann.example/tickets/1/")]
+    assert scrape_tools.get_organizer_events(scrape_tools.load_organizers()[0], "all") is None
+
+
+def test_event_keys_are_namespaced():
+    assert scrape_tools.get_directory_path("Brann - Molde", "aasane").endswith("/aasane-Brann-Molde")
+    assert scrape_tools.get_directory_path("Brann - Molde").endswith("/Brann-Molde")
+
+
+def test_the_daemon_keeps_the_schedule_of_an_organizer_that_cant_be_reached(organizers):
+    import daemon
+
+    now = datetime(2030, 5, 1, tzinfo=pytz.timezone("Europe/Oslo"))
+    known = {"down-Down-Brann": {"event": {"organizer": "Down"}, "next_poll": now, "dir_path": None}}
+    scheduled_events = daemon.discover_events(known, now)
+    assert set(scheduled_events) == {"down-Down-Brann", "Brann-Molde"}
+
+
+def test_events_are_published_per_organizer(organizers):
+    dir_paths = [scrape_tools.get_directory_path("Down - Brann", "down"),
+                 scrape_tools.get_directory_path("Brann - Molde"),
+                 scrape_tools.get_directory_path("Brann - Viking")]
+    groups = scrape_tools.group_by_organizer(dir_paths)
+    assert [(organizer["name"], len(organizer_dir_paths)) for organizer, organizer_dir_paths in groups] == [
+        ("Down", 1), ("Brann", 2)]
+
+
+def test_an_organizer_publishes_to_its_own_account(work_dir, monkeypatch):
+    import twitter
+
+    monkeypatch.setenv("DOWN_PUBLISHER_BACKEND", "local")
+    monkeypatch.setenv("DOWN_PUBLISHER_DIRECTORY", str(work_dir / "down"))
+    monkeypatch.setattr(twitter, "_publishers", {})
+    twitter.create_tweet("Down", [b"image"], "DOWN_")
+    assert json.loads((work_dir / "down" / "posts.jsonl").read_text())["text"] == "Down"
+
+
+def test_worker_jobs_take_turns_between_organizers():
+    import workers
+
+    polls = [{"organizer": "Brann"}, {"organizer": "Brann"}, {"organizer": "Down"}]
+    missing = [(0, 1), (0, 2), (1, 3), (1, 4), (2, 5)]
+    assert workers.interleave_by_organizer(missing, polls) == [(0, 1), (2, 5), (0, 2), (1, 3), (1, 4)]
+
+
+def test_an_organizer_cant_redefine_a_venue(work_dir, monkeypatch):
+    with open(scrape_tools.VENUE_RULES_PATH, "r", encoding="utf-8") as json_file:
+        venue_rules = json.load(json_file)
+    organizers_path = work_dir / "organizers.json"
+    organizers_path.write_text(json.dumps([
+        {"name": "Brann", "title_filter": "brann -", "namespace": "", "venue_rules": str(work_dir / "venues.json")},
+    ]))
+    monkeypatch.setattr(scrape_tools, "ORGANIZERS_PATH", str(organizers_path))
+    scrape_tools.load_organizers.cache_clear()
+
+    (work_dir / "venues.json").write_text(json.dumps({"Brann Stadion": venue_rules["Brann Stadion"]}))
+    assert scrape_tools.load_venue_rules() == venue_rules
+    scrape_tools.load_venue_rules.cache_clear()
+    venue_rules["Brann Stadion"]["rules"] = []
+    (work_dir / "venues.json").write_text(json.dumps({"Brann Stadion": venue_rules["Brann Stadion"]}))
+    with pytest.raises(ValueError, match="Brann Stadion"):
+        scrape_tools.load_venue_rules()
+    scrape_tools.load_organizers.cache_clear()
+
+
+def test_the_replay_homepages_list_the_events_of_every_organizer(work_dir, monkeypatch):
+    import replay
+
+    organizers_path = work_dir / "organizers.json"
+    organizers_path.write_text(json.dumps([
+        {"name": "Down", "homepage_url": "https://down.example/no/nb", "title_filter": "down -", "namespace": "down"},
+        {"name": "Brann", "title_filter": "brann -", "namespace": ""},
+    ]))
+    monkeypatch.setattr(scrape_tools, "ORGANIZERS_PATH", str(organizers_path))
+    scrape_tools.load_organizers.cache_clear()
+    bodies = {
+        "/no/nb": EVENT_LIST.format(href="https://www.tikkio.com/events/1", title="Brann - Molde"),
+        "/down/nb": EVENT_LIST.format(href="https://down.example/events/2", title="Down - Up"),
+    }
+    (work_dir / "bundle" / "bodies").mkdir(parents=True)
+    for number, (path, body) in enumerate(bodies.items()):
+        (work_dir / "bundle" / "bodies" / f"{number}.html").write_text(body, encoding="utf-8")
+    (work_dir / "bundle" / "manifest.json").write_text(json.dumps({
+        "origins": ["https://www.tikkio.com", "https://down.example"],
+        "homepage": "/no/nb",
+        "homepages": list(bodies),
+        "responses": {path: {"body": f"{number}.html", "content_type": "text/html"}
+                      for number, path in enumerate(bodies)},
+    }))
+    server = replay.ReplayServer(str(work_dir / "bundle"), events=2)
+    try:
+        for path, title in (("/no/nb", "Brann - Molde"), ("/down/nb", "Down - Up")):
+            titles = [event["title"] for event in scrape_tools.parse_event_list(server.get_homepage(path), " - ")]
+            assert titles == [title, title + " 2"]
+    finally:
+        server.server.server_close()
+        scrape_tools.load_organizers.cache_clear()
+
+
+def test_the_daemon_tweets_after_the_first_round_of_polls(organizers, monkeypatch):
+    import daemon
+
+    calls = []
+
+    def stop(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(scrape_tools, "poll_events", lambda events: calls.append("poll") or ["dir"] * len(events))
+    monkeypatch.setattr(daemon, "publish_tweet", lambda *args: calls.append("tweet"))
+    monkeypatch.setattr(daemon.time, "sleep", stop)
+    with pytest.raises(KeyboardInterrupt):
+        daemon.run_daemon("Header")
+    assert calls == ["poll", "tweet"]
+
+
+def test_the_archived_images_of_organizers_dont_overwrite_each_other(organizers, work_dir, monkeypatch):
+    import daemon
+    import imagify
+    import twitter
+
+    dir_paths = [scrape_tools.get_directory_path("Down - Brann", "down"),
+                 scrape_tools.get_directory_path("Brann - Molde")]
+    scheduled_events = {str(number): {"dir_path": dir_path} for number, dir_path in enumerate(dir_paths)}
+    monkeypatch.setattr(scrape_tools, "get_changed_events", lambda dir_paths: dir_paths)
+    monkeypatch.setattr(scrape_tools, "create_event_string", lambda dir_path: os.path.basename(dir_path))
+    monkeypatch.setattr(scrape_tools, "mark_published", lambda dir_paths: None)
+    monkeypatch.setattr(imagify, "render_images", lambda strings, home_logo: [s.encode() for s in strings])
+    monkeypatch.setattr(imagify, "SAVE_PATH", str(work_dir))
+    monkeypatch.setattr(twitter, "create_tweet", lambda *args: None)
+    daemon.publish_tweet("Header", scheduled_events, archive=True)
+    assert (work_dir / "down-ticket_sale_result0.jpg").read_bytes() == b"down-Down-Brann"
+    assert (work_dir / "ticket_sale_result0.jpg").read_bytes() == b"Brann-Molde"
+
+
+def test_a_publisher_has_to_upload_and_post(monkeypatch):
+    import twitter
+
+    class HalfPublisher(twitter.Publisher):
+        def post(self, text, media_ids):
+            pass
+
+    with pytest.raises(TypeError):
+        HalfPublisher()
+    monkeypatch.setenv("PUBLISHER_BACKEND", "http")
+    monkeypatch.delenv("PUBLISHER_URL", raising=False)
+    monkeypatch.setattr(twitter, "_publishers", {})
+    assert twitter.get_publisher().url == twitter.DEFAULT_PUBLISHER_URL != "http://127.0.0.1:8000"
@@ -0,0 +1,44 @@
+import os
+
+import scrape_tools
+import snapshot_store
+
+
+def save_poll(dir_path: str, created: str, sold_seats: int):
+    snapshot_store.save_snapshot(os.path.basename(dir_path), created, {
+        "GENERAL": {"title": "Brann - Molde", "date": "20.05.2030 18:00 @ Brann Stadion"},
+        "SPV": {"section_amount": 100, "sold_seats": sold_seats, "available_seats": 100 - sold_seats},
+        "TOTALT": {"section_amount": 100, "sold_seats": sold_seats, "available_seats": 100 - sold_seats},
+    })
+
+
+def get_change(string: str, category: str) -> str:
+    line = next(line for line in string.splitlines() if line.startswith(category))
+    return line.split()[2]
+
+
+def test_the_change_is_counted_from_the_last_published_snapshot():
+    dir_path = scrape_tools.get_directory_path("Brann - Molde")
+    save_poll(dir_path, "2030-05-20_10-00-00", 10)
+    scrape_tools.mark_published([dir_path])
+    save_poll(dir_path, "2030-05-20_10-10-00", 20)
+    save_poll(dir_path, "2030-05-20_10-20-00", 30)
+    assert get_change(scrape_tools.create_string(dir_path), "SPV") == "+20"
+
+
+def test_an_unpublished_event_is_compared_with_the_poll_before():
+    dir_path = scrape_tools.get_directory_path("Brann - Molde")
+    save_poll(dir_path, "2030-05-20_10-00-00", 10)
+    save_poll(dir_path, "2030-05-20_10-10-00", 25)
+    assert get_change(scrape_tools.create_string(dir_path), "SPV") == "+15"
+
+
+def test_unchanged_events_are_left_out_until_their_counts_change():
+    dir_path = scrape_tools.get_directory_path("Brann - Molde")
+    save_poll(dir_path, "2030-05-20_10-00-00", 10)
+    assert scrape_tools.get_changed_events([dir_path]) == [dir_path]
+    scrape_tools.mark_published([dir_path])
+    save_poll(dir_path, "2030-05-20_10-10-00", 10)
+    assert scrape_tools.get_changed_events([dir_path]) == []
+    save_poll(dir_path, "2030-05-20_10-20-00", 11)
+    assert scrape_tools.get_changed_events([dir_path]) == [dir_path]
@@ -0,0 +1,18 @@
+from seat_capture import pack_seat_states, unpack_seat_states
+from seat_diff import AVAILABLE, LOCKED, SOLD, diff_seat_captures, format_seat_diff
+
+
+def test_transitions_are_counted_and_described():
+    prior = {1: bytes([AVAILABLE, AVAILABLE, SOLD, LOCKED])}
+    latest = {1: bytes([SOLD, LOCKED, AVAILABLE, LOCKED, SOLD])}
+    diff = diff_seat_captures(prior, latest, "Brann Stadion")
+    assert diff["total"] == {"sold": 1, "released": 1, "locked": 1, "unlocked": 0, "locked_sold": 0}
+    assert format_seat_diff("Brann-Molde", diff).splitlines() == [
+        "Seat changes of Brann-Molde since the last capture:",
+        "  Total: sold 1, released 1, locked 1",
+    ]
+
+
+def test_packed_seat_states_round_trip():
+    seat_states = [(101, "sold", 1, 2), (None, "available", 3, 4)]
+    assert unpack_seat_states(pack_seat_states(seat_states)) == seat_states
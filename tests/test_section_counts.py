@@ -0,0 +1,62 @@
+import json
+import random
+
+import pytest
+
+import scrape_tools
+
+STATUSES = ["sold", "available", "locked", "reserved"]
+
+
+def make_section(seats: int, seed: int) -> dict:
+    """A section like the ones on ticketco, with phantom seats at x <= 0 and a few extra keys per seat."""
+    generator = random.Random(seed)
+    return {
+        "event": {"id": 1, "tags": ["a", {"b": None}]},
+        "seating_arrangements": {
+            "seats": [{"id": 1000 + index, "status": generator.choice(STATUSES),
+                       "x": generator.choice([-1, 0, 0.5, 12]), "y": index, "row": {"name": "Rad \"1\" æ"}}
+                      for index in range(seats)],
+            "section_name": "Felt E (Frydenbø)",
+            "section_amount": seats,
+        },
+    }
+
+
+def count_with_json_loads(section: dict) -> dict:
+    """The counts of the section the way they were taken before the streaming parser."""
+    seats = section["seating_arrangements"]["seats"]
+    return {
+        "section_name": section["seating_arrangements"]["section_name"],
+        "section_amount": section["seating_arrangements"]["section_amount"],
+        "sold": len([seat for seat in seats if seat["status"] == "sold"]),
+        "available": len([seat for seat in seats if seat["status"] == "available"]),
+        "locked": len([seat for seat in seats if seat["status"] == "locked"]),
+        "phantom": len([seat for seat in seats if float(seat["x"]) <= 0 and seat["status"] == "available"]),
+        "seat_count": len(seats),
+    }
+
+
+@pytest.mark.parametrize("seats", [0, 1, 250])
+@pytest.mark.parametrize("dump_options", [{}, {"indent": 2}, {"separators": (",", ":")}, {"ensure_ascii": False}])
+def test_streaming_counts_match_json_loads(seats, dump_options):
+    section = make_section(seats, seats)
+    seat_counts = scrape_tools.count_section_seats(json.dumps(section, **dump_options), True)
+    assert {key: seat_counts[key] for key in count_with_json_loads(section)} == count_with_json_loads(section)
+    assert (seat_counts["seat_states"] or []) == [(seat["id"], seat["status"], seat["x"], seat["y"])
+                                          for seat in section["seating_arrangements"]["seats"]]
+
+
+def test_known_phantom_ids_give_the_same_counts():
+    section = make_section(250, 1)
+    json_text = json.dumps(section)
+    seat_counts = scrape_tools.count_section_seats(json_text, False)
+    cached_counts = scrape_tools.count_section_seats(json_text, False, set(seat_counts["phantom_ids"]))
+    assert cached_counts["phantom"] == seat_counts["phantom"] == count_with_json_loads(section)["phantom"]
+    assert cached_counts["seat_states"] is None
+
+
+def test_truncated_json_is_rejected():
+    json_text = json.dumps(make_section(10, 2))
+    with pytest.raises(ValueError):
+        scrape_tools.count_section_seats(json_text[:len(json_text) // 2], False)
@@ -0,0 +1,50 @@
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import scrape_tools
+import snapshot_store
+
+
+def get_latest_files_by_listing(dir_path: str) -> Tuple[Dict, Optional[Dict]]:
+    """The two most recent files of a results directory, the way they were found before the snapshot store."""
+    files = sorted(os.listdir(dir_path), key=lambda name: os.path.getmtime(os.path.join(dir_path, name)),
+                   reverse=True)
+    data = []
+    for name in files[:2]:
+        with open(os.path.join(dir_path, name), "r") as json_file:
+            data.append(json.load(json_file))
+    return data[0], data[1] if len(data) > 1 else None
+
+
+def write_legacy_directory(title: str, polls: int) -> str:
+    """Write a results directory like the ones from before the snapshot store, in a shuffled order."""
+    dir_path = scrape_tools.get_directory_path(title)
+    os.makedirs(dir_path)
+    for minute in [3, 0, 4, 1, 2][:polls]:
+        path = os.path.join(dir_path, f"results_2030-05-20_10-0{minute}-00.json")
+        with open(path, "w") as json_file:
+            json.dump({"TOTALT": {"sold_seats": 100 + minute}}, json_file)
+        os.utime(path, (1_900_000_000 + minute * 60,) * 2)
+    return dir_path
+
+
+def test_a_legacy_directory_is_imported_once():
+    dir_path = write_legacy_directory("Brann - Molde", 5)
+    assert snapshot_store.import_directory(dir_path) == 5
+    assert snapshot_store.import_directory(dir_path) == 0
+    snapshots = snapshot_store.get_latest_snapshots(os.path.basename(dir_path), 10)
+    assert [snapshot["TOTALT"]["sold_seats"] for snapshot in snapshots] == [104, 103, 102, 101, 100]
+
+
+def test_the_latest_snapshots_match_the_file_listing():
+    for title, polls in [("Brann - Molde", 5), ("Brann - Viking", 1)]:
+        dir_path = write_legacy_directory(title, polls)
+        assert scrape_tools.get_latest_file(dir_path) == get_latest_files_by_listing(dir_path)
+
+
+def test_new_snapshots_come_after_the_imported_ones():
+    dir_path = write_legacy_directory("Brann - Molde", 2)
+    scrape_tools.save_new_json("Brann - Molde", {"TOTALT": {"sold_seats": 200}})
+    latest, prior = scrape_tools.get_latest_file(dir_path)
+    assert (latest["TOTALT"]["sold_seats"], prior["TOTALT"]["sold_seats"]) == (200, 103)
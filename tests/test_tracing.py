@@ -0,0 +1,23 @@
+import asyncio
+
+import tracing
+
+
+def test_stage_profiles_taken_on_the_event_loop_are_reported_as_overlapping(work_dir, monkeypatch, capsys):
+    for name, value in [("_events", []), ("_tracks", {}), ("_track_names", {}), ("_profiles", {}),
+                        ("_overlapping_stages", set())]:
+        monkeypatch.setattr(tracing, name, value)
+    monkeypatch.setattr(tracing, "_enabled", False)
+    monkeypatch.setattr(tracing, "_profile_dir", None)
+    tracing.enable(str(work_dir / "profiles"))
+
+    async def fan_out():
+        with tracing.span("section_fanout"):
+            await asyncio.sleep(0)
+
+    asyncio.run(fan_out())
+    with tracing.span("rendering"):
+        pass
+    tracing.export(str(work_dir / "trace.json"))
+    assert (work_dir / "profiles" / "section_fanout.pstats").exists()
+    assert "The profiles of section_fanout were taken on the event loop" in capsys.readouterr().out
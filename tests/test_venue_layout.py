@@ -0,0 +1,43 @@
+import json
+
+import scrape_tools
+
+EVENT_URL = "https://brann.example/tickets/1/"
+ITEM_TYPES = json.dumps({"item_types": [{"sections": [{"id": 1}]}]})
+
+
+def count_section(with_layout: bool) -> dict:
+    result = {"section_name": "Felt C (BT)", "section_id": 1, "section_amount": 4, "sold_seats": 2,
+              "available_seats": 2, "locked_seats": 0, "phantom_seats": 0, "seat_states": None}
+    if with_layout:
+        result["section_layout"] = {"section_name": "Felt C (BT)", "section_amount": 4, "seat_count": 4,
+                                    "phantom_seats": None}
+    return result
+
+
+def test_the_layout_keeps_the_category_of_every_section():
+    layout = scrape_tools.load_venue_layout(EVENT_URL, ITEM_TYPES)
+    scrape_tools.update_venue_layout(layout, [count_section(True)], "Brann Stadion")
+    scrape_tools._venue_layouts.clear()
+    layout = scrape_tools.load_venue_layout(EVENT_URL, ITEM_TYPES)
+    assert (layout["sections"][1]["category"], layout["sections"][1]["in_total"]) == ("BT", True)
+
+
+def test_editing_the_venue_rules_drops_the_saved_categories(work_dir, monkeypatch):
+    layout = scrape_tools.load_venue_layout(EVENT_URL, ITEM_TYPES)
+    scrape_tools.update_venue_layout(layout, [count_section(True)], "Brann Stadion")
+
+    with open(scrape_tools.VENUE_RULES_PATH, "r", encoding="utf-8") as json_file:
+        venue_rules = json_file.read().replace('"BT"', '"BOB"')
+    (work_dir / "venues.json").write_text(venue_rules, encoding="utf-8")
+    monkeypatch.setattr(scrape_tools, "VENUE_RULES_PATH", str(work_dir / "venues.json"))
+    for cache in (scrape_tools.load_venue_rules, scrape_tools.get_venue_rules_fingerprint,
+                  scrape_tools.classify_section):
+        cache.cache_clear()
+    scrape_tools._venue_layouts.clear()  # As after a restart
+
+    layout = scrape_tools.load_venue_layout(EVENT_URL, ITEM_TYPES)
+    assert layout["sections"] == {}
+    data = scrape_tools.save_minimal_info([count_section(False)], "Brann - Molde", "20.05.2030 18:00 @ Brann Stadion",
+                                          layout)
+    assert data["BOB"]["sold_seats"] == 2
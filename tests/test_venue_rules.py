@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import scrape_tools
+
+
+def section(section_id: int, name: str, sold: int, available: int) -> dict:
+    return {"section_id": section_id, "section_name": name, "section_amount": sold + available,
+            "sold_seats": sold, "available_seats": available}
+
+
+BRANN_STADION = [section(1, "Frydenbø Felt A", 812, 188), section(2, "Frydenbø gangen", 10, 5),
+                 section(3, "SPV Felt C", 1500, 300), section(4, "SPV Press", 20, 40),
+                 section(5, "BOB Felt D", 900, 400), section(6, "Fjordkraft Felt A", 50, 0),
+                 section(7, "Fjordkraft Felt C", 1400, 600), section(8, "Fjordkraft stå", 0, 0),
+                 section(9, "Fjordkraft Felt B", 30, 70), section(10, "VIP Lounge", 300, 100),
+                 section(11, "Ukjent felt", 7, 3), section(12, "BT Felt E", 0, 0)]
+ASANE_ARENA = [section(1, "Hovedtribune A", 700, 300), section(2, "Familietribune B", 200, 250),
+               section(3, "Nordre C", 90, 10), section(4, "Sør", 5, 5), section(5, "Hovedtribune B", 0, 0)]
+
+
+def totals(sold: int, amount: int) -> dict:
+    return {"sold_seats": sold, "section_amount": amount, "available_seats": amount - sold}
+
+
+# The totals the hand-written brann_stadion and aasane_arena functions gave for the sections above
+BRANN_STADION_TOTALS = {"FRYDENBØ": totals(1622, 2000), "SPV": totals(1500, 1800), "BT": totals(900, 1300),
+                        "FJORDKRAFT": totals(1480, 2150), "VIP": totals(300, 400), "TOTALT": totals(5729, 7510)}
+BRANN_STADION_EUROPA_TOTALS = dict(BRANN_STADION_TOTALS, **{"FRYDENBØ": totals(812, 1000),
+                                                              "TOTALT": totals(4919, 6510)})
+ASANE_ARENA_TOTALS = {"HOVED": totals(700, 1000), "FAMILIE": totals(200, 450), "NORDRE": totals(90, 100),
+                      "TOTALT": totals(995, 1560)}
+
+
+@pytest.mark.parametrize("title, venue, data, expected", [
+    ("Brann - Molde", "Brann Stadion", BRANN_STADION, BRANN_STADION_TOTALS),
+    ("Brann - Lyon (Europa League)", "Brann Stadion", BRANN_STADION, BRANN_STADION_EUROPA_TOTALS),
+    ("Brann - Lyon (Europa League kvinner)", "Brann Stadion", BRANN_STADION, BRANN_STADION_TOTALS),
+    ("Brann - Rosenborg", "Åsane Arena", ASANE_ARENA, ASANE_ARENA_TOTALS),
+])
+def test_the_rules_give_the_totals_of_the_old_venue_functions(title, venue, data, expected):
+    event_date = f"20.05.2030 18:00 @ {venue}"
+    result = scrape_tools.save_minimal_info(data, title, event_date)
+    assert result == {"GENERAL:": {"title": title, "date": event_date}, **expected}
+    assert list(result) == ["GENERAL:"] + list(expected)  # The display order of the categories
+
+
+def test_a_rule_with_an_unlisted_category_is_rejected(work_dir, monkeypatch):
+    with open(scrape_tools.VENUE_RULES_PATH, "r", encoding="utf-8") as json_file:
+        venue_rules = json.load(json_file)
+    venue_rules["Brann Stadion"]["categories"].remove("BT")
+    (work_dir / "venues.json").write_text(json.dumps(venue_rules), encoding="utf-8")
+    monkeypatch.setattr(scrape_tools, "VENUE_RULES_PATH", str(work_dir / "venues.json"))
+    with pytest.raises(ValueError, match="BT"):
+        scrape_tools.load_venue_rules()
@@ -0,0 +1,143 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Timed spans for every stage of a run, written as a Chrome trace (chrome://tracing, Perfetto or
+# speedscope). Tracing is off unless enable() is called, and a span costs next to nothing then.
+# Spans opened inside an asyncio task get a track of their own, since the tasks of an event loop
+# interleave on one thread. With a profile directory, the spans of the stages in STAGES are also
+# run under cProfile, and every stage gets a .pstats file with the profiles of all its spans merged.
+# cProfile follows a thread and not a task, so a stage profiled inside an asyncio task also counts
+# the other tasks that ran on the event loop meanwhile. Those stages are named when they're exported.
+
+STAGES = ("discovery", "nested_link", "section_fanout", "aggregation", "snapshot_io", "string_building",
+          "rendering", "upload")
+
+_enabled = False
+_profile_dir: Optional[str] = None
+_lock = threading.Lock()
+_events: List[Dict] = []
+_tracks: Dict[object, int] = {}
+_track_names: Dict[int, str] = {}
+_profiles: Dict[str, List[cProfile.Profile]] = {}
+_overlapping_stages = set()  # Stages profiled inside an asyncio task
+_profiling = threading.local()
+_start = time.perf_counter()
+
+
+def enable(profile_dir: Optional[str] = None):
+    """Start recording spans, and profiling the stages into profile_dir if it's given."""
+    global _enabled, _profile_dir, _start
+    _enabled = True
+    _profile_dir = profile_dir
+    _start = time.perf_counter()
+
+
+def get_track() -> int:
+    """Return the track of the current asyncio task, or of the current thread outside the event loop."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    key = task if task is not None else threading.get_ident()
+    with _lock:
+        if key not in _tracks:
+            _tracks[key] = len(_tracks) + 1
+            name = task.get_name() if task is not None else threading.current_thread().name
+            _track_names[_tracks[key]] = name
+        return _tracks[key]
+
+
+@contextmanager
+def span(name: str, **args):
+    """Record the block as a span named after the stage, with the arguments shown in the trace.
+    Args:
+        name (str):
+            The stage, one of STAGES, or any other name for a span that isn't profiled.
+        **args:
+            Details of the span, like the title of the event.
+    """
+    if not _enabled:
+        yield
+        return
+
+    track = get_track()
+    try:
+        in_task = asyncio.current_task() is not None
+    except RuntimeError:
+        in_task = False
+    profile = None
+    if _profile_dir is not None and name in STAGES and not getattr(_profiling, "active", False):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            _profiling.active = True
+        except ValueError:  # Another profiler is running, e.g. on a Python with one profiler per process
+            profile = None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if profile is not None:
+            profile.disable()
+            _profiling.active = False
+        with _lock:
+            _events.append({
+                "name": name,
+                "cat": "stage" if name in STAGES else "span",
+                "ph": "X",
+                "ts": round((start - _start) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": track,
+                "args": {key: str(value) for key, value in args.items()},
+            })
+            if profile is not None:
+                _profiles.setdefault(name, []).append(profile)
+                if in_task:
+                    _overlapping_stages.add(name)
+
+
+def export(trace_path: str) -> Dict[str, float]:
+    """Write the trace, and the stage profiles if they were recorded.
+    Args:
+        trace_path (str):
+            The file to write the Chrome trace to.
+    Returns:
+        Dict[str, float]:
+            The total seconds spent in every stage, summed over all its spans.
+    """
+    with _lock:
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": track, "args": {"name": name}}
+                    for track, name in _track_names.items()]
+        trace = {"traceEvents": metadata + list(_events), "displayTimeUnit": "ms"}
+        stage_seconds = {}
+        for event in _events:
+            if event["cat"] == "stage":
+                stage_seconds[event["name"]] = stage_seconds.get(event["name"], 0.0) + event["dur"] / 1e6
+        profiles = dict(_profiles)
+        overlapping_stages = sorted(_overlapping_stages)
+
+    with open(trace_path, "w", encoding="utf-8") as trace_file:
+        json.dump(trace, trace_file)
+    print(f"Trace saved to {trace_path}")
+
+    if _profile_dir is not None and profiles:
+        os.makedirs(_profile_dir, exist_ok=True)
+        for stage, stage_profiles in profiles.items():
+            stats = pstats.Stats(stage_profiles[0])
+            for profile in stage_profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(_profile_dir, f"{stage}.pstats"))
+        print(f"Stage profiles saved to {_profile_dir}")
+        if overlapping_stages:
+            print(f"The profiles of {', '.join(overlapping_stages)} were taken on the event loop, and overlap: "
+                  f"they also include the work of the other tasks that ran at the same time")
+    return stage_seconds
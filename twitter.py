@@ -1,37 +1,161 @@
+import io
+import json
 import os
-from dotenv import load_dotenv
-import tweepy
-
-load_dotenv()  # Load environment variables from .env file
-api_key = os.environ.get("TWITTER_API_KEY")
-api_secret = os.environ.get("TWITTER_API_KEY_SECRET")
-bearer_token = os.environ.get("TWITTER_BEARER_TOKEN")
-access_token = os.environ.get("TWITTER_ACCESS_TOKEN")
-access_secret = os.environ.get("TWITTER_ACCESS_TOKEN_SECRET")
-
-# V1 Twitter API Authentication
-auth = tweepy.OAuthHandler(api_key, api_secret)
-auth.set_access_token(access_token, access_secret)
-api = tweepy.API(auth, wait_on_rate_limit=True)
-
-# V2 Twitter API Authentication
-client = tweepy.Client(
-    bearer_token,
-    api_key,
-    api_secret,
-    access_token,
-    access_secret,
-    wait_on_rate_limit=True,
-)
-
-
-def create_tweet(text, media_path):
-    print("Uploading Tweet...")
-    media_ids = []
-    for media in media_path:
-        media_id = api.media_upload(filename=media).media_id_string
-        print("Media successfully uploaded! Id: " + media_id)
-        media_ids.append(media_id)
-
-    client.create_tweet(text=text, media_ids=media_ids)
-    print("Tweeted!")
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Union
+
+SAVE_PATH = os.path.dirname(os.path.abspath(__file__)) + "/"
+UPLOAD_RETRIES = 3
+UPLOAD_RETRY_DELAY = 2  # Seconds before the first retry, doubled for every following retry
+DEFAULT_PUBLISHER_URL = "http://127.0.0.1:8765"  # Off the replay server's default port 8000
+
+_publishers = {}  # Per prefix of the environment variables
+
+
+class Publisher(ABC):
+    """Uploads media and posts a text with the media attached.
+    All media of a post are uploaded in parallel, and every upload is retried on its own."""
+
+    @abstractmethod
+    def upload_media(self, filename: str, data: bytes) -> str:
+        """Uploads a single image and returns its media ID."""
+
+    @abstractmethod
+    def post(self, text: str, media_ids: List[str]):
+        """Posts the text with the uploaded media attached."""
+
+    def publish(self, text: str, media: List[Union[str, bytes]]):
+        print("Uploading Tweet...")
+        filenames, images = [], []
+        for index, image in enumerate(media):
+            if isinstance(image, bytes):
+                filenames.append(f"ticket_sale_result{index}.jpg")
+                images.append(image)
+            else:
+                filenames.append(os.path.basename(image))
+                with open(image, "rb") as image_file:
+                    images.append(image_file.read())
+
+        with ThreadPoolExecutor(max_workers=max(len(images), 1)) as executor:
+            media_ids = list(executor.map(self._upload_with_retry, filenames, images))
+        self.post(text, media_ids)
+        print("Tweeted!")
+
+    def _upload_with_retry(self, filename: str, data: bytes) -> str:
+        for attempt in range(UPLOAD_RETRIES):
+            try:
+                media_id = self.upload_media(filename, data)
+                print("Media successfully uploaded! Id: " + media_id)
+                return media_id
+            except Exception as e:
+                if attempt == UPLOAD_RETRIES - 1:
+                    raise
+                print(f"Failed to upload {filename}, retrying:", e)
+                time.sleep(UPLOAD_RETRY_DELAY * 2 ** attempt)
+
+
+class TwitterPublisher(Publisher):
+    """Publishes to Twitter, authenticating with the keys and tokens from the environment.
+    With a prefix, the variables are read with the prefix in front, e.g. AASANE_TWITTER_API_KEY."""
+
+    def __init__(self, prefix: str = ""):
+        import tweepy
+
+        api_key = os.environ.get(prefix + "TWITTER_API_KEY")
+        api_secret = os.environ.get(prefix + "TWITTER_API_KEY_SECRET")
+        bearer_token = os.environ.get(prefix + "TWITTER_BEARER_TOKEN")
+        access_token = os.environ.get(prefix + "TWITTER_ACCESS_TOKEN")
+        access_secret = os.environ.get(prefix + "TWITTER_ACCESS_TOKEN_SECRET")
+
+        # V1 Twitter API Authentication
+        auth = tweepy.OAuthHandler(api_key, api_secret)
+        auth.set_access_token(access_token, access_secret)
+        self.api = tweepy.API(auth, wait_on_rate_limit=True)
+
+        # V2 Twitter API Authentication
+        self.client = tweepy.Client(
+            bearer_token,
+            api_key,
+            api_secret,
+            access_token,
+            access_secret,
+            wait_on_rate_limit=True,
+        )
+
+    def upload_media(self, filename: str, data: bytes) -> str:
+        return self.api.media_upload(filename=filename, file=io.BytesIO(data)).media_id_string
+
+    def post(self, text: str, media_ids: List[str]):
+        self.client.create_tweet(text=text, media_ids=media_ids)
+
+
+class LocalPublisher(Publisher):
+    """Stand-in that saves the media and the posts in a local directory instead of tweeting.
+    Media go to <directory>/media/ and every post is appended to <directory>/posts.jsonl."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "media"), exist_ok=True)
+
+    def upload_media(self, filename: str, data: bytes) -> str:
+        media_id = uuid.uuid4().hex
+        with open(os.path.join(self.directory, "media", f"{media_id}_{filename}"), "wb") as media_file:
+            media_file.write(data)
+        return media_id
+
+    def post(self, text: str, media_ids: List[str]):
+        with open(os.path.join(self.directory, "posts.jsonl"), "a") as posts_file:
+            posts_file.write(json.dumps({"time": datetime.now().isoformat(), "text": text,
+                                         "media_ids": media_ids}) + "\n")
+
+
+class HttpPublisher(Publisher):
+    """Stand-in that sends the media and the posts to a local HTTP server instead of tweeting.
+    Media are POSTed to <url>/media, which must answer with {"media_id": ...},
+    and posts are POSTed as JSON to <url>/posts."""
+
+    def __init__(self, url: str):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def upload_media(self, filename: str, data: bytes) -> str:
+        response = self.session.post(f"{self.url}/media", params={"filename": filename}, data=data)
+        response.raise_for_status()
+        return str(response.json()["media_id"])
+
+    def post(self, text: str, media_ids: List[str]):
+        response = self.session.post(f"{self.url}/posts", json={"text": text, "media_ids": media_ids})
+        response.raise_for_status()
+
+
+def get_publisher(prefix: str = "") -> Publisher:
+    """Returns the publisher chosen by the PUBLISHER_BACKEND environment variable.
+    Valid values are 'twitter' (default), 'local' (saves to PUBLISHER_DIRECTORY)
+    and 'http' (sends to PUBLISHER_URL). The publisher is created on first use.
+    Organizers with an account of their own read the variables with their prefix in front."""
+    if prefix not in _publishers:
+        from dotenv import load_dotenv
+        load_dotenv()  # Load environment variables from .env file
+        backend = os.environ.get(prefix + "PUBLISHER_BACKEND", "twitter").lower()
+        if backend == "local":
+            default_directory = SAVE_PATH + "published" + (f"/{prefix.strip('_').lower()}" if prefix else "")
+            _publishers[prefix] = LocalPublisher(os.environ.get(prefix + "PUBLISHER_DIRECTORY", default_directory))
+        elif backend == "http":
+            _publishers[prefix] = HttpPublisher(os.environ.get(prefix + "PUBLISHER_URL", DEFAULT_PUBLISHER_URL))
+        elif backend == "twitter":
+            _publishers[prefix] = TwitterPublisher(prefix)
+        else:
+            raise ValueError(f"Invalid publisher backend: {backend}. Valid backends are: twitter, local, http")
+    return _publishers[prefix]
+
+
+def create_tweet(text, media, publisher_prefix: str = ""):
+    """Posts a tweet with images attached, given as file paths or as encoded image bytes.
+    publisher_prefix picks the account of an organizer, see get_publisher."""
+    get_publisher(publisher_prefix).publish(text, media)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import argparse
+import ipaddress
+import itertools
+import os
+import queue
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+from typing import Dict, List, Optional, Tuple
+
+import scrape_tools
+import seat_capture
+import tracing
+from adaptive_limiter import AdaptiveLimiter
+
+# Coordinator/worker mode, for sale days when a single process can't fetch and count every section
+# fast enough (decoding the section JSON holds the GIL). The coordinator finds the events and their
+# sections, and puts a job for every section on a queue served by a multiprocessing manager.
+# Workers, started by the coordinator or on other hosts with 'python workers.py work HOST:PORT',
+# take the jobs, fetch and count the sections and send the counts back. The coordinator checkpoints
+# and aggregates them just like the single-process path.
+# Jobs and results are pickled, so the queues must only be reachable by trusted workers: without
+# a key (--authkey or WORKER_AUTHKEY), the coordinator only listens on the loopback interface with
+# a random key that only the workers it starts itself know.
+# Every worker process has its own request limiter, so each one gets an equal share of the limits,
+# and the workers together send no more requests at once than a single process would.
+
+DEFAULT_ADDRESS = ("127.0.0.1", 0)  # Any free port
+WORKER_THREADS = 4  # Sections a worker fetches at once, as most of the time is spent waiting on the server
+RESULT_TIMEOUT = 120  # Seconds without a single result before the sections left count as failed
+RECONNECT_DELAY = 5  # Seconds a worker waits before connecting to the coordinator again
+LOCAL_WORKER_JOIN_TIMEOUT = 10  # Seconds the coordinator waits for the workers it started to exit
+
+_jobs = queue.Queue()
+_results = queue.Queue()
+
+
+def get_jobs() -> queue.Queue:
+    return _jobs
+
+
+def get_results() -> queue.Queue:
+    return _results
+
+
+class QueueManager(BaseManager):
+    pass
+
+
+QueueManager.register("get_jobs", callable=get_jobs)
+QueueManager.register("get_results", callable=get_results)
+
+
+def update_event_data_distributed(option: str, local_workers: int, address: Optional[Tuple[str, int]] = None,
+                                  authkey: Optional[str] = None) -> List[str]:
+    """Scrape and save the events picked by the option, counting their sections in worker processes.
+    Args:
+        option (str):
+            Specifies the events to target for updating: 'all', 'next' or 'debug'.
+        local_workers (int):
+            The number of worker processes to start on this host.
+        address (Optional[Tuple[str, int]]):
+            The host and port to serve the job queue on, for workers on other hosts. By default,
+            a free port on the loopback interface, which only the local workers connect to.
+        authkey (Optional[str]):
+            The key workers authenticate with, by default WORKER_AUTHKEY.
+    Returns:
+        List[str]:
+            The directory paths identifying the updated events.
+    """
+    address = address or DEFAULT_ADDRESS
+    authkey = get_authkey(address[0], authkey)
+    manager = QueueManager(address=address, authkey=authkey)
+    manager.start()
+    print(f"Serving section jobs on {manager.address[0]}:{manager.address[1]}")
+    workers = [Process(target=run_worker, args=(manager.address, authkey, WORKER_THREADS, False, local_workers),
+                       daemon=True)
+               for _ in range(local_workers)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        print("Starting update of the next event... ")
+        next_or_all = "next" if option.lower() == "next" else "all"
+        debug = "debug" in option.lower()
+        polls = [prepare_poll(event) for event in scrape_tools.get_upcoming_events(next_or_all)]
+        polls = [poll for poll in polls if poll is not None]
+        with tracing.span("section_fanout", events=len(polls)):
+            run_section_jobs(polls, manager.get_jobs(), manager.get_results(),
+                             debug or scrape_tools.CAPTURE_SEATS_EVERY_POLL)
+        dir_paths = [scrape_tools.finish_ticket_info(poll["event_url"], poll["sections"], poll["results"],
+                                                     poll["layout"], poll["title"], poll["date"], debug,
+                                                     poll["namespace"])
+                     for poll in polls]
+    finally:
+        manager.shutdown()  # Local workers exit once the queue is gone, the others wait for the next run
+        for worker in workers:
+            worker.join(LOCAL_WORKER_JOIN_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+    print("")
+    return [dir_path for dir_path in dir_paths if dir_path is not None]
+
+
+def get_authkey(host: str, authkey: Optional[str] = None) -> bytes:
+    """Return the key workers authenticate with, from the option, WORKER_AUTHKEY or random for a loopback-only queue."""
+    authkey = authkey or os.environ.get("WORKER_AUTHKEY")
+    if authkey:
+        return authkey.encode("utf-8")
+    if not is_loopback(host):
+        raise ValueError(f"Set --authkey or WORKER_AUTHKEY to serve section jobs on {host}")
+    return secrets.token_bytes(32)
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # A host name
+        return False
+
+
+def prepare_poll(event: Dict) -> Optional[Dict]:
+    """Find the sections of an event, and load its layout and the sections an unfinished poll already counted."""
+    event_title, event_date = scrape_tools.clean_event_info(event["title"], event["time"])
+    response = scrape_tools.fetch_url(event["link"] + "item_types.json")
+    if response is None:
+        scrape_tools.snapshot_store.delete_ticket_link(event["link"])  # The cached link may be stale
+        print(f"\nFailed to find the sections of '{event_title}'")
+        return None
+    sections = scrape_tools.read_section_ids(response, event_title)
+    if sections is None:
+        return None
+    return {
+        "event_url": event["link"],
+        "title": event_title,
+        "date": event_date,
+        "organizer": event["organizer"],
+        "namespace": event["namespace"],
+        "sections": sections,
+        "layout": scrape_tools.load_venue_layout(event["link"], response.text),
+        "results": scrape_tools.load_section_checkpoints(event["link"]),
+    }
+
+
+def run_section_jobs(polls: List[Dict], jobs, results, capture_seats: bool):
+    """Queue a job for every section that hasn't been counted, and collect the results into the polls.
+
+    The results of every attempt are checkpointed per event once the attempt is over. Failed sections
+    are queued again up to SECTION_RETRIES times, and if the workers send nothing for RESULT_TIMEOUT
+    seconds, the sections left are given up on until the next poll.
+    """
+    from tqdm import tqdm  # Only loaded once there are sections to count, to keep startup fast
+    progress_bar = tqdm(total=sum(len(poll["sections"]) for poll in polls), desc="Counting sections",
+                        unit="section")
+    progress_bar.update(sum(len(poll["results"]) for poll in polls))
+    attempts = scrape_tools.SectionAttempts(polls)
+    for missing in attempts:
+        time.sleep(attempts.delay)
+        for index, section in interleave_by_organizer(missing, polls):
+            poll = polls[index]
+            jobs.put((index, section, poll["event_url"], capture_seats, poll["layout"]["sections"].get(section)))
+
+        pending = set(missing)
+        counted: Dict[Tuple[int, int], Dict] = {}  # The sections counted in this attempt
+        try:
+            while pending:
+                try:
+                    index, section, result = results.get(timeout=RESULT_TIMEOUT)
+                except queue.Empty:
+                    print(f"\nNo results from the workers for {RESULT_TIMEOUT} s, {len(pending)} sections are left out")
+                    progress_bar.close()
+                    return
+                if (index, section) not in pending:  # A late result of a section that was already given up on
+                    continue
+                pending.remove((index, section))
+                if result is not None and result["seat_states"] is not None:
+                    result["seat_states"] = seat_capture.unpack_seat_states(result["seat_states"])
+                if result is not None:
+                    counted[(index, section)] = result
+                    progress_bar.update(1)
+        finally:
+            attempts.record(counted)
+    progress_bar.close()
+
+
+def interleave_by_organizer(missing: List[Tuple[int, int]], polls: List[Dict]) -> List[Tuple[int, int]]:
+    """Order the sections round-robin over the organizers, so the workers serve them in turn, like FairSemaphore."""
+    queues: Dict[str, List[Tuple[int, int]]] = {}
+    for index, section in missing:
+        queues.setdefault(polls[index]["organizer"], []).append((index, section))
+    return [job for jobs in itertools.zip_longest(*queues.values()) for job in jobs if job is not None]
+
+
+def run_worker(address: Tuple[str, int], authkey: bytes, threads: int = WORKER_THREADS, reconnect: bool = True,
+               worker_count: int = 1):
+    """Take section jobs from a coordinator and send back the counts, until the coordinator goes away.
+    Args:
+        address (Tuple[str, int]):
+            The host and port the coordinator serves the job queue on.
+        authkey (bytes):
+            The key to authenticate with.
+        threads (int):
+            The number of sections to fetch at once.
+        reconnect (bool):
+            Whether to keep waiting for the next coordinator, or to exit once the current one is gone.
+        worker_count (int):
+            The number of worker processes counting the sections together, which share the request limits.
+    """
+    share_request_limits(worker_count)
+    while True:
+        try:
+            manager = QueueManager(address=address, authkey=authkey)
+            manager.connect()
+        except OSError as e:
+            if not reconnect:
+                print(f"Failed to connect to {address[0]}:{address[1]}:", e)
+                return
+            time.sleep(RECONNECT_DELAY)
+            continue
+
+        print(f"Connected to {address[0]}:{address[1]}")
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for _ in range(threads):
+                executor.submit(work_on_jobs, manager)
+        if not reconnect:
+            return
+        print("The coordinator is gone, waiting for the next one...")
+        time.sleep(RECONNECT_DELAY)
+
+
+def share_request_limits(worker_count: int):
+    """Give this process's request limiter an equal share of the limits of a single process."""
+    max_limit = max(1, scrape_tools.MAX_CONCURRENT_REQUESTS // worker_count)
+    min_limit = min(scrape_tools.MIN_CONCURRENT_REQUESTS, max_limit)
+    initial_limit = min(max(min_limit, scrape_tools.INITIAL_CONCURRENT_REQUESTS // worker_count), max_limit)
+    scrape_tools.request_limiter = AdaptiveLimiter(initial_limit, min_limit, max_limit)
+
+
+def work_on_jobs(manager: QueueManager):
+    """Count the sections of the jobs on the queue one by one, until the queue can't be reached."""
+    from tqdm import tqdm
+    progress_bar = tqdm(disable=True)  # The coordinator shows the progress
+    try:
+        jobs, results = manager.get_jobs(), manager.get_results()
+        while True:
+            index, section, event_url, capture_seats, section_layout = jobs.get()
+            try:
+                result = scrape_tools.get_section_tickets(section, event_url, progress_bar, capture_seats,
+                                                          section_layout)
+            except Exception as e:  # A failing section must not stop the worker
+                print(f"Failed to count section {section} of {event_url}:", e)
+                result = None
+            if result is not None and result["seat_states"] is not None:
+                # A list of tuples per seat pickles to several times the size of the compressed JSON
+                result["seat_states"] = seat_capture.pack_seat_states(result["seat_states"])
+            results.put((index, section, result))
+    except (OSError, EOFError):
+        return
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count sections for a coordinator started with main.py --serve.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    work_parser = subparsers.add_parser("work", help="take section jobs from a coordinator, reconnecting between runs")
+    work_parser.add_argument("address", type=parse_address, help="HOST:PORT the coordinator serves the jobs on")
+    work_parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="sections to fetch at once")
+    work_parser.add_argument("--worker-count", type=int, default=1, metavar="N",
+                             help="worker processes counting for the coordinator in total, across all hosts, "
+                                  "to split the request limits between (default: 1)")
+    work_parser.add_argument("--authkey", help="the key of the coordinator (default: WORKER_AUTHKEY)")
+    args = parser.parse_args()
+
+    worker_authkey = args.authkey or os.environ.get("WORKER_AUTHKEY")
+    if not worker_authkey:
+        parser.error("pass --authkey or set WORKER_AUTHKEY to the key of the coordinator")
+    run_worker(args.address, worker_authkey.encode("utf-8"), args.threads, worker_count=args.worker_count)